@@ -0,0 +1,106 @@
+"""Particle cost over uptime for the polar plot, old object list vs ParticleSystem.
+
+Simulates the polar plot's particle path at 30 fps for a full hour of uptime
+(spawn every 5 frames, move, cull, update one scatter, then redraw it blitted
+on the Agg canvas like the live animation) and reports the mean frame time
+and live particle count per time bucket. The old code kept every particle
+forever and drew each with its own `ax.scatter` on a cleared axes, rendering
+the whole figure every frame; it is timed (rendering included) at a few
+early uptimes only, since it grows too slow to simulate for long.
+
+    python benchmarks/bench_particles.py [--minutes 60] [--bucket 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.particles import ParticleSystem
+
+FPS = 30
+MAX_RADIUS = 650
+
+
+def gradient_color(frame_count):
+    return ((np.sin(frame_count / 50.0) + 1) / 2,
+            (np.sin(frame_count / 70.0 + np.pi / 3) + 1) / 2,
+            (np.sin(frame_count / 90.0 + 2 * np.pi / 3) + 1) / 2)
+
+
+def legacy_frame_time(ax, uptime_s, repeats=3):
+    """Time one frame of the original per-particle loop and its redraw after `uptime_s` seconds."""
+    count = int(uptime_s * FPS / 5)
+    rng = np.random.default_rng(0)
+    particles = [[a, 50.0, s, gradient_color(i)] for i, (a, s) in
+                 enumerate(zip(rng.uniform(0, 2 * np.pi, count), rng.uniform(1, 3, count)))]
+    best = float("inf")
+    for _ in range(repeats):
+        ax.clear()
+        start = time.perf_counter()
+        for particle in particles:
+            particle[1] += particle[2]
+            ax.scatter([particle[0]], [particle[1]], color=particle[3], s=10, alpha=0.6)
+        ax.figure.canvas.draw()
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--bucket", type=float, default=5, help="Minutes per reported bucket")
+    parser.add_argument("--legacy-uptimes", type=float, nargs="*", default=[10, 60, 300],
+                        help="Seconds of uptime to time the old code at")
+    args = parser.parse_args()
+
+    fig = plt.figure(figsize=(5.4, 9.6), dpi=100)
+    ax = fig.add_subplot(111, polar=True)
+    ax.set_ylim(0, MAX_RADIUS)
+    scatter = ax.scatter(np.empty(0), np.empty(0), s=10, alpha=0.6, animated=True)
+    canvas = fig.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    particles = ParticleSystem(capacity=512, max_radius=MAX_RADIUS)
+
+    total_frames = int(args.minutes * 60 * FPS)
+    bucket_frames = max(1, int(args.bucket * 60 * FPS))
+    print("ParticleSystem (spawn + move + cull + scatter update + blitted redraw)")
+    print(f"{'uptime min':>10} {'us/frame':>9} {'p99 us':>8} {'particles':>9}")
+    times = np.empty(bucket_frames)
+    frame_count = 0
+    for frame in range(total_frames):
+        start = time.perf_counter()
+        frame_count += 2
+        if frame_count % 5 == 0:
+            particles.spawn(np.random.uniform(0, 2 * np.pi, 1), 50, np.random.uniform(1, 3, 1),
+                            gradient_color(frame_count))
+        particles.step()
+        scatter.set_offsets(particles.offsets)
+        scatter.set_facecolor(particles.colors)
+        canvas.restore_region(background)
+        ax.draw_artist(scatter)
+        canvas.blit(fig.bbox)
+        times[frame % bucket_frames] = time.perf_counter() - start
+        if (frame + 1) % bucket_frames == 0:
+            print(f"{(frame + 1) / FPS / 60:>10.0f} {times.mean() * 1e6:>9.1f} "
+                  f"{np.percentile(times, 99) * 1e6:>8.1f} {len(particles):>9}")
+
+    if args.legacy_uptimes:
+        scatter.set_animated(False)
+        print()
+        print("Original particle list (per-particle ax.scatter, never culled, full redraw)")
+        print(f"{'uptime s':>10} {'ms/frame':>9} {'particles':>9}")
+        for uptime in args.legacy_uptimes:
+            elapsed, count = legacy_frame_time(ax, uptime)
+            print(f"{uptime:>10.0f} {elapsed * 1000:>9.1f} {count:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Per-frame cost of the FFT visualiser's analysis, before and after SpectrumEngine.
+
+Runs the original detrend + complex FFT code path and SpectrumEngine over the
+same random chunks and reports the mean time per frame and the peak
+memory allocated while processing (as seen by tracemalloc) for a range of CHUNK sizes.
+It then times catching up on a backlog of overlapping STFT hops, one FFT per
+hop versus one batched 2-D FFT.
+
+    python benchmarks/bench_spectrum.py [--rate 48000] [--frames 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.signal as scipySignal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.spectrum import SpectrumEngine
+
+NOISE_THRESHOLD = 0.02
+DECAY_RATE = 0.9
+
+
+def make_legacy(chunk, rate):
+    """The per-frame math from the original update() loop."""
+    state = {"last_fft": np.zeros(chunk // 2)}
+
+    def process(data):
+        signal = scipySignal.detrend(data)
+        fft = np.abs(np.fft.fft(signal)) * 2 / chunk
+        fft = fft[:len(fft) // 2]
+        freqs = np.fft.fftfreq(len(signal), 1.0 / rate)[:len(fft)]
+        fft[fft < NOISE_THRESHOLD] = 0
+        decayed_fft = np.maximum(fft, state["last_fft"] * DECAY_RATE)
+        state["last_fft"] = decayed_fft
+        max(np.max(decayed_fft), np.max(fft), 1)
+        return freqs, fft, decayed_fft
+
+    return process
+
+
+def make_engine(chunk, rate):
+    engine = SpectrumEngine(chunk, rate, NOISE_THRESHOLD, DECAY_RATE)
+
+    def process(data):
+        spectrum, decayed = engine.process(data)
+        max(decayed.max(), 1)
+        return engine.freqs, spectrum, decayed
+
+    return process
+
+
+def measure(process, chunks):
+    for data in chunks[:10]:  # Warm up FFT caches
+        process(data)
+    start = time.perf_counter()
+    for data in chunks:
+        process(data)
+    elapsed = (time.perf_counter() - start) / len(chunks)
+
+    tracemalloc.start()
+    for data in chunks:
+        process(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def _time(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1024, 2048, 4096, 8192, 16384])
+    parser.add_argument("--overlap", type=int, default=4, help="Frames per CHUNK in the STFT catch-up test")
+    parser.add_argument("--backlog", type=int, default=16, help="Pending hops in the STFT catch-up test")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'CHUNK':>6} {'budget ms':>10} {'impl':>7} {'ms/frame':>9} {'peak KiB':>9}  x faster")
+    for chunk in args.chunks:
+        chunks = [rng.integers(-3000, 3000, chunk).astype(np.int16) for _ in range(args.frames)]
+        budget = 1000.0 * chunk / args.rate
+        legacy = measure(make_legacy(chunk, args.rate), chunks)
+        engine = measure(make_engine(chunk, args.rate), chunks)
+        for name, (elapsed, peak) in (("legacy", legacy), ("engine", engine)):
+            speedup = legacy[0] / elapsed
+            print(f"{chunk:>6} {budget:>10.1f} {name:>7} {elapsed * 1000:>9.3f} {peak / 1024:>9.1f}  {speedup:.2f}")
+
+    print()
+    print(f"Catching up on {args.backlog} pending hops (hop = CHUNK / {args.overlap}, Hann window)")
+    print(f"{'CHUNK':>6} {'per-hop ms':>11} {'batched ms':>11}  x faster")
+    for chunk in args.chunks:
+        hop = chunk // args.overlap
+        hops = [rng.integers(-3000, 3000, hop).astype(np.int16) for _ in range(args.backlog)]
+        engine = SpectrumEngine(chunk, args.rate, NOISE_THRESHOLD, DECAY_RATE,
+                                window="hann", hop=hop, max_batch=args.backlog)
+        one_by_one = min(_time(lambda: [engine.process_hops([h]) for h in hops]) for _ in range(20))
+        batched = min(_time(lambda: engine.process_hops(hops)) for _ in range(20))
+        print(f"{chunk:>6} {one_by_one * 1000:>11.3f} {batched * 1000:>11.3f}  {one_by_one / batched:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Trail drawing cost in hand-landmark-art, per-shape drawing vs SpriteCache.
+
+Draws five full 15-point fingertip trails (75 shapes) per frame on an
+offscreen pygame display, once with the original per-shape code (a new
+`SRCALPHA` surface and `transform.rotate` for each square, three sines per
+shape) and once with cached sprites and a single `blits` call.
+
+    python benchmarks/bench_sprites.py [--frames 600]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import numpy as np
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.sprites import SpriteCache, trail_styles
+
+TRAIL_LENGTH = 15
+FINGERS = 5
+
+
+def legacy_shape(win, x, y, size, angle, trail_index, ticks):
+    color = (int(255 * abs(math.sin(ticks / 500 + trail_index))),
+             int(255 * abs(math.sin(ticks / 700 + trail_index))),
+             int(255 * abs(math.sin(ticks / 900 + trail_index))))
+    pulse_size = size + int(10 * math.sin(ticks / 200 + trail_index))
+    if trail_index % 3 == 0:
+        pygame.draw.circle(win, color, (x, y), pulse_size, 2)
+    elif trail_index % 3 == 1:
+        half_size = pulse_size / 2
+        points = [(x + half_size * math.cos(angle + k * 2.094), y + half_size * math.sin(angle + k * 2.094))
+                  for k in range(3)]
+        pygame.draw.polygon(win, (255, 255, 255), points, 2)
+    else:
+        square = pygame.Surface((pulse_size, pulse_size), pygame.SRCALPHA)
+        pygame.draw.rect(square, (255, 255, 255), (0, 0, pulse_size, pulse_size), 2)
+        rotated = pygame.transform.rotate(square, angle)
+        win.blit(rotated, rotated.get_rect(center=(x, y)))
+
+
+def legacy_frame(win, trails, ticks, _cache):
+    for trail in trails:
+        for i, (x, y) in enumerate(trail):
+            legacy_shape(win, x, y, 10 + i * 1.5, ticks / 10 + i * 15, i, ticks)
+
+
+def cached_frame(win, trails, ticks, cache):
+    # Every trail shares one sprite per index, looked up once per frame
+    colors, sizes = trail_styles(ticks, TRAIL_LENGTH)
+    shapes = []
+    for i, (size, color) in enumerate(zip(sizes.tolist(), colors.tolist())):
+        angle = ticks / 10 + i * 15
+        if i % 3 == 0:
+            shapes.append(cache.get("circle", size, 0, color))
+        elif i % 3 == 1:
+            shapes.append(cache.get("triangle", size, math.degrees(angle)))
+        else:
+            shapes.append(cache.get("square", size, angle))
+    blits = []
+    for trail in trails:
+        for (x, y), sprite in zip(trail, shapes):
+            if sprite is not None:
+                blits.append((sprite, sprite.get_rect(center=(x, y))))
+    win.blits(blits, doreturn=False)
+
+
+def run(name, draw, win, frames, cache=None):
+    rng = np.random.default_rng(0)
+    times = np.empty(frames)
+    for frame in range(frames):
+        ticks = frame * 1000 // 60
+        trails = rng.integers(100, 800, (FINGERS, TRAIL_LENGTH, 2)).tolist()
+        win.fill((0, 0, 0))
+        start = time.perf_counter()
+        draw(win, trails, ticks, cache)
+        times[frame] = time.perf_counter() - start
+    print(f"{name:<14} {times.mean() * 1e3:>8.3f} {np.percentile(times, 99) * 1e3:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=600)
+    args = parser.parse_args()
+
+    pygame.init()
+    win = pygame.display.set_mode((900, 750))
+    cache = SpriteCache()
+    print(f"{FINGERS * TRAIL_LENGTH} shapes per frame, {args.frames} frames")
+    print(f"{'':<14} {'ms/frame':>8} {'p99 ms':>8}")
+    run("per-shape", legacy_frame, win, args.frames)
+    run("sprite cache", cached_frame, win, args.frames, cache)
+    stats = cache.stats()
+    print(f"cache: {stats['sprites']} sprites, {stats['bytes'] / 1024:.0f} KiB, "
+          f"hit rate {stats['hits'] / max(1, stats['hits'] + stats['misses']):.1%}, {stats['evictions']} evictions")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
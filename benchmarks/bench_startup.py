@@ -0,0 +1,78 @@
+"""Cold start of every visual: process launch to first frame.
+
+Runs each visual a few times with `--startup-only`, which exits once the
+first frame is out, on offscreen drivers and generated inputs (a recorded
+session for the hand apps, tones for the samples and the polar track, the
+synthetic source for the FFT view), and prints the median of the start-up
+report every run writes to stderr.
+
+    python benchmarks/bench_startup.py [--runs 5] [--only hand-landmark-art ...]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from suite import ROOT, write_samples, write_session, write_tone
+
+VISUALS = {
+    "hand-landmark-art": ["hand-landmark-art/main.py", "--replay", "session.sess", "--no-camera-window"],
+    "hand-landmark-art-audio": ["hand-landmark-art-audio/main.py", "--replay", "session.sess",
+                                "--no-camera-window"],
+    "real-time-visualiser": ["real-time-visualiser/erra-fft-viz.py", "--synthetic"],
+    "geometric-polar-plot": ["geometric-polar-plot/main.py", "--audio", "track.wav"],
+}
+REPORT = re.compile(r"startup ([\d.]+) s to first frame \((.*)\)")
+
+
+def make_inputs(directory):
+    write_samples(directory)
+    write_tone(os.path.join(directory, "track.wav"), 220.0, seconds=5.0)
+    write_session(os.path.join(directory, "session.sess"), records=120)
+
+
+def run(args, directory):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", QT_QPA_PLATFORM="offscreen",
+               MPLBACKEND="QtAgg", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    script = os.path.join(ROOT, args[0])
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, script, *args[1:], "--startup-only"], cwd=directory, env=env,
+                            capture_output=True, text=True, timeout=120)
+    wall = time.perf_counter() - start
+    match = REPORT.search(result.stderr)
+    if match is None:
+        raise RuntimeError(f"{args[0]} printed no start-up report:\n{result.stderr[-2000:]}")
+    steps = {}
+    for step in match.group(2).split(", "):
+        label, value = step.rsplit(" ", 2)[:2]
+        steps[label] = float(value)
+    return float(match.group(1)), wall, steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(VISUALS), help="Visuals to time (default: all)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="erraviz-startup-") as directory:
+        make_inputs(directory)
+        run(VISUALS["geometric-polar-plot"], directory)  # Builds the analysis cache once, untimed
+        print(f"median of {args.runs} runs")
+        print(f"{'visual':<26} {'first frame s':>13} {'exit s':>7}  steps (ms)")
+        for name in args.only or VISUALS:
+            runs = [run(VISUALS[name], directory) for _ in range(args.runs)]
+            total = np.median([r[0] for r in runs])
+            wall = np.median([r[1] for r in runs])
+            steps = "  ".join(f"{label} {np.median([r[2][label] for r in runs]):.0f}" for label in runs[0][2])
+            print(f"{name:<26} {total:>13.3f} {wall:>7.3f}  {steps}")
+
+
+if __name__ == "__main__":
+    main()
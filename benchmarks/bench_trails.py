@@ -0,0 +1,88 @@
+"""Trail cost over trail length, full redraw vs incremental FadeLayer.
+
+Moves five fingertips for a number of frames on an offscreen pygame display
+and draws their trails of cached sprites, once by clearing the window and
+redrawing every stored point and once by stamping only the new points into a
+FadeLayer. The redraw grows with the trail length, the incremental mode
+stays flat.
+
+    python benchmarks/bench_trails.py [--frames 600] [--lengths 15 60 240]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import numpy as np
+import pygame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.sprites import SpriteCache
+from erraviz.trails import FadeLayer, TrailBuffer
+
+FINGERS = 5
+SIZE = (900, 750)
+
+
+def shapes_for(cache, length):
+    kinds = ("circle", "triangle", "square")
+    return [cache.get(kinds[i % 3], 10 + (i % 15) * 1.5, i * 15, (200, 120, 60)) for i in range(length)]
+
+
+def run(win, length, frames, incremental, cache):
+    rng = np.random.default_rng(0)
+    trails = [TrailBuffer(length) for _ in range(FINGERS)]
+    stamped = [0] * FINGERS
+    layer = FadeLayer(SIZE, FadeLayer.fade_for(length))
+    shapes = shapes_for(cache, length)
+    times = np.empty(frames)
+    for frame in range(frames):
+        points = rng.integers(100, 700, (FINGERS, 2)).tolist()
+        start = time.perf_counter()
+        blits = []
+        for finger, trail in enumerate(trails):
+            trail.push(*points[finger])
+        if incremental:
+            layer.fade()
+            for finger, trail in enumerate(trails):
+                seqs, new = trail.since(stamped[finger])
+                stamped[finger] = trail.pushed
+                for seq, (x, y) in zip(seqs.tolist(), new.tolist()):
+                    sprite = shapes[seq % length]
+                    blits.append((sprite, sprite.get_rect(center=(x, y))))
+            layer.stamp(blits)
+            layer.draw(win)
+        else:
+            win.fill((0, 0, 0))
+            for trail in trails:
+                for (x, y), sprite in zip(trail.ordered().tolist(), shapes):
+                    blits.append((sprite, sprite.get_rect(center=(x, y))))
+            win.blits(blits, doreturn=False)
+        times[frame] = time.perf_counter() - start
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[15, 60, 240])
+    args = parser.parse_args()
+
+    pygame.init()
+    win = pygame.display.set_mode(SIZE)
+    cache = SpriteCache()
+    print(f"{FINGERS} trails, {args.frames} frames")
+    print(f"{'length':>6} {'redraw ms':>10} {'p99':>6} {'incremental ms':>15} {'p99':>6}")
+    for length in args.lengths:
+        redraw = run(win, length, args.frames, False, cache)
+        incremental = run(win, length, args.frames, True, cache)
+        print(f"{length:>6} {redraw.mean() * 1e3:>10.3f} {np.percentile(redraw, 99) * 1e3:>6.2f} "
+              f"{incremental.mean() * 1e3:>15.3f} {np.percentile(incremental, 99) * 1e3:>6.2f}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
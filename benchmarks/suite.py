@@ -0,0 +1,504 @@
+"""Offline benchmark suite for the hot paths of all four visuals, with a run history.
+
+Every case runs in this process on headless backends (SDL dummy video and
+audio, Qt offscreen, Agg) and synthetic inputs (the synthetic audio source,
+generated hand landmarks, replayed sessions and sample tones), so it needs no
+camera, microphone or display:
+
+- fft.update[MODE]: one capture hop through the shared ring, the spectrum and
+  the repaint of both curves in `erra-fft-viz.py`
+- fft.analyse[N ch]: four pending hops of N interleaved channels through the
+  spectrum stage (one batched FFT and band mapping for all of them)
+- fft.waterfall@HISTORY: adding the spectra of one repaint (four hops) to the
+  spectrogram history, which should cost the same however long it is
+- polar.update@UPTIME: `PolarScene.update` plus the blitted redraw after the
+  scene has been running that long
+- hands.postprocess[N]: a mediapipe result with N hands to slot-ordered
+  `Hands` with fingertips, palm centres and bend angles
+- hand-art.update_fingers / hand-audio.update_fingers: drawing (and, in the
+  audio app, triggering) one replayed session record, full and incremental
+- video.capture[WxH]: the render loop's share of recording a window: grabbing
+  the surface into a free frame and handing it to the encoder thread
+
+`run` appends the per-case median, p95 and mean to a JSON-lines history file;
+`compare` checks two runs of it (by default the last two) and exits with
+status 1 when a case got slower than the threshold.
+
+    python benchmarks/suite.py run [--only fft polar] [--iterations 300] [--label NAME]
+    python benchmarks/suite.py compare [--base -2] [--head -1] [--threshold 0.15]
+    python benchmarks/suite.py list
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("MPLBACKEND", "Agg")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import importlib.util
+import json
+import math
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, ROOT)
+from erraviz.landmarks import FINGER_CHAINS, LANDMARKS_PER_HAND, Hands, extract_hands
+from erraviz.session import SessionRecorder, SessionReplay
+from erraviz.tracking import HandTracker, by_slot
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.jsonl")
+CAMERA_SIZE = (640, 480)
+SESSION_FPS = 30
+SAMPLES = ("bass.wav", "atmosphere.wav", "hithat.wav", "beep_loop.wav", "synth.wav")
+
+
+# Synthetic inputs
+
+def synthetic_hands(t, count=2):
+    """(count, 21, 3) normalised landmarks of open hands drifting and curling their fingers at time `t`."""
+    landmarks = np.zeros((count, LANDMARKS_PER_HAND, 3), dtype=np.float32)
+    for hand in range(count):
+        x = (hand + 0.5) / count + 0.05 * math.sin(0.7 * t + hand)
+        y = 0.75 + 0.05 * math.cos(0.9 * t + hand)
+        for finger, chain in enumerate(FINGER_CHAINS):
+            heading = -math.pi / 2 + (finger - 2) * 0.35
+            bend = 0.6 * (0.5 + 0.5 * math.sin(2.0 * t + 1.3 * finger + hand))  # Per joint, in radians
+            px, py = (x, y) if finger == 0 else (x + 0.08 * math.cos(heading), y + 0.08 * math.sin(heading))
+            landmarks[hand, chain[0], :2] = px, py
+            for joint, landmark in enumerate(chain[1:].tolist()):
+                if joint:
+                    heading += bend
+                px, py = px + 0.04 * math.cos(heading), py + 0.04 * math.sin(heading)
+                landmarks[hand, landmark] = px, py, -0.01 * joint
+    return landmarks
+
+
+def mediapipe_result(normalized):
+    """A stand-in for `hands.process()` output carrying `normalized` landmarks."""
+    hands = [SimpleNamespace(landmark=[SimpleNamespace(x=float(x), y=float(y), z=float(z))
+                                       for x, y, z in hand.tolist()]) for hand in normalized]
+    return SimpleNamespace(multi_hand_landmarks=hands or None)
+
+
+def write_session(path, records=300, hands=2):
+    """A recorded session of `synthetic_hands`, one record per camera frame."""
+    width, height = CAMERA_SIZE
+    with SessionRecorder(path, width, height, max_hands=hands) as recorder:
+        for index in range(records):
+            normalized = synthetic_hands(index / SESSION_FPS, hands)
+            points = (normalized[..., :2] * [width, height]).astype(np.int64)
+            recorder.record(index / SESSION_FPS, Hands(normalized, points))
+
+
+def write_tone(path, frequency, seconds=1.0, rate=44100):
+    """A decaying sine as 16-bit mono WAV."""
+    t = np.arange(int(seconds * rate)) / rate
+    samples = (0.5 * np.sin(2 * np.pi * frequency * t) * np.exp(-3 * t) * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+
+
+def write_samples(directory):
+    for i, name in enumerate(SAMPLES):
+        write_tone(os.path.join(directory, name), 110.0 * (i + 1))
+
+
+def load_script(name, relative_path):
+    """Import one of the visuals' scripts (their file names aren't module names)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, os.path.dirname(spec.origin))
+    spec.loader.exec_module(module)
+    return module
+
+
+# Cases: each factory sets up its inputs and returns a `step(i)` to be timed, optionally
+# with a `step.before(i)` that runs untimed ahead of each call and a `step.close()`
+
+
+def fft_update(band_mode):
+    def setup(workdir):
+        import pyqtgraph as pg
+        from erraviz.shm_ring import SharedRingBuffer
+        from erraviz.sources import SyntheticSource
+        from erraviz.stages import RingSource, SpectrumProcessor
+        from erraviz.stats import FrameStats
+
+        viz = load_script("erra_fft_viz", "real-time-visualiser/erra-fft-viz.py")
+        viz.BAND_MODE = band_mode
+        pg.mkQApp()
+        viz.ring = ring = SharedRingBuffer(viz.HOP, slots=viz.RING_SLOTS, dtype=np.int16, notify=True)
+        viz.frame_stats = FrameStats()
+        viz.build_window().show()
+        source = RingSource(ring)
+        fmin = viz.BAND_FMIN if band_mode != "linear" else 0
+        spectrum = SpectrumProcessor(viz.CHUNK, viz.RATE, viz.NOISE_THRESHOLD, viz.DECAY_RATE, window=viz.WINDOW,
+                                     hop=viz.HOP, max_batch=viz.RING_SLOTS - 1,
+                                     bands=(band_mode, viz.BAND_COUNT, fmin, viz.BAND_FMAX))
+        spectrum.open()
+        audio = SyntheticSource(viz.RATE, realtime=False).open()
+        hops = [(audio.read(viz.HOP) * 32767).astype(np.int16) for _ in range(64)]
+
+        def before(i):
+            ring.write(hops[i % len(hops)])  # The capture process's part, not timed
+
+        def step(i):
+            viz.draw(spectrum.process(source.read()))
+
+        def close():
+            ring.close()
+            ring.unlink()
+
+        step.before, step.close = before, close
+        return step
+    return setup
+
+
+def fft_analyse(channels):
+    def setup(workdir):
+        from erraviz.sources import SyntheticSource
+        from erraviz.stages import SpectrumProcessor
+
+        viz = load_script("erra_fft_viz", "real-time-visualiser/erra-fft-viz.py")
+        spectrum = SpectrumProcessor(viz.CHUNK, viz.RATE, viz.NOISE_THRESHOLD, viz.DECAY_RATE, window=viz.WINDOW,
+                                     hop=viz.HOP, bands=("linear", viz.BAND_COUNT, 0, viz.BAND_FMAX),
+                                     channels=channels)
+        spectrum.open()
+        audio = SyntheticSource(viz.RATE, realtime=False, channels=channels).open()
+        # Interleaved hops as they come out of the ring
+        blocks = [list(audio.read(viz.HOP * 4).reshape(4, -1)) for _ in range(16)]
+
+        def step(i):
+            spectrum.process({"hops": blocks[i % len(blocks)]})
+
+        return step
+    return setup
+
+
+def fft_waterfall(seconds):
+    def setup(workdir):
+        from erraviz.sources import SyntheticSource
+        from erraviz.stages import SpectrumProcessor
+        from erraviz.waterfall import Waterfall
+
+        viz = load_script("erra_fft_viz", "real-time-visualiser/erra-fft-viz.py")
+        spectrum = SpectrumProcessor(viz.CHUNK, viz.RATE, viz.NOISE_THRESHOLD, viz.DECAY_RATE, window=viz.WINDOW,
+                                     hop=viz.HOP, bands=("linear", viz.BAND_COUNT, 0, viz.BAND_FMAX), every_hop=True)
+        spectrum.open()
+        audio = SyntheticSource(viz.RATE, realtime=False).open()
+        blocks = [(audio.read(viz.HOP * 4) * 32767).astype(np.int16).reshape(4, viz.HOP) for _ in range(16)]
+        batches = [spectrum.process({"hops": hops})["spectra"].copy() for hops in blocks]
+        waterfall = Waterfall(int(seconds * viz.RATE / viz.HOP), len(spectrum.freqs), reference=32768)
+
+        def step(i):
+            waterfall.push(batches[i % len(batches)])
+
+        return step
+    return setup
+
+
+def polar_update(minutes):
+    def setup(workdir):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        sys.path.insert(0, os.path.join(ROOT, "geometric-polar-plot"))
+        from scene import PolarScene
+
+        fig = Figure(figsize=(5.4, 9.6), dpi=100)
+        canvas = FigureCanvasAgg(fig)
+        scene = PolarScene(fig)
+        start = int(minutes * 60 * SESSION_FPS)
+        scene.warm_up(start, SESSION_FPS)
+        for artist in scene.artists:
+            artist.set_animated(True)
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+
+        def step(i):
+            # What the live blitted animation does per frame
+            artists = scene.update(start + i)
+            canvas.restore_region(background)
+            for artist in artists:
+                scene.ax.draw_artist(artist)
+            canvas.blit(fig.bbox)
+
+        return step
+    return setup
+
+
+def hands_postprocess(count):
+    def setup(workdir):
+        width, height = CAMERA_SIZE
+        results = [mediapipe_result(synthetic_hands(i / SESSION_FPS, count)) for i in range(SESSION_FPS * 10)]
+        tracker = HandTracker(max(count, 1))
+
+        def step(i):
+            hands = extract_hands(results[i % len(results)], width, height)
+            tracked, slots = by_slot(hands, tracker.update(hands, i / SESSION_FPS))
+            if tracked is not None:
+                tracked.fingertips.tolist(), tracked.palm_centers.tolist(), tracked.bend_angles
+        return step
+    return setup
+
+
+def replayed_items(path):
+    """Session records as tracked pipeline items, as `TrackProcessor` hands them to the draw stage."""
+    tracker = HandTracker(2)
+    items = []
+    for timestamp, img, hands in SessionReplay(path, realtime=False):
+        tracked, slots = by_slot(hands, tracker.update(hands, timestamp))
+        items.append({"time": timestamp, "image": img, "hands": hands, "fresh": True,
+                      "tracked": tracked, "slots": slots})
+    return items
+
+
+def update_fingers(app, incremental):
+    def setup(workdir):
+        import pygame
+
+        path = os.path.join(workdir, "session.sess")
+        if not os.path.exists(path):
+            write_session(path)
+        items = replayed_items(path)
+        if app == "hand-audio":
+            module = load_script("hand_audio", "hand-landmark-art-audio/main.py")
+            pygame.mixer.pre_init(module.MIXER_RATE, -16, 2, module.MIXER_BUFFER)
+        else:
+            module = load_script("hand_art", "hand-landmark-art/main.py")
+        pygame.init()
+        surface = pygame.display.set_mode((module.WIDTH, module.HEIGHT))
+        if app == "hand-audio":
+            write_samples(workdir)
+            cwd = os.getcwd()
+            os.chdir(workdir)  # The sound banks are relative paths
+            try:
+                module.open_window(surface, measure_latency=False)
+            finally:
+                os.chdir(cwd)
+        else:
+            module.open_window(surface)
+        module.incremental_trails = incremental
+        module.performers = [[module.Finger() for _ in range(5)] for _ in range(module.MAX_HANDS)]
+
+        def step(i):
+            module.draw(surface, items[i % len(items)])
+        return step
+    return setup
+
+
+def video_capture(size):
+    def setup(workdir):
+        import pygame
+        from erraviz.video import VideoEncoder, grab_surface, surface_channels
+
+        pygame.init()
+        surface = pygame.display.set_mode(size, pygame.HIDDEN)
+        encoder = VideoEncoder(os.path.join(workdir, "capture.mp4"), size, SESSION_FPS, block=True,
+                               channels=surface_channels(surface)).open()
+        frames = []
+
+        def before(i):
+            surface.fill((i % 256, 64, 128))
+            frames.append(encoder.frame())  # Waiting for the encoder is not the render loop's cost
+
+        def step(i):
+            frame = frames.pop()
+            grab_surface(surface, frame)
+            encoder.submit(frame, i / SESSION_FPS)
+
+        def close():
+            encoder.close()
+            pygame.quit()
+
+        step.before, step.close = before, close
+        return step
+    return setup
+
+
+CASES = {
+    "fft.update[linear]": fft_update("linear"),
+    "fft.update[log]": fft_update("log"),
+    "fft.analyse[1ch]": fft_analyse(1),
+    "fft.analyse[2ch]": fft_analyse(2),
+    "fft.analyse[4ch]": fft_analyse(4),
+    "fft.waterfall@8s": fft_waterfall(8),
+    "fft.waterfall@10min": fft_waterfall(600),
+    "polar.update@10s": polar_update(10 / 60),
+    "polar.update@1min": polar_update(1),
+    "polar.update@10min": polar_update(10),
+    "polar.update@60min": polar_update(60),
+    "hands.postprocess[1]": hands_postprocess(1),
+    "hands.postprocess[2]": hands_postprocess(2),
+    "hand-art.update_fingers": update_fingers("hand-art", False),
+    "hand-art.update_fingers[incremental]": update_fingers("hand-art", True),
+    "hand-audio.update_fingers": update_fingers("hand-audio", False),
+    "hand-audio.update_fingers[incremental]": update_fingers("hand-audio", True),
+    "video.capture[900x750]": video_capture((900, 750)),
+    "video.capture[1920x1080]": video_capture((1920, 1080)),
+}
+
+
+# Running
+
+
+def time_case(setup, workdir, iterations, warmup):
+    """Per-call times in seconds of the case's `step`, after `warmup` untimed calls."""
+    step = setup(workdir)
+    before = getattr(step, "before", None)
+    times = np.empty(iterations)
+    try:
+        for i in range(warmup + iterations):
+            if before is not None:
+                before(i)
+            start = time.perf_counter()
+            step(i)
+            if i >= warmup:
+                times[i - warmup] = time.perf_counter() - start
+    finally:
+        if hasattr(step, "close"):
+            step.close()
+    return times
+
+
+def summarize(times):
+    p50, p95 = np.percentile(times, (50, 95)) * 1e6
+    return {"median_us": round(p50, 2), "p95_us": round(p95, 2), "mean_us": round(times.mean() * 1e6, 2),
+            "n": len(times)}
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def selected(only):
+    if not only:
+        return list(CASES)
+    names = [name for name in CASES if any(name.startswith(prefix) for prefix in only)]
+    if not names:
+        raise SystemExit(f"No case matches {' '.join(only)}; see `suite.py list`")
+    return names
+
+
+def run(args):
+    commit, dirty = git_revision()
+    record = {"time": datetime.now(timezone.utc).isoformat(timespec="seconds"), "label": args.label,
+              "commit": commit, "dirty": dirty,
+              "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                          "platform": platform.platform(), "processor": platform.processor() or platform.machine()},
+              "iterations": args.iterations, "cases": {}}
+    with tempfile.TemporaryDirectory(prefix="erraviz-bench-") as workdir:
+        for name in selected(args.only):
+            try:
+                times = time_case(CASES[name], workdir, args.iterations, args.warmup)
+            except Exception as e:
+                print(f"Error running {name}: {e}")
+                continue
+            record["cases"][name] = summarize(times)
+            stats = record["cases"][name]
+            print(f"{name:<42} median {stats['median_us']:>9.1f} us   p95 {stats['p95_us']:>9.1f} us")
+    if args.history != "-":
+        with open(args.history, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Appended run to {args.history}")
+
+
+def load_history(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def describe(record):
+    revision = record.get("commit") or "?"
+    if record.get("dirty"):
+        revision += "+"
+    label = f" {record['label']}" if record.get("label") else ""
+    return f"{record['time']} {revision}{label}"
+
+
+def compare(args):
+    history = load_history(args.history)
+    try:
+        base, head = history[args.base], history[args.head]
+    except IndexError:
+        raise SystemExit(f"{args.history} has {len(history)} runs; run the suite (at least) twice first")
+    print(f"base: {describe(base)}\nhead: {describe(head)}")
+    if base.get("machine") != head.get("machine"):
+        print("warning: the runs come from different machines or Python/NumPy versions")
+
+    regressions = []
+    print(f"{'case':<42} {'base us':>10} {'head us':>10} {'change':>8}")
+    for name, stats in head["cases"].items():
+        if name not in base["cases"]:
+            print(f"{name:<42} {'-':>10} {stats['median_us']:>10.1f}      new")
+            continue
+        before, after = base["cases"][name]["median_us"], stats["median_us"]
+        change = after / before - 1 if before else 0.0
+        # Sub-microsecond differences are timer noise whatever the ratio
+        regressed = change > args.threshold and after - before > args.min_us
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<42} {before:>10.1f} {after:>10.1f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than +{args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Time the cases and append the results to the history")
+    run_parser.add_argument("--only", nargs="+", metavar="PREFIX", help="Cases starting with these prefixes")
+    run_parser.add_argument("--iterations", type=int, default=300, help="Timed calls per case")
+    run_parser.add_argument("--warmup", type=int, default=20, help="Untimed calls before timing")
+    run_parser.add_argument("--label", help="Note stored with the run, e.g. a branch name")
+    run_parser.add_argument("--history", default=HISTORY, help="History file ('-' to not record the run)")
+
+    compare_parser = commands.add_parser("compare", help="Flag cases that got slower between two runs")
+    compare_parser.add_argument("--base", type=int, default=-2, help="Index of the baseline run in the history")
+    compare_parser.add_argument("--head", type=int, default=-1, help="Index of the run to check")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="Relative median slowdown counted as a regression")
+    compare_parser.add_argument("--min-us", type=float, default=1.0,
+                                help="Ignore slowdowns smaller than this many microseconds")
+    compare_parser.add_argument("--history", default=HISTORY)
+
+    commands.add_parser("list", help="List the cases")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        compare(args)
+    else:
+        print("\n".join(CASES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Shared building blocks for the Erra P. visuals.
+
+Each visual lives in its own folder and runs as a plain script; anything that
+more than one of them needs (or that is worth optimising in one place) lives
+here.
+"""
@@ -0,0 +1,170 @@
+"""Offline analysis track for audio-reactive visuals.
+
+A track is decoded once to mono int16 PCM and analysed into per-frame
+features: RMS envelope, onset strength (spectral flux), low/mid/high band
+energies and an estimated beat grid. Everything is written as `.npy` files to
+a cache directory keyed by a hash of the audio file, so a repeat play just
+memory-maps the arrays and each visual frame is an O(1) lookup by playback
+position.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ANALYSIS_VERSION = 2  # Bump when the features change so old caches are rebuilt
+FEATURES = ("rms", "onset", "bands", "beat_phase")
+BAND_EDGES_HZ = (250.0, 4000.0)  # low | mid | high
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def decode_with_pygame(path):
+    """Decode any file pygame.mixer can play to `(mono int16 samples, rate)`.
+
+    Needs `pygame.mixer` to be initialised; samples come out at the mixer rate.
+    """
+    import pygame
+
+    rate = pygame.mixer.get_init()[0]
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    is_float = samples.dtype.kind == "f"  # Checked before averaging, which always gives floats
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    if is_float:
+        samples = np.clip(samples, -1.0, 1.0) * 32767
+    return samples.astype(np.int16), rate
+
+
+def _normalise(values, percentile=99.0):
+    scale = np.percentile(values, percentile) if len(values) else 0.0
+    return np.clip(values / scale, 0.0, 1.0) if scale > 0 else np.zeros_like(values)
+
+
+def compute_features(samples, rate, hop=512, frame=2048, block=512, min_bpm=60, max_bpm=200):
+    """Return `(features, meta)` for mono int16 `samples`; see the module docstring."""
+    count = max(0, (len(samples) - frame) // hop + 1)
+    window = np.hanning(frame)
+    freqs = np.fft.rfftfreq(frame, 1.0 / rate)
+    band_of_bin = np.searchsorted(BAND_EDGES_HZ, freqs)  # 0 = low, 1 = mid, 2 = high
+
+    rms = np.empty(count)
+    flux = np.empty(count)
+    bands = np.empty((count, 3))
+    previous = None
+    for first in range(0, count, block):
+        n = min(block, count - first)
+        chunk = samples[first * hop:first * hop + (n - 1) * hop + frame].astype(np.float64) / 32768.0
+        frames = sliding_window_view(chunk, frame)[::hop]
+        rms[first:first + n] = np.sqrt(np.mean(frames ** 2, axis=1))
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        for band in range(3):
+            bands[first:first + n, band] = power[:, band_of_bin == band].sum(axis=1)
+        log_mag = np.log1p(np.sqrt(power))
+        if previous is None:
+            previous = log_mag[0]
+        diff = np.diff(log_mag, axis=0, prepend=previous[None, :])
+        flux[first:first + n] = np.maximum(diff, 0.0).sum(axis=1)
+        previous = log_mag[-1]
+
+    onset = _normalise(flux)
+    tempo, phase = estimate_beat_grid(onset, rate / hop, min_bpm, max_bpm)
+    period = 60.0 / tempo * rate / hop  # Frames per beat
+    beat_phase = ((np.arange(count) - phase) / period) % 1.0
+
+    features = {
+        "rms": _normalise(rms).astype(np.float32),
+        "onset": onset.astype(np.float32),
+        "bands": np.stack([_normalise(np.sqrt(bands[:, b])) for b in range(3)], axis=1).astype(np.float32),
+        "beat_phase": beat_phase.astype(np.float32),
+    }
+    meta = {"version": ANALYSIS_VERSION, "rate": rate, "hop": hop, "frame": frame,
+            "frames": count, "tempo": tempo, "beat_offset_frames": phase}
+    return features, meta
+
+
+def estimate_beat_grid(onset, frame_rate, min_bpm=60, max_bpm=200):
+    """Tempo (BPM) from the onset autocorrelation and the beat offset (in frames) that fits it best."""
+    if len(onset) < 4:
+        return 120.0, 0.0
+    envelope = onset - onset.mean()
+    size = 1 << int(np.ceil(np.log2(2 * len(envelope))))
+    spectrum = np.fft.rfft(envelope, size)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), size)[:len(envelope)]
+    lags = np.arange(len(autocorr))
+    bpm = np.divide(60.0 * frame_rate, lags, out=np.zeros(len(lags)), where=lags > 0)
+    valid = (bpm >= min_bpm) & (bpm <= max_bpm)
+    if not valid.any():
+        return 120.0, 0.0
+    # Periodic onsets correlate at every multiple of the beat; a broad prior
+    # around 120 BPM picks the musically likely one instead of half/double tempo
+    prior = np.exp(-0.5 * np.log2(bpm[valid] / 120.0) ** 2)
+    lag = lags[valid][np.argmax(autocorr[valid] * prior)]
+    # Phase: the offset whose comb of beats collects the most onset energy
+    usable = len(onset) // lag * lag
+    offset = int(np.argmax(onset[:usable].reshape(-1, lag).sum(axis=0)))
+    return 60.0 * frame_rate / lag, float(offset)
+
+
+class AudioAnalysis:
+    """Memory-mapped features of one track, looked up by playback time."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in FEATURES:
+            setattr(self, name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r"))
+        self.frames = self.meta["frames"]
+        self.frame_rate = self.meta["rate"] / self.meta["hop"]
+        self.tempo = self.meta["tempo"]
+        self.duration = self.frames / self.frame_rate
+
+    @classmethod
+    def load_or_build(cls, audio_path, cache_dir=None, decode=decode_with_pygame, **params):
+        """Load the cached analysis of `audio_path`, building (and caching) it on first use."""
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(audio_path)), ".erraviz-cache")
+        key = f"{file_hash(audio_path)}-v{ANALYSIS_VERSION}"
+        if params:
+            key += "-" + "-".join(f"{name}{params[name]}" for name in sorted(params))
+        directory = os.path.join(cache_dir, key)
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            os.makedirs(cache_dir, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=cache_dir)
+            try:
+                pcm_path = os.path.join(staging, "pcm.npy")
+                samples, rate = decode(audio_path)
+                np.save(pcm_path, samples)
+                del samples
+                features, meta = compute_features(np.load(pcm_path, mmap_mode="r"), rate, **params)
+                for name, values in features.items():
+                    np.save(os.path.join(staging, name + ".npy"), values)
+                with open(os.path.join(staging, "meta.json"), "w") as f:
+                    json.dump(meta, f, indent=2)
+                shutil.rmtree(directory, ignore_errors=True)  # Leftovers of an interrupted build
+                os.replace(staging, directory)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        return cls(directory)
+
+    @property
+    def pcm_path(self):
+        """The decoded mono int16 track, loadable with `np.load(..., mmap_mode='r')`."""
+        return os.path.join(self.directory, "pcm.npy")
+
+    def index(self, seconds):
+        """Feature frame for a playback position, wrapping for looped playback."""
+        return int(seconds * self.frame_rate) % self.frames if self.frames else 0
@@ -0,0 +1,119 @@
+"""Headless batch rendering of FFT visualiser spectra.
+
+Memory-maps each audio file and computes every STFT frame in large vectorized
+blocks, as fast as the CPU allows rather than at playback pace. The raw and
+decayed spectra go to one `.npz` per track, ready to drive pre-rendered
+visuals:
+
+    python -m erraviz.batch album/*.wav --out-dir spectra/
+
+Each archive holds `raw` and `decayed` arrays of shape (frames, bins), the
+`freqs` axis, `times` (the end of each frame, in seconds) and the analysis
+parameters.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .sources import FileSource, to_int16
+from .spectrum import SpectrumEngine
+
+DEFAULTS = {
+    "chunk": 2048,
+    "hop": 512,
+    "window": "hann",
+    "noise_threshold": 0.02,
+    "decay_rate": 0.9,
+}
+
+
+def compute_spectra(samples, rate, chunk=2048, hop=512, window="hann", noise_threshold=0.02,
+                    decay_rate=0.9, block=512, dtype=np.float32):
+    """Return `(freqs, raw, decayed)` for every frame of a `(frames, channels)` sample array.
+
+    Frames start every `hop` samples from the beginning of the track. The
+    peak-hold follows the same recurrence as the live view,
+    decayed[t] = max(raw[t], decay * decayed[t - 1]) with the per-frame
+    decay = decay_rate ** (hop / chunk), but is evaluated a whole block at a
+    time as a running maximum of raw[t] / decay ** t.
+    """
+    samples = samples.reshape(len(samples), -1)
+    total = max(0, (len(samples) - chunk) // hop + 1)
+    decay = decay_rate ** (hop / chunk)
+    if 0 < decay < 1:
+        # Keep decay ** -block well inside float64 range
+        block = max(1, min(block, int(600 / -math.log(decay))))
+    engine = SpectrumEngine(chunk, rate, noise_threshold, decay_rate, window=window, hop=hop, max_batch=block)
+    raw = np.empty((total, engine.bins), dtype=dtype)
+    decayed = np.empty((total, engine.bins), dtype=dtype)
+
+    steps = np.arange(block, dtype=np.float64)
+    shrink = (decay ** steps)[:, None]
+    grow = np.zeros_like(shrink) if decay == 0 else 1.0 / shrink
+    carry = np.zeros(engine.bins)
+    for first in range(0, total, block):
+        count = min(block, total - first)
+        start = first * hop
+        mono = to_int16(samples[start:start + (count - 1) * hop + chunk])
+        spectra = engine.spectra(sliding_window_view(mono, chunk)[::hop])
+        raw[first:first + count] = spectra
+
+        if decay == 0:
+            decayed[first:first + count] = spectra
+            continue
+        held = spectra * grow[:count]
+        np.maximum.accumulate(held, axis=0, out=held)
+        held *= shrink[:count]
+        np.maximum(held, carry * (decay * shrink[:count]), out=held)
+        decayed[first:first + count] = held
+        carry = held[-1]
+    return engine.freqs, raw, decayed
+
+
+def render_file(path, out_path, dtype=np.float32, block=512, **params):
+    """Analyse one audio file and save its spectra to `out_path` (.npz)."""
+    params = {**DEFAULTS, **params}
+    source = FileSource(path, realtime=False).open()
+    try:
+        freqs, raw, decayed = compute_spectra(source.samples, source.rate, block=block, dtype=dtype, **params)
+    finally:
+        source.close()
+    times = (np.arange(len(raw)) * params["hop"] + params["chunk"]) / source.rate
+    np.savez(out_path, raw=raw, decayed=decayed, freqs=freqs.astype(np.float32), times=times,
+             rate=source.rate, **params)
+    return len(raw)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render FFT visualiser spectra for audio files.")
+    parser.add_argument("files", nargs="+", help="WAV files to analyse")
+    parser.add_argument("--out-dir", default=None, help="Where to write the .npz files (default: next to each track)")
+    parser.add_argument("--chunk", type=int, default=DEFAULTS["chunk"])
+    parser.add_argument("--hop", type=int, default=DEFAULTS["hop"])
+    parser.add_argument("--window", default=DEFAULTS["window"])
+    parser.add_argument("--noise-threshold", type=float, default=DEFAULTS["noise_threshold"])
+    parser.add_argument("--decay-rate", type=float, default=DEFAULTS["decay_rate"])
+    parser.add_argument("--block", type=int, default=512, help="Frames analysed per vectorized block")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float32")
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        out_dir = args.out_dir or os.path.dirname(os.path.abspath(path))
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".spectra.npz")
+        start = time.perf_counter()
+        frames = render_file(path, out_path, dtype=np.dtype(args.dtype), block=args.block,
+                             chunk=args.chunk, hop=args.hop, window=args.window,
+                             noise_threshold=args.noise_threshold, decay_rate=args.decay_rate)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {frames} frames in {elapsed:.2f}s -> {out_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Audio reactivity from precomputed sample envelopes instead of a live FFT.
+
+Every sample a visual can trigger is analysed once (through `AudioAnalysis`,
+so it is decoded with `pygame.sndarray` and cached on disk) into an RMS
+envelope and low/mid/high band energies at a few milliseconds' resolution.
+`SampleEnvelopes` packs them into padded arrays, so the level of every
+playing voice is one fancy-indexing lookup at its playback offset: no audio
+capture, no FFT and no extra thread at render time.
+"""
+
+import numpy as np
+
+from .analysis import AudioAnalysis, decode_with_pygame
+
+ENVELOPE_HOP = 256  # 5.8 ms at 44.1 kHz
+ENVELOPE_FRAME = 1024
+
+
+class SampleEnvelopes:
+    """RMS and band envelopes of `paths`, sampled at voice playback offsets.
+
+    Paths may repeat (e.g. the same file in two sound banks); each file is
+    analysed once. Needs `pygame.mixer` initialised the first time a sample
+    is analysed.
+    """
+
+    def __init__(self, paths, cache_dir=None, decode=decode_with_pygame, hop=ENVELOPE_HOP, frame=ENVELOPE_FRAME):
+        analyses = {}
+        for path in paths:
+            if path not in analyses:
+                analyses[path] = AudioAnalysis.load_or_build(path, cache_dir=cache_dir, decode=decode,
+                                                             hop=hop, frame=frame)
+        first = next(iter(analyses.values()))
+        self.frame_rate = first.frame_rate
+        self.frames = np.array([analyses[path].frames for path in paths])
+        width = max(1, int(self.frames.max()))
+        # One padded row per sound; the extra last column stays silent for finished or idle voices
+        self.rms = np.zeros((len(paths), width + 1), dtype=np.float32)
+        self.bands = np.zeros((len(paths), width + 1, 3), dtype=np.float32)
+        for row, path in enumerate(paths):
+            analysis = analyses[path]
+            self.rms[row, :analysis.frames] = analysis.rms
+            # Each band is normalised on its own, so a near-silent band of a tonal sample would read
+            # as loud; weighting by the overall envelope keeps quiet bands quiet
+            self.bands[row, :analysis.frames] = analysis.bands * np.asarray(analysis.rms)[:, None]
+
+    def sample(self, offsets):
+        """Levels of every sound at `offsets` (seconds, shape `(sounds, voices)`, NaN when idle).
+
+        Returns `(rms, bands)` with shapes `(sounds,)` and `(sounds, 3)`, summed
+        over each sound's voices.
+        """
+        index = np.floor(np.nan_to_num(offsets, nan=-1.0) * self.frame_rate).astype(np.int64)
+        silent = (index < 0) | (index >= self.frames[:, None])
+        index[silent] = self.rms.shape[1] - 1
+        rows = np.arange(len(self.rms))[:, None]
+        return self.rms[rows, index].sum(axis=1), self.bands[rows, index].sum(axis=1)
@@ -0,0 +1,142 @@
+"""Frame-time governor: trade visual detail for frame rate on slow machines.
+
+A visual registers its "quality knobs" (glitch lines, trail length, particle
+cap, curve resolution, antialiasing, ...) with a `QualityGovernor`, each as a
+list of settings from best to cheapest and a function that applies one. The
+governor is fed the work time of every frame (a `Pipeline` does that when it
+is given one) and, about once a second, looks at the rolling p95: over the
+frame budget it turns the first knob that still can be turned down one
+level; well under it for a few seconds, it turns the last lowered knob back
+up. Register knobs cheapest-to-lose first.
+"""
+
+import time
+
+import numpy as np
+
+
+class Knob:
+    """One quality setting: `levels` from best to cheapest, `apply(value)` switches the visual to one."""
+
+    def __init__(self, name, levels, apply):
+        self.name = name
+        self.levels = list(levels)
+        self.apply = apply
+        self.level = 0
+
+    @property
+    def value(self):
+        return self.levels[self.level]
+
+    def set_level(self, level):
+        self.level = min(max(int(level), 0), len(self.levels) - 1)
+        self.apply(self.value)
+
+
+class QualityGovernor:
+    """Hold `target_fps` by stepping knobs down when frames run over budget and up when there is room.
+
+    Decisions use the `percentile` of the last `window` frame times, every
+    `interval` seconds. Quality only goes up after `up_after` seconds with
+    the percentile below `headroom` times the budget; when a step up is
+    undone within that time, the wait doubles (up to `max_up_after`) so a
+    knob right at the edge doesn't flip back and forth. Frames that ran over
+    the budget count as dropped, one per frame period missed.
+    """
+
+    def __init__(self, target_fps=60, window=120, percentile=95, interval=1.0, headroom=0.7, up_after=2.0,
+                 max_up_after=30.0, min_frames=10):
+        self.target_fps = target_fps
+        self.window = int(window)
+        self.percentile = percentile
+        self.interval = interval
+        self.headroom = headroom
+        self.up_after = up_after
+        self.max_up_after = max_up_after
+        self.min_frames = min_frames
+        self.knobs = []
+        self.frames = 0
+        self.dropped = 0
+        self.changes = 0
+        self._work = np.zeros(self.window)
+        self._count = 0  # Frames in the window since the last change
+        self._last_check = None
+        self._good_since = None
+        self._last_up = float("-inf")
+        self._wait = up_after
+
+    @property
+    def budget(self):
+        return 1.0 / self.target_fps
+
+    def knob(self, name, levels, apply):
+        """Register a knob; the visual is assumed to start at its first (best) level."""
+        knob = Knob(name, levels, apply)
+        self.knobs.append(knob)
+        return knob
+
+    def frame(self, work, now=None):
+        """Record one frame that took `work` seconds; may change a knob."""
+        now = time.perf_counter() if now is None else now
+        self._work[self._count % self.window] = work
+        self._count += 1
+        self.frames += 1
+        if work > self.budget:
+            self.dropped += int(work / self.budget)  # Frame periods it ran into
+        if self._last_check is None:
+            self._last_check = now
+        elif now - self._last_check >= self.interval:
+            self._last_check = now
+            self.adjust(now)
+
+    def frame_time(self):
+        """Rolling percentile of the frame work time in seconds, or None before the first frame."""
+        count = min(self._count, self.window)
+        if count == 0:
+            return None
+        return float(np.percentile(self._work[:count], self.percentile))
+
+    def adjust(self, now):
+        if self._count < self.min_frames:
+            return  # Too few frames at the current setting to judge it
+        frame_time = self.frame_time()
+        if frame_time > self.budget:
+            self._good_since = None
+            if now - self._last_up < self._wait:
+                self._wait = min(self._wait * 2, self.max_up_after)  # That step up didn't fit
+            self._step(down=True)
+        elif frame_time < self.headroom * self.budget:
+            if self._good_since is None:
+                self._good_since = now
+            elif now - self._good_since >= self._wait and self._step(down=False):
+                self._good_since = None
+                self._last_up = now
+        else:
+            self._good_since = None
+
+    def _step(self, down):
+        step = 1 if down else -1
+        for knob in self.knobs if down else reversed(self.knobs):
+            if 0 <= knob.level + step < len(knob.levels):
+                knob.set_level(knob.level + step)
+                self.changes += 1
+                self._count = 0  # Frames at the old setting say nothing about the new one
+                return True
+        return False
+
+    def levels(self):
+        return {knob.name: knob.value for knob in self.knobs}
+
+    def stats(self):
+        frame_time = self.frame_time()
+        return {"target_fps": self.target_fps, "frames": self.frames, "dropped": self.dropped,
+                "changes": self.changes, "levels": self.levels(),
+                "frame_ms": None if frame_time is None else frame_time * 1000.0}
+
+    def format(self):
+        levels = " ".join(f"{knob.name}={knob.value}" for knob in self.knobs)
+        frame_time = self.frame_time()
+        if frame_time is None:
+            return f"quality {levels} (dropped {self.dropped})"
+        return (f"quality {levels} (p{self.percentile} {frame_time * 1000:.1f}/{self.budget * 1000:.1f} ms, "
+                f"dropped {self.dropped})")
@@ -0,0 +1,159 @@
+"""Adaptive scheduling of hand-tracking inference, with landmark prediction in between.
+
+`InferenceScheduler` sits in front of `hands.process()`. It runs the model on
+a downscaled copy of the camera frame (optionally cropped to the region
+around the last known hands), and when the render loop cannot hold its
+target frame rate it first lowers the inference resolution and then skips
+camera frames. `LandmarkPredictor` fills the gaps: it follows the measured
+landmarks with an alpha-beta (constant velocity) filter so every rendered
+frame gets a fresh landmark estimate, whatever rate inference runs at.
+"""
+
+import time
+
+import numpy as np
+
+from .landmarks import hands_from_normalized, landmarks_to_array
+from .stats import StageStats
+
+
+class InferenceScheduler:
+    """Decide when and at what resolution to run `process(rgb_image)`.
+
+    With `roi=True` inference runs on a crop around the hands found last time
+    (expanded by `roi_margin`), falling back to the full frame when the hands
+    are lost and every `full_frame_every` inferences to catch new ones. The
+    crop moves with the hands, so the MediaPipe model needs
+    `static_image_mode=True` (`LandmarkProcessor` sets it with `roi`).
+    """
+
+    def __init__(self, process, target_fps=60, min_scale=0.4, scale_step=0.1, max_skip_interval=0.25,
+                 roi=False, roi_margin=0.3, full_frame_every=30):
+        self.process_fn = process
+        self.target_fps = target_fps
+        self.min_scale = min_scale
+        self.scale_step = scale_step
+        self.max_skip_interval = max_skip_interval
+        self.roi = roi
+        self.roi_margin = roi_margin
+        self.full_frame_every = full_frame_every
+        self.scale = 1.0
+        self.min_interval = 0.0  # Seconds that must pass between two inferences
+        self.timing = StageStats("inference")
+        self.inferences = 0
+        self.skipped = 0
+        self._last_run = float("-inf")
+        self._box = None  # Normalised (x0, y0, x1, y1) of the last hands
+
+    def should_run(self, now=None):
+        """False when this camera frame should be skipped to hold the target frame rate."""
+        now = time.perf_counter() if now is None else now
+        if now - self._last_run < self.min_interval:
+            self.skipped += 1
+            return False
+        return True
+
+    def process(self, img):
+        """Run inference on a BGR frame; returns `Hands` in full-frame coordinates, or None."""
+        import cv2
+
+        height, width = img.shape[:2]
+        x0, y0, x1, y1 = 0, 0, width, height
+        use_roi = self.roi and self._box is not None and self.inferences % self.full_frame_every != 0
+        if use_roi:
+            bx0, by0, bx1, by1 = self._box
+            pad_x, pad_y = (bx1 - bx0) * self.roi_margin, (by1 - by0) * self.roi_margin
+            x0, x1 = int(max(0.0, bx0 - pad_x) * width), int(min(1.0, bx1 + pad_x) * width)
+            y0, y1 = int(max(0.0, by0 - pad_y) * height), int(min(1.0, by1 + pad_y) * height)
+            if x1 - x0 < 32 or y1 - y0 < 32:
+                x0, y0, x1, y1 = 0, 0, width, height
+        crop = img[y0:y1, x0:x1]
+        if self.scale < 1.0:
+            crop = cv2.resize(crop, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+
+        self._last_run = time.perf_counter()
+        with self.timing.measure():
+            results = self.process_fn(rgb)
+        self.inferences += 1
+        if not results.multi_hand_landmarks:
+            self._box = None
+            return None
+
+        # Crop-normalised -> frame-normalised coordinates
+        normalized = landmarks_to_array(results.multi_hand_landmarks)
+        crop_w, crop_h = x1 - x0, y1 - y0
+        normalized[..., 0] = (x0 + normalized[..., 0] * crop_w) / width
+        normalized[..., 1] = (y0 + normalized[..., 1] * crop_h) / height
+        normalized[..., 2] *= crop_w / width
+        xy = normalized[..., :2].reshape(-1, 2)
+        self._box = (*xy.min(axis=0), *xy.max(axis=0))
+        return hands_from_normalized(normalized, width, height)
+
+    def adjust(self, render_fps):
+        """Trade inference quality for frame rate; call about once a second with the render rate."""
+        if render_fps < 0.95 * self.target_fps:
+            if self.scale > self.min_scale:
+                self.scale = max(self.min_scale, self.scale - self.scale_step)
+            else:
+                self.min_interval = min(self.max_skip_interval, max(1.0 / 60, self.min_interval * 1.25))
+        elif render_fps >= 0.99 * self.target_fps:
+            if self.min_interval > 0:
+                self.min_interval = 0.0 if self.min_interval <= 1.0 / 60 else self.min_interval / 1.25
+            elif self.scale < 1.0:
+                self.scale = min(1.0, self.scale + self.scale_step)
+
+    def stats(self):
+        return {"inferences": self.inferences, "skipped": self.skipped, "scale": self.scale,
+                "min_interval_ms": self.min_interval * 1000.0, **self.timing.summary()}
+
+    def format(self):
+        return (f"infer x{self.scale:.1f} every >= {self.min_interval * 1000:.0f} ms, "
+                f"{self.inferences} run / {self.skipped} skipped")
+
+
+class LandmarkPredictor:
+    """Alpha-beta filter over normalised `(hands, 21, 3)` landmarks.
+
+    `update` feeds a measurement (or None when no hand was found), `predict`
+    extrapolates to any later time, at most `max_horizon` seconds ahead.
+    Pass the hands' tracking slots as `ids` so the filter restarts whenever
+    the set of hands changes; `ids` of the current estimate are kept.
+    """
+
+    def __init__(self, alpha=0.85, beta=0.3, max_horizon=0.1):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_horizon = max_horizon
+        self.position = None
+        self.velocity = None
+        self.timestamp = None
+        self.ids = None
+        self.predictions = 0
+
+    def update(self, timestamp, hands, ids=None):
+        if hands is None:
+            self.position = self.velocity = self.ids = None
+            return
+        measured = hands.normalized.astype(np.float64)
+        ids = np.arange(len(measured)) if ids is None else np.asarray(ids)
+        same_hands = self.ids is not None and np.array_equal(self.ids, ids)
+        self.ids = ids
+        if self.position is None or not same_hands or timestamp <= self.timestamp:
+            self.position = measured
+            self.velocity = np.zeros_like(measured)
+        else:
+            dt = timestamp - self.timestamp
+            predicted = self.position + self.velocity * dt
+            residual = measured - predicted
+            self.position = predicted + self.alpha * residual
+            self.velocity = self.velocity + (self.beta / dt) * residual
+        self.timestamp = timestamp
+
+    def predict(self, timestamp, width, height):
+        """Estimated `Hands` at `timestamp` in a `width` x `height` frame, or None."""
+        if self.position is None:
+            return None
+        horizon = min(max(timestamp - self.timestamp, 0.0), self.max_horizon)
+        self.predictions += 1
+        return hands_from_normalized(self.position + self.velocity * horizon, width, height)
@@ -0,0 +1,92 @@
+"""MediaPipe hand landmarks as NumPy arrays, shared by both hand apps.
+
+`extract_hands` copies a `hands.process()` result into one `(hands, 21, 3)`
+array in a single pass over the landmark objects. Everything else
+(fingertips, joint chains, palm centres, bend angles) is index arithmetic on
+that array, done for all hands at once.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+LANDMARKS_PER_HAND = 21
+FINGERTIP_IDS = np.array([4, 8, 12, 16, 20])  # Thumb, Index, Middle, Ring, Pinky
+PALM_IDS = np.array([0, 5, 9, 13, 17])
+# Joints of each finger from its base to its tip (the thumb starts at the wrist)
+FINGER_CHAINS = (np.array([0, 1, 2, 3, 4]), np.array([5, 6, 7, 8]), np.array([9, 10, 11, 12]),
+                 np.array([13, 14, 15, 16]), np.array([17, 18, 19, 20]))
+# Bend is measured between the base -> middle-joint and middle-joint -> tip directions
+BEND_BASE_IDS = np.array([chain[0] for chain in FINGER_CHAINS])
+BEND_MID_IDS = np.array([chain[2] for chain in FINGER_CHAINS])
+# Same pairs as mediapipe.solutions.hands.HAND_CONNECTIONS, so drawing doesn't need mediapipe
+HAND_CONNECTIONS = ((0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (5, 6), (6, 7), (7, 8), (5, 9), (9, 10),
+                    (10, 11), (11, 12), (9, 13), (13, 14), (14, 15), (15, 16), (13, 17), (0, 17),
+                    (17, 18), (18, 19), (19, 20))
+
+
+class Hands(NamedTuple):
+    """Landmarks of every detected hand in one camera frame."""
+
+    normalized: np.ndarray  # (hands, 21, 3) float32: MediaPipe's x, y in [0, 1] and relative z
+    points: np.ndarray      # (hands, 21, 2) int: pixel coordinates in the camera image
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def fingertips(self) -> np.ndarray:
+        """(hands, 5, 2) fingertip pixel positions, thumb to pinky."""
+        return self.points[:, FINGERTIP_IDS]
+
+    @property
+    def palm_centers(self) -> np.ndarray:
+        """(hands, 2) mean of the five palm landmarks, in whole pixels."""
+        return self.points[:, PALM_IDS].sum(axis=1) // len(PALM_IDS)
+
+    @property
+    def bend_angles(self) -> np.ndarray:
+        """(hands, 5) angle in radians between each finger's lower and upper segment."""
+        base = self.points[:, BEND_BASE_IDS]
+        mid = self.points[:, BEND_MID_IDS]
+        tip = self.points[:, FINGERTIP_IDS]
+        lower = mid - base
+        upper = tip - mid
+        diff = np.arctan2(upper[..., 1], upper[..., 0]) - np.arctan2(lower[..., 1], lower[..., 0])
+        return np.abs((diff + np.pi) % (2 * np.pi) - np.pi)  # Wrapped to [0, pi]
+
+    def finger_chain(self, hand: int, finger: int) -> np.ndarray:
+        """(joints, 2) pixel positions along one finger, base to tip."""
+        return self.points[hand, FINGER_CHAINS[finger]]
+
+
+def landmarks_to_array(multi_hand_landmarks) -> np.ndarray:
+    """Copy MediaPipe landmark lists into a `(hands, 21, 3)` float32 array."""
+    values = [coordinate for hand in multi_hand_landmarks
+              for landmark in hand.landmark
+              for coordinate in (landmark.x, landmark.y, landmark.z)]
+    return np.array(values, dtype=np.float32).reshape(-1, LANDMARKS_PER_HAND, 3)
+
+
+def hands_from_normalized(normalized: np.ndarray, width: int, height: int) -> Hands:
+    """Build `Hands` from a `(hands, 21, 3)` array of normalised landmarks."""
+    points = (normalized[..., :2] * np.array([width, height], dtype=np.float64)).astype(np.int64)
+    return Hands(normalized, points)
+
+
+def extract_hands(results, width: int, height: int) -> Optional[Hands]:
+    """Turn a `hands.process()` result into `Hands`, or None when no hand was found."""
+    if not results.multi_hand_landmarks:
+        return None
+    return hands_from_normalized(landmarks_to_array(results.multi_hand_landmarks), width, height)
+
+
+def draw_hands(img, hands: Hands, connections, color=(0, 0, 255), line_color=(255, 255, 255)):
+    """Debug overlay of landmarks and `connections` (pairs of landmark ids) on a BGR image."""
+    import cv2
+
+    for hand in hands.points.tolist():
+        for start, end in connections:
+            cv2.line(img, hand[start], hand[end], line_color, 2)
+        for point in hand:
+            cv2.circle(img, point, 4, color, -1)
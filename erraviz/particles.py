@@ -0,0 +1,77 @@
+"""Fixed-capacity, structure-of-arrays particle store for the polar plot.
+
+Particles live in preallocated NumPy arrays instead of a list of objects, so
+spawning, moving and culling are each a single vectorized operation and the
+whole set is drawn by one scatter collection. Positions are kept as an
+`(capacity, 2)` array of (angle, radius) rows so the live part can be handed to
+`PathCollection.set_offsets` without rebuilding it.
+"""
+
+import numpy as np
+
+
+class ParticleSystem:
+    def __init__(self, capacity=512, max_radius=650.0):
+        self.capacity = int(capacity)
+        self.max_radius = max_radius
+        self._positions = np.zeros((self.capacity, 2))
+        self.angle = self._positions[:, 0]
+        self.radius = self._positions[:, 1]
+        self.speed = np.zeros(self.capacity)
+        self.color = np.zeros((self.capacity, 4))
+        self.limit = self.capacity  # Live particles allowed, at most `capacity`
+        self.count = 0
+        self.dropped = 0  # Spawns refused because the store was full
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def offsets(self):
+        """Live (angle, radius) rows, a view into the store."""
+        return self._positions[:self.count]
+
+    @property
+    def colors(self):
+        return self.color[:self.count]
+
+    def spawn(self, angles, radius, speeds, color):
+        """Add particles; `angles` and `speeds` are arrays, `radius` and `color` shared."""
+        angles = np.atleast_1d(angles)
+        room = max(self.limit - self.count, 0)
+        if len(angles) > room:
+            self.dropped += len(angles) - room
+            angles = angles[:room]
+        start, stop = self.count, self.count + len(angles)
+        self.angle[start:stop] = angles
+        self.radius[start:stop] = radius
+        self.speed[start:stop] = np.atleast_1d(speeds)[:len(angles)]
+        self.color[start:stop, :3] = color[:3]
+        self.color[start:stop, 3] = color[3] if len(color) > 3 else 1.0
+        self.count = stop
+
+    def step(self):
+        """Move every particle outwards and drop the ones that left the plot."""
+        live = slice(0, self.count)
+        self.radius[live] += self.speed[live]
+        keep = self.radius[live] <= self.max_radius
+        if not keep.all():
+            kept = int(keep.sum())
+            self._positions[:kept] = self._positions[live][keep]
+            self.speed[:kept] = self.speed[live][keep]
+            self.color[:kept] = self.color[live][keep]
+            self.count = kept
+
+    def set_limit(self, limit):
+        """Allow at most `limit` live particles (capped at `capacity`); the oldest go first."""
+        self.limit = min(int(limit), self.capacity)
+        excess = self.count - self.limit
+        if excess > 0:
+            keep = slice(excess, self.count)
+            self._positions[:self.limit] = self._positions[keep]
+            self.speed[:self.limit] = self.speed[keep]
+            self.color[:self.limit] = self.color[keep]
+            self.count = self.limit
+
+    def clear(self):
+        self.count = 0
@@ -0,0 +1,312 @@
+"""Source -> processors -> sinks pipelines shared by every visual.
+
+A visual is a `Pipeline` of one source (camera, audio device, file, session
+replay, synthetic signal), processors (FFT, landmarks, analysis) and sinks
+(pygame, pyqtgraph or matplotlib windows, file export); the stages live in
+`erraviz.stages`. Items travel through the stages as dicts. Stages are cheap
+to build: heavy modules are imported and devices, windows and files opened
+in `open()`, which the pipeline calls when it starts, so a script does no
+work at import time and a run only loads what its stages need.
+
+Processors marked `background` run off the render loop: the source then gets
+a capture thread and the background processors an inference thread, handing
+their newest output on through single-slot "latest value wins" buffers, so a
+slow stage never queues up stale work. The render loop redraws the newest
+result at display rate, with `item['fresh']` telling whether it is new since
+the last frame.
+"""
+
+import threading
+import time
+
+from .startup import startup
+from .stats import StageStats
+
+IDLE = object()  # Returned by `Source.read` when nothing new is ready yet
+
+
+class StopPipeline(Exception):
+    """Raised by a stage to end its pipeline, e.g. when its window is closed."""
+
+
+class LatestSlot:
+    """Single-slot buffer between threads; `put` overwrites, readers see the newest value.
+
+    Every value gets an increasing sequence number so readers can tell a new
+    value from one they have already seen. Values replaced before anyone read
+    them are counted in `overwritten`.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._value = None
+        self._seq = 0
+        self._read_seq = 0
+        self._closed = False
+        self.overwritten = 0
+
+    def put(self, value):
+        with self._cond:
+            if self._seq > self._read_seq:
+                self.overwritten += 1
+            self._value = value
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after=0, timeout=None):
+        """Wait for a value newer than sequence number `after`; returns `(seq, value)`.
+
+        Returns `(after, None)` on timeout or once the slot is closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after or self._closed, timeout):
+                return after, None
+            if self._seq <= after:
+                return after, None
+            self._read_seq = self._seq
+            return self._seq, self._value
+
+    def peek(self):
+        """Newest `(seq, value)` without waiting; `(0, None)` before the first `put`."""
+        with self._cond:
+            self._read_seq = self._seq
+            return self._seq, self._value
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class Stage:
+    """Base of sources, processors and sinks; `name` labels the stage's timing stats."""
+
+    name = "stage"
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Source(Stage):
+    name = "capture"
+
+    def read(self):
+        """Next item, `IDLE` when nothing new is ready yet, or None once the source is exhausted."""
+        raise NotImplementedError
+
+
+class Processor(Stage):
+    name = "process"
+    background = False  # Run on the pipeline's inference thread instead of the render loop
+
+    def accepts(self, item):
+        """False drops `item` before it is processed (and timed), e.g. to thin out inference."""
+        return True
+
+    def process(self, item):
+        """Add this stage's results to `item` and return it, or return None to drop it."""
+        raise NotImplementedError
+
+    def adapt(self, render, now):
+        """Called on the render loop after every drawn frame with the first sink's `StageStats`."""
+
+
+class Sink(Stage):
+    name = "render"
+    drives = False  # True when `drive()` runs the loop, e.g. from a GUI toolkit's event loop
+
+    def write(self, item):
+        raise NotImplementedError
+
+    def idle(self):
+        """Called instead of `write` on loop steps without a new item, to keep windows responsive."""
+
+    def wait(self):
+        """Called after every loop step, outside the stage timings, e.g. to cap the frame rate."""
+
+    def drive(self, pipeline):
+        """Call `pipeline.step()` until it returns False."""
+        raise NotImplementedError
+
+
+class Pipeline:
+    """Run `source` through `processors` into `sinks`.
+
+    Leading processors with `background = True` run on their own thread, and
+    the source on another; everything else runs on the caller's thread (pygame,
+    Qt and OpenCV windows want the main thread), driven by `run()` or by a sink
+    that owns an event loop. An exception on either thread stops it and is
+    raised again by the next `step()`. Every stage is timed in
+    `stats[stage.name]`.
+
+    `max_frames` stops the pipeline after that many frames, e.g. to time a cold
+    start; `report_startup` prints the start-up timing once the first frame is
+    out (turn it off for helper pipelines such as a capture process). A
+    `governor` (`erraviz.governor.QualityGovernor`) gets the render loop's work
+    time of every frame: foreground processors and sink writes, without
+    waiting for the source or the sinks' frame-rate caps. Processors see the
+    render stats through `adapt` after every frame, e.g. to thin out
+    inference when drawing falls behind.
+    """
+
+    def __init__(self, source, processors=(), sinks=(), max_frames=None, report_startup=True, governor=None):
+        self.source = source
+        self.processors = list(processors)
+        self.sinks = list(sinks)
+        self.max_frames = max_frames
+        self.report_startup = report_startup
+        self.governor = governor
+        split = 0
+        while split < len(self.processors) and self.processors[split].background:
+            split += 1
+        self.background, self.foreground = self.processors[:split], self.processors[split:]
+        self.stats = {stage.name: StageStats(stage.name) for stage in (source, *self.processors, *self.sinks)}
+        self.frames = LatestSlot()
+        self.results = LatestSlot()
+        self.rendered = 0
+        self._frame_start = None
+        self._result_seq = 0
+        self._running = False
+        self._source_done = False
+        self._done = False
+        self._error = None  # Exception that ended the capture or inference thread
+        self._threads = []
+        self._opened = []
+
+    def open(self):
+        if self.report_startup:
+            startup.mark("setup")  # Interpreter start-up, imports and the script's own set-up
+        for stage in (self.source, *self.processors, *self.sinks):
+            with startup.measure(type(stage).__name__):
+                stage.open()
+            self._opened.append(stage)
+        if self.background:
+            self._running = True
+            self._threads = [threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+                             threading.Thread(target=self._inference_loop, name="inference", daemon=True)]
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def close(self):
+        self._running = False
+        self.frames.close()
+        self.results.close()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        while self._opened:
+            self._opened.pop().close()
+
+    def run(self):
+        """Open every stage, run until a stage stops the pipeline or the source runs dry, then close."""
+        self.open()
+        try:
+            driver = next((sink for sink in self.sinks if sink.drives), None)
+            if driver is not None:
+                driver.drive(self)
+            else:
+                while self.step():
+                    pass
+        finally:
+            self.close()
+
+    def step(self):
+        """Move one item through the render loop; returns False once the pipeline should stop."""
+        try:
+            item = self._next()
+            if item is None:
+                return False
+            if item is IDLE:
+                for sink in self.sinks:
+                    sink.idle()
+            else:
+                for sink in self.sinks:
+                    with self.stats[sink.name].measure():
+                        sink.write(item)
+                self.rendered += 1
+                now = time.perf_counter()
+                if self.rendered == 1:
+                    startup.first_frame(report=self.report_startup)
+                elif self.governor is not None:
+                    self.governor.frame(now - self._frame_start, now)
+                if self.sinks:
+                    for processor in self.processors:
+                        processor.adapt(self.stats[self.sinks[0].name], now)
+            for sink in self.sinks:
+                sink.wait()
+        except StopPipeline:
+            return False
+        return self.max_frames is None or self.rendered < self.max_frames
+
+    def _next(self):
+        if self._error is not None:
+            raise self._error  # From a background thread; `run()` still closes every stage
+        if self.background:
+            seq, item = self.results.peek()
+            if self._done and seq == self._result_seq:
+                return None
+            if item is None:
+                return IDLE
+            item = dict(item, fresh=seq != self._result_seq)  # Foreground stages add to a copy
+            self._result_seq = seq
+        else:
+            with self.stats[self.source.name].measure():
+                item = self.source.read()
+            if item is None or item is IDLE:
+                return item
+            item["fresh"] = True
+        self._frame_start = time.perf_counter()  # A source pacing itself isn't work of the frame
+        return self._process(item, self.foreground)
+
+    def _process(self, item, processors):
+        for processor in processors:
+            if not processor.accepts(item):
+                return IDLE
+            with self.stats[processor.name].measure():
+                item = processor.process(item)
+            if item is None:
+                return IDLE
+        return item
+
+    def _capture_loop(self):
+        stats = self.stats[self.source.name]
+        try:
+            while self._running:
+                with stats.measure():
+                    item = self.source.read()
+                if item is None:
+                    break
+                if item is not IDLE:
+                    self.frames.put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._source_done = True
+
+    def _inference_loop(self):
+        seq = 0
+        try:
+            while self._running and self._error is None:
+                seq, item = self.frames.get(after=seq, timeout=0.1)
+                if item is None:
+                    if self._source_done:
+                        break
+                    continue
+                item = self._process(item, self.background)
+                if item is not IDLE:
+                    self.results.put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+
+    def format_stats(self):
+        text = "  ".join(stage.format() for stage in self.stats.values())
+        if self.background:
+            text += f"  skipped frames {self.frames.overwritten}"
+        if self.governor is not None:
+            text += f"  {self.governor.format()}"
+        return text
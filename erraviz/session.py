@@ -0,0 +1,190 @@
+"""Record and replay hand-tracking sessions without a camera.
+
+A session file is a 64-byte header followed by fixed-size records, one per
+inference result: capture timestamp, hand count, normalised landmarks
+`(max_hands, 21, 3)` and, optionally, a downscaled BGR copy of the camera
+frame. Records are only ever appended, so a file can be memory-mapped (even
+while it is still being written) as a NumPy structured array.
+
+`SessionReplay` hands the records back as `(timestamp, img, hands)` at the
+recorded pace or as fast as possible, which lets everything downstream of
+inference run in CI with the SDL dummy video driver.
+"""
+
+import os
+import struct
+import time
+
+import numpy as np
+
+from .landmarks import hands_from_normalized
+
+MAGIC = b"ERRASESS"
+VERSION = 1
+HEADER = struct.Struct("<8sIIIIII")  # magic, version, max_hands, width, height, frame width, frame height
+HEADER_SIZE = 64
+APPEND_GAP = 0.1  # Seconds between the last stored record and the first one of an appended run
+
+
+def record_dtype(max_hands, frame_size=None):
+    """Structured dtype of one record; `frame_size` is `(width, height)` of stored frames."""
+    fields = [("timestamp", "<f8"), ("hands", "<i4"), ("_pad", "<i4"),
+              ("landmarks", "<f4", (max_hands, 21, 3))]
+    if frame_size:
+        fields.append(("frame", "u1", (frame_size[1], frame_size[0], 3)))
+    return np.dtype(fields)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, version, max_hands, width, height, frame_w, frame_h = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a session file")
+    if version != VERSION:
+        raise ValueError(f"{path} has session version {version}, expected {VERSION}")
+    return max_hands, (width, height), ((frame_w, frame_h) if frame_w else None)
+
+
+class SessionRecorder:
+    """Append inference results to a session file.
+
+    `frame_scale` (e.g. 0.25) also stores a downscaled copy of each camera
+    frame; leave it None to record landmarks only. Appending to an existing
+    file requires the same layout, and the new run's timestamps are shifted
+    to continue `APPEND_GAP` after the last stored record, so the time
+    between runs doesn't end up inside the session.
+    """
+
+    def __init__(self, path, width, height, max_hands=2, frame_scale=None):
+        self.path = path
+        self.width, self.height = width, height
+        self.max_hands = max_hands
+        self.frame_size = (max(1, int(width * frame_scale)), max(1, int(height * frame_scale))) if frame_scale else None
+        self.dtype = record_dtype(max_hands, self.frame_size)
+        self._record = np.zeros(1, dtype=self.dtype)
+        self.records = 0
+        self._resume = None  # Timestamp the first appended record gets
+        self._shift = 0.0  # Added to this run's timestamps
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            if read_header(path) != (max_hands, (width, height), self.frame_size):
+                raise ValueError(f"{path} was recorded with a different layout")
+            self._file = open(path, "r+b")
+            # Drop a record a crashed run left half written, or every later one would be misaligned
+            stored = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+            self._file.truncate(HEADER_SIZE + stored * self.dtype.itemsize)
+            if stored:
+                self._file.seek(HEADER_SIZE + (stored - 1) * self.dtype.itemsize)
+                last = np.frombuffer(self._file.read(8), dtype="<f8")[0]
+                self._resume = float(last) + APPEND_GAP
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            frame_w, frame_h = self.frame_size or (0, 0)
+            header = HEADER.pack(MAGIC, VERSION, max_hands, width, height, frame_w, frame_h)
+            self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def record(self, timestamp, hands=None, img=None):
+        """Append one result; `hands` is a `Hands` or None, `img` the full-size BGR frame."""
+        if self._resume is not None:
+            self._shift, self._resume = self._resume - timestamp, None
+        record = self._record[0]
+        record["timestamp"] = timestamp + self._shift
+        record["landmarks"] = 0
+        count = 0
+        if hands is not None:
+            count = min(len(hands.normalized), self.max_hands)
+            record["landmarks"][:count] = hands.normalized[:count]
+        record["hands"] = count
+        if self.frame_size:
+            if img is None:
+                record["frame"] = 0
+            else:
+                import cv2
+
+                record["frame"] = cv2.resize(img, self.frame_size, interpolation=cv2.INTER_AREA)
+        self._file.write(self._record.tobytes())
+        self.records += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Session:
+    """Memory-mapped view of a session file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.max_hands, (self.width, self.height), self.frame_size = read_header(path)
+        self.dtype = record_dtype(self.max_hands, self.frame_size)
+        count = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize  # Ignore a partly written record
+        if count > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def timestamps(self):
+        return self.records["timestamp"]
+
+    @property
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+    def hands(self, index):
+        """`Hands` of record `index` in camera pixels, or None when no hand was found."""
+        count = int(self.records["hands"][index])
+        if count == 0:
+            return None
+        normalized = np.asarray(self.records["landmarks"][index, :count], dtype=np.float64)
+        return hands_from_normalized(normalized, self.width, self.height)
+
+    def frame(self, index):
+        """Downscaled BGR frame of record `index`, or None if frames were not recorded."""
+        return self.records["frame"][index] if self.frame_size else None
+
+
+class SessionReplay:
+    """Iterate a session as `(timestamp, img, hands)`.
+
+    Timestamps are on the `time.perf_counter()` clock of the replay, so they
+    can stand in for capture times. With `realtime=True` records come out at
+    the recorded pace, otherwise as fast as the consumer takes them. `img` is
+    the recorded frame, or a black image of the camera size.
+    """
+
+    def __init__(self, session, realtime=True, loop=False):
+        self.session = session if isinstance(session, Session) else Session(session)
+        self.realtime = realtime
+        self.loop = loop
+        self._blank = None
+
+    def __iter__(self):
+        session = self.session
+        if not len(session):
+            return
+        if session.frame_size is None:
+            self._blank = np.zeros((session.height, session.width, 3), dtype=np.uint8)
+        timestamps = session.timestamps
+        while True:
+            started = time.perf_counter()
+            for index in range(len(session)):
+                offset = float(timestamps[index] - timestamps[0])
+                if self.realtime:
+                    delay = started + offset - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                img = session.frame(index)
+                yield started + offset, (self._blank if img is None else img), session.hands(index)
+            if not self.loop:
+                return
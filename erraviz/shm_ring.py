@@ -0,0 +1,192 @@
+"""Shared-memory ring buffer for passing fixed-size chunks between processes.
+
+One producer writes chunks into a preallocated block of shared memory and one
+consumer reads them back as NumPy views, so nothing is pickled or copied on the
+way across. When the consumer falls behind it jumps straight to the newest
+chunk ("latest chunk wins") and counts what it skipped, which keeps the
+consumer at most one chunk behind the producer however slow it gets.
+
+Every lost chunk is counted once: as an overrun when the producer overwrote
+it before the consumer got to it, or as a drop when the consumer skipped it
+while the ring still held it. `lost` in `stats()` is the sum of the two.
+
+Every chunk carries the `time.perf_counter()` timestamp it was written with,
+and with `notify=True` the producer also pokes a socket after each write so
+the consumer can sleep in its event loop until data arrives instead of polling.
+
+The header counters are plain aligned int64 values. The producer writes a
+chunk's samples before bumping the write counter, so on the platforms we run
+on the consumer never sees a published counter ahead of its data.
+"""
+
+import socket
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Header layout (one int64 each)
+_WRITE_SEQ = 0  # Number of chunks published by the producer
+_READ_SEQ = 1   # Sequence number of the last chunk taken by the consumer (-1 = none)
+_OVERRUNS = 2   # Chunks overwritten by the producer before the consumer ever saw them
+_DROPPED = 3    # Chunks the consumer skipped to jump to the latest one, not counting overruns
+_HEADER_LEN = 8
+_HEADER_BYTES = _HEADER_LEN * 8
+
+
+class SharedRingBuffer:
+    """Single-producer / single-consumer ring of `slots` chunks of `chunk` samples.
+
+    Create it once in the parent process and hand it to the producer and the
+    consumer processes; it pickles as a reference to the shared block (and the
+    wake-up sockets) and re-attaches on the other side.
+    """
+
+    def __init__(self, chunk, slots=4, dtype=np.int16, name=None, notify=False):
+        if slots < 2:
+            raise ValueError("SharedRingBuffer needs at least 2 slots")
+        self.chunk = int(chunk)
+        self.slots = int(slots)
+        self.dtype = np.dtype(dtype)
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=self._size())
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._map()
+        if self._owner:
+            self._header[:] = 0
+            self._header[_READ_SEQ] = -1
+        self._wake_reader = self._wake_writer = None
+        if notify:
+            self._wake_reader, self._wake_writer = socket.socketpair()
+            self._wake_writer.setblocking(False)
+            self._wake_reader.setblocking(False)
+        self.last_capture_time = None
+
+    def _size(self):
+        return _HEADER_BYTES + self.slots * 8 + self.slots * self.chunk * self.dtype.itemsize
+
+    def _map(self):
+        buf = self._shm.buf
+        self._header = np.ndarray((_HEADER_LEN,), dtype=np.int64, buffer=buf)
+        self._times = np.ndarray((self.slots,), dtype=np.float64, buffer=buf, offset=_HEADER_BYTES)
+        self._data = np.ndarray((self.slots, self.chunk), dtype=self.dtype,
+                                buffer=buf, offset=_HEADER_BYTES + self.slots * 8)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __getstate__(self):
+        return {"name": self.name, "chunk": self.chunk, "slots": self.slots, "dtype": self.dtype.str,
+                "wake": (self._wake_reader, self._wake_writer)}
+
+    def __setstate__(self, state):
+        self.__init__(state["chunk"], state["slots"], state["dtype"], name=state["name"])
+        self._wake_reader, self._wake_writer = state["wake"]
+
+    # Producer side
+
+    def write(self, samples, timestamp=None):
+        """Copy one chunk of samples into the next slot and publish it.
+
+        `timestamp` is the capture time on the `time.perf_counter()` clock,
+        which is shared by all processes on the machine; it defaults to now.
+        """
+        header = self._header
+        seq = int(header[_WRITE_SEQ])
+        slot = seq % self.slots
+        # The slot we are about to reuse holds chunk `seq - slots`; if the
+        # consumer never got that far, it is lost for good.
+        if seq - self.slots > header[_READ_SEQ]:
+            header[_OVERRUNS] += 1
+        self._data[slot] = samples
+        self._times[slot] = time.perf_counter() if timestamp is None else timestamp
+        header[_WRITE_SEQ] = seq + 1
+        if self._wake_writer is not None:
+            try:
+                self._wake_writer.send(b"\0")
+            except (BlockingIOError, InterruptedError):
+                pass  # Socket buffer full: the consumer already has wake-ups queued
+
+    # Consumer side
+
+    def wake_fileno(self):
+        """File descriptor that becomes readable after each write (needs `notify=True`)."""
+        return self._wake_reader.fileno()
+
+    def clear_wakeups(self):
+        """Drain queued wake-ups; call before reading so none are missed."""
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def read_latest(self):
+        """Return `(seq, view)` for the newest unread chunk, or `(None, None)`.
+
+        The view points straight into shared memory. It stays valid until the
+        producer wraps around onto its slot; use `is_valid(seq)` after a slow
+        computation if that matters.
+        """
+        header = self._header
+        latest = int(header[_WRITE_SEQ]) - 1
+        last_read = int(header[_READ_SEQ])
+        if latest <= last_read:
+            return None, None
+        self._count_skipped(last_read, latest, latest)
+        header[_READ_SEQ] = latest
+        self.last_capture_time = float(self._times[latest % self.slots])
+        return latest, self._data[latest % self.slots]
+
+    def read_pending(self):
+        """Return views of every unread chunk, oldest first, for batched catch-up.
+
+        Only the newest `slots - 1` chunks can be returned (the remaining slot
+        may be mid-write); anything older is counted as dropped. The capture
+        time of the newest chunk is left in `last_capture_time`.
+        """
+        header = self._header
+        latest = int(header[_WRITE_SEQ]) - 1
+        last_read = int(header[_READ_SEQ])
+        if latest <= last_read:
+            return []
+        first = max(last_read + 1, latest - self.slots + 2)
+        self._count_skipped(last_read, first, latest)
+        header[_READ_SEQ] = latest
+        self.last_capture_time = float(self._times[latest % self.slots])
+        return [self._data[seq % self.slots] for seq in range(first, latest + 1)]
+
+    def _count_skipped(self, last_read, first, latest):
+        # Chunks between the last one read and `first` are skipped; those at or before
+        # `latest - slots` were overwritten, and the producer counted them as overruns
+        skipped = first - 1 - max(last_read, latest - self.slots)
+        if skipped > 0:
+            self._header[_DROPPED] += skipped
+
+    def is_valid(self, seq):
+        """True while the chunk with sequence number `seq` has not been overwritten."""
+        return int(self._header[_WRITE_SEQ]) - seq < self.slots
+
+    def stats(self):
+        header = self._header
+        return {
+            "written": int(header[_WRITE_SEQ]),
+            "overruns": int(header[_OVERRUNS]),
+            "dropped": int(header[_DROPPED]),
+            "lost": int(header[_OVERRUNS] + header[_DROPPED]),
+        }
+
+    def close(self):
+        # Drop our views first, SharedMemory refuses to close with exports alive
+        self._header = self._times = self._data = None
+        self._shm.close()
+        for sock in (self._wake_reader, self._wake_writer):
+            if sock is not None:
+                sock.close()
+
+    def unlink(self):
+        if self._owner:
+            self._shm.unlink()
@@ -0,0 +1,246 @@
+"""Audio sources for the FFT visualiser.
+
+Every source hands out `int16` blocks at its own `rate` through
+`read(frames)`, which returns `None` once the source is exhausted: mono blocks
+of `frames` samples, or `(frames, channels)` blocks (interleaved in memory)
+when the source has several `channels`. Sources are cheap to construct and
+only grab a device or map a file in `open()`, so they can be built in one
+process and opened in another.
+"""
+
+import struct
+import time
+
+import numpy as np
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_header(path):
+    """Return `(rate, channels, dtype, data_offset, data_bytes)` for a PCM or float WAV file."""
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(size)
+                tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+                if tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack("<H", body[24:26])[0]
+                fmt = tag, channels, rate, bits
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} has a data chunk before its fmt chunk")
+                tag, channels, rate, bits = fmt
+                if tag == _WAVE_FORMAT_PCM and bits in (8, 16, 32):
+                    dtype = {8: "u1", 16: "<i2", 32: "<i4"}[bits]
+                elif tag == _WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+                    dtype = {32: "<f4", 64: "<f8"}[bits]
+                else:
+                    raise ValueError(f"{path}: unsupported WAV format {tag} with {bits} bits")
+                return rate, channels, np.dtype(dtype), f.tell(), size
+            else:
+                f.seek(size + (size & 1), 1)  # Chunks are padded to an even size
+
+
+def to_int16(block):
+    """Mix a `(frames, channels)` block down to mono and convert it to int16."""
+    if block.shape[1] == 1:
+        mono = block[:, 0]
+    else:
+        mono = block.mean(axis=1)
+    if mono.dtype == np.int16:
+        return mono
+    if mono.dtype.kind == "f" and block.dtype.kind == "f":
+        return (np.clip(mono, -1.0, 1.0) * 32767).astype(np.int16)
+    if block.dtype == np.uint8:
+        return ((mono.astype(np.int32) - 128) << 8).astype(np.int16)
+    if block.dtype == np.int32:
+        return (mono // 65536).astype(np.int16)
+    return mono.astype(np.int16)  # Mean of int16 channels
+
+
+def as_int16(block):
+    """Convert a block to int16 without mixing its channels down."""
+    if block.dtype == np.int16:
+        return block
+    if block.dtype.kind == "f":
+        return (np.clip(block, -1.0, 1.0) * 32767).astype(np.int16)
+    if block.dtype == np.uint8:
+        return (block.astype(np.int16) - 128) << 8
+    if block.dtype == np.int32:
+        return (block >> 16).astype(np.int16)
+    return block.astype(np.int16)
+
+
+class AudioSource:
+    rate = None
+    channels = 1  # Channels in the blocks `read` returns
+
+    def open(self):
+        return self
+
+    def read(self, frames):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PyAudioSource(AudioSource):
+    """Live input device, the visualiser's original source."""
+
+    def __init__(self, rate=48000, frames_per_buffer=2048, device_index=None, channels=1):
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.device_index = device_index
+        self._pa = self._stream = None
+
+    def open(self):
+        import pyaudio  # Only needed for live capture
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(format=pyaudio.paInt16,
+                                     channels=self.channels,
+                                     rate=self.rate,
+                                     input=True,
+                                     input_device_index=self.device_index,
+                                     frames_per_buffer=self.frames_per_buffer)
+        return self
+
+    def read(self, frames):
+        # Blocks until a full block is captured, no extra sleep needed
+        data = self._stream.read(frames, exception_on_overflow=False)
+        samples = np.frombuffer(data, dtype=np.int16)
+        return samples if self.channels == 1 else samples.reshape(-1, self.channels)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._pa.terminate()
+            self._pa = self._stream = None
+
+
+class FileSource(AudioSource):
+    """WAV file, or headerless PCM when `rate` is given, memory-mapped.
+
+    With `realtime=True` blocks are handed out at playback pace so the live
+    view behaves as if the track was coming from the input device. `rate`,
+    `channels` and `dtype` describe headerless files. Blocks are mixed down
+    to mono unless `mono` is False.
+    """
+
+    def __init__(self, path, realtime=True, loop=False, rate=None, channels=1, dtype="<i2", mono=True):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.mono = mono
+        if rate is None:
+            self.rate, self.file_channels, self.dtype, self.offset, size = read_wav_header(path)
+            self.frames = size // (self.file_channels * self.dtype.itemsize)
+        else:
+            self.rate, self.file_channels, self.dtype, self.offset = rate, channels, np.dtype(dtype), 0
+            self.frames = None
+        self.channels = 1 if mono else self.file_channels
+        self.samples = None
+        self._position = 0
+        self._started = None
+
+    def open(self):
+        shape = None if self.frames is None else (self.frames, self.file_channels)
+        samples = np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.offset, shape=shape)
+        self.samples = samples.reshape(-1, self.file_channels)
+        self._position = 0
+        self._started = time.perf_counter()
+        return self
+
+    def read(self, frames):
+        if self._position + frames > len(self.samples):
+            if not self.loop:
+                return None
+            self._position = 0
+            self._started = time.perf_counter()
+        block = self.samples[self._position:self._position + frames]
+        self._position += frames
+        if self.realtime:
+            delay = self._started + self._position / self.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return to_int16(block) if self.mono else as_int16(block)
+
+    def close(self):
+        self.samples = None
+
+
+class SyntheticSource(AudioSource):
+    """Deterministic test signal: a few tones, a kick-like pulse and some noise.
+
+    `tones` is a sequence of `(frequency_hz, amplitude)` pairs with amplitudes
+    relative to full scale; `bpm` sets the pulse rate (0 disables it). With
+    several `channels` tone k is loudest in channel k % channels and the noise
+    is independent per channel, so the channels can be told apart.
+    """
+
+    def __init__(self, rate=48000, tones=((110.0, 0.3), (440.0, 0.15), (2500.0, 0.05)),
+                 bpm=125, noise=0.01, duration=None, realtime=True, seed=0, channels=1):
+        self.rate = rate
+        self.channels = channels
+        self.tones = np.asarray(tones, dtype=np.float64).reshape(-1, 2)
+        # (tones, channels) gains: full level in the tone's own channel, a quarter elsewhere
+        self._pan = np.full((len(self.tones), channels), 1.0 if channels == 1 else 0.25)
+        self._pan[np.arange(len(self.tones)), np.arange(len(self.tones)) % channels] = 1.0
+        self.bpm = bpm
+        self.noise = noise
+        self.duration = duration
+        self.realtime = realtime
+        self.seed = seed
+        self._position = 0
+        self._rng = None
+        self._started = None
+
+    def open(self):
+        self._position = 0
+        self._rng = np.random.default_rng(self.seed)
+        self._started = time.perf_counter()
+        return self
+
+    def render(self, start, frames):
+        """Samples `start` to `start + frames` as float64 in [-1, 1], without advancing."""
+        t = (start + np.arange(frames)) / self.rate
+        tones = np.sin(2 * np.pi * np.outer(t, self.tones[:, 0]))
+        if self.channels == 1:
+            signal = tones @ self.tones[:, 1]
+        else:
+            signal = tones @ (self.tones[:, 1:] * self._pan)  # (frames, channels)
+        if self.bpm:
+            beat_phase = (t * self.bpm / 60.0) % 1.0
+            envelope = 0.4 + 0.6 * np.exp(-8.0 * beat_phase)
+            signal *= envelope if signal.ndim == 1 else envelope[:, None]
+        return signal
+
+    def read(self, frames):
+        if self.duration is not None and self._position + frames > self.duration * self.rate:
+            return None
+        signal = self.render(self._position, frames)
+        if self.noise:
+            signal += self._rng.normal(0.0, self.noise, signal.shape)
+        self._position += frames
+        if self.realtime:
+            delay = self._started + self._position / self.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return (np.clip(signal, -1.0, 1.0) * 32767).astype(np.int16)
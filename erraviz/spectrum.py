@@ -0,0 +1,212 @@
+"""Preallocated spectrum analysis for the FFT visualiser.
+
+`SpectrumEngine` does the per-frame work that `update()` used to do with
+`scipy.signal.detrend` and a full complex FFT, but everything that only
+depends on the chunk size and sample rate (frequency axis, window, detrend
+basis) is computed once and every intermediate lives in a buffer that is
+reused from frame to frame.
+
+Frames can overlap: with `hop < chunk` the engine keeps the tail of the
+previous hops and analyses a `chunk`-long frame every `hop` samples (an STFT).
+Any number of pending hops, up to `max_batch`, are analysed together as one
+2-D FFT and folded into the decay state in a single pass.
+
+With `channels > 1` hops are interleaved `int16` blocks, read through a
+`(hop, channels)` view, and every channel of every pending frame goes through
+the same single FFT, threshold and decay pass; the results gain a channel
+axis. A `mix` matrix turns the input channels into the analysed ones as the
+hops are copied in, e.g. `MID_SIDE` for stereo.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:  # NumPy >= 2.0 can write the FFT straight into a preallocated array
+    np.fft.rfft(np.zeros(4), out=np.empty(3, dtype=np.complex128))
+    _RFFT_HAS_OUT = True
+except TypeError:
+    _RFFT_HAS_OUT = False
+
+
+def make_window(name, size):
+    """Return a window of `size` samples; `name` is 'rect', 'hann', 'hamming' or 'blackman'."""
+    if name in (None, "rect", "boxcar"):
+        return np.ones(size)
+    windows = {"hann": np.hanning, "hamming": np.hamming, "blackman": np.blackman}
+    if name not in windows:
+        raise ValueError(f"Unknown window {name!r}, expected one of rect, {', '.join(windows)}")
+    return windows[name](size)
+
+
+# (left + right) / 2 and (left - right) / 2 of a stereo signal
+MID_SIDE = ((0.5, 0.5), (0.5, -0.5))
+
+
+class SpectrumEngine:
+    """Detrend, window and FFT audio frames into reusable buffers.
+
+    `process(chunk)` analyses one standalone frame; `process_hops(hops)` feeds
+    consecutive `hop`-sample blocks through the overlapping STFT. Both return
+    `(spectrum, decayed)`: the thresholded magnitude spectrum of the newest
+    frame and the peak-hold spectrum that falls back by `decay_rate` every
+    `chunk` samples, however many frames overlap in them. `batch` holds the
+    spectra of every frame of the last call, oldest first. All of them are
+    views into the engine's own buffers and are overwritten by the next call.
+
+    With `channels > 1` (or a `mix` of shape `(outputs, channels)`) every
+    spectrum is `(outputs, bins)` instead of `(bins,)`.
+    """
+
+    def __init__(self, chunk, rate, noise_threshold=0.02, decay_rate=0.9, window="rect",
+                 hop=None, max_batch=16, channels=1, mix=None):
+        self.chunk = int(chunk)
+        self.hop = self.chunk if hop is None else int(hop)
+        if not 0 < self.hop <= self.chunk:
+            raise ValueError(f"hop must be between 1 and chunk ({self.chunk}), got {self.hop}")
+        self.rate = rate
+        self.noise_threshold = noise_threshold
+        self.decay_rate = decay_rate
+        # Fall-back per frame, so overlapping frames don't make the peak-hold decay faster
+        self.frame_decay = decay_rate ** (self.hop / self.chunk)
+        self.max_batch = max(1, int(max_batch))
+        self.bins = self.chunk // 2  # Positive frequencies, Nyquist bin dropped like before
+        self.inputs = int(channels)
+        self._mix = None if mix is None else np.asarray(mix, dtype=np.float64).T  # (inputs, outputs)
+        if self._mix is not None and self._mix.shape[0] != self.inputs:
+            raise ValueError(f"mix needs {self.inputs} columns, one per input channel, got {self._mix.shape[0]}")
+        self.channels = self.inputs if self._mix is None else self._mix.shape[1]
+        # Mono keeps the original shapes; otherwise every buffer gets a channel axis
+        shape = () if self.inputs == 1 and self._mix is None else (self.channels,)
+
+        self.freqs = np.fft.rfftfreq(self.chunk, 1.0 / rate)[:self.bins]
+        self.window = make_window(window, self.chunk)
+        self._windowed = window not in (None, "rect", "boxcar")
+        # Amplitude normalisation, corrected for the coherent gain of the window
+        self._scale = 2.0 / self.window.sum()
+
+        # Linear detrend basis: remove the mean and the projection onto a centred ramp
+        self._ramp = np.arange(self.chunk, dtype=np.float64) - (self.chunk - 1) / 2.0
+        self._ramp_norm = 1.0 / np.dot(self._ramp, self._ramp)
+        # frame_decay ** age, used to fold a batch of frames into the peak-hold at once
+        self._decay_powers = self.frame_decay ** np.arange(self.max_batch + 1, dtype=np.float64)
+
+        rows, full_bins = self.max_batch, self.chunk // 2 + 1
+        self._frames = np.empty((rows, *shape, self.chunk), dtype=np.float64)
+        self._trend = np.empty((rows, *shape, self.chunk), dtype=np.float64)
+        self._means = np.empty((rows, *shape), dtype=np.float64)
+        self._slopes = np.empty((rows, *shape), dtype=np.float64)
+        self._complex = np.empty((rows, *shape, full_bins), dtype=np.complex128)
+        self._magnitude = np.empty((rows, *shape, full_bins), dtype=np.float64)
+        self._mask = np.empty((rows, *shape, self.bins), dtype=bool)
+        self._folded = np.empty((*shape, self.bins), dtype=np.float64)
+        # frame_decay ** age per frame, broadcast over channels and bins
+        self._frame_axis = (-1,) + (1,) * (len(shape) + 1)
+        # Carry-over from previous hops followed by room for a full batch of new ones
+        self._carry = self.chunk - self.hop
+        self._stream = np.zeros((self._carry + rows * self.hop, *shape), dtype=np.float64)
+        self.decayed = np.zeros((*shape, self.bins), dtype=np.float64)
+        self.batch = self._magnitude[:0, ..., :self.bins]
+
+    def reset(self):
+        self.decayed.fill(0)
+        self._stream.fill(0)
+
+    def _deinterleave(self, block, out):
+        """Copy an interleaved block into `(samples, channels)` `out`, mixing if needed."""
+        columns = np.reshape(block, (len(out), self.inputs))  # Strided view, channel c is columns[:, c]
+        if self._mix is None:
+            np.copyto(out, columns, casting="unsafe")
+        else:
+            np.dot(columns, self._mix, out=out)
+
+    def process(self, chunk):
+        """Analyse one `chunk`-sample frame on its own, ignoring the STFT history."""
+        if self._stream.ndim == 1:
+            np.copyto(self._frames[0], chunk, casting="unsafe")
+        else:
+            columns = np.reshape(chunk, (self.chunk, self.inputs))
+            if self._mix is not None:
+                columns = columns @ self._mix
+            np.copyto(self._frames[0], columns.T, casting="unsafe")
+        return self._analyse(1)
+
+    def process_hops(self, hops):
+        """Push consecutive `hop`-sample blocks through the STFT and analyse them together.
+
+        Only the newest `max_batch` blocks are analysed if more are given.
+        Returns `(None, None)` when `hops` is empty.
+        """
+        count = min(len(hops), self.max_batch)
+        if count == 0:
+            return None, None
+        hop, carry, stream = self.hop, self._carry, self._stream
+        for i, block in enumerate(hops[len(hops) - count:]):
+            if stream.ndim == 1:
+                np.copyto(stream[carry + i * hop:carry + (i + 1) * hop], block, casting="unsafe")
+            else:
+                self._deinterleave(block, stream[carry + i * hop:carry + (i + 1) * hop])
+        filled = stream[:carry + count * hop]
+        # Strided view of every frame ending on a hop boundary, no copy: (count, [channels,] chunk)
+        frames = sliding_window_view(filled, self.chunk, axis=0)[::hop]
+        np.copyto(self._frames[:count], frames)
+        # Keep the last chunk - hop samples for the frames that follow
+        stream[:carry] = filled[len(filled) - carry:]
+        return self._analyse(count)
+
+    def spectra(self, frames):
+        """Thresholded magnitude spectra of a `(count, [channels,] chunk)` block of frames.
+
+        Leaves the decay state alone; `count` may not exceed `max_batch`. The
+        result is a view into the engine's buffers.
+        """
+        count = len(frames)
+        np.copyto(self._frames[:count], frames, casting="unsafe")
+        return self._spectra(count)
+
+    def _analyse(self, count):
+        spectra = self._spectra(count)
+        self.batch = spectra
+
+        # Peak-hold decay: frame j of `count` has aged by (count - 1 - j) frames
+        # by the time the newest one arrives, so one weighted max over the batch
+        # gives the same result as folding them in one by one.
+        self.decayed *= self._decay_powers[count]
+        if count == 1:
+            np.maximum(self.decayed, spectra[0], out=self.decayed)
+        else:
+            weighted = self._trend[:count, ..., :self.bins]  # Detrend scratch space is free again
+            np.multiply(spectra, self._decay_powers[count - 1::-1].reshape(self._frame_axis), out=weighted)
+            np.max(weighted, axis=0, out=self._folded)
+            np.maximum(self.decayed, self._folded, out=self.decayed)
+        return spectra[count - 1], self.decayed
+
+    def _spectra(self, count):
+        frames = self._frames[:count]
+        trend = self._trend[:count]
+        means = self._means[:count]
+        slopes = self._slopes[:count]
+
+        # Detrend (no DC hum) every frame of every channel at once
+        np.dot(frames, self._ramp, out=slopes)
+        slopes *= self._ramp_norm
+        np.mean(frames, axis=-1, out=means)
+        frames -= means[..., None]
+        np.multiply(slopes[..., None], self._ramp, out=trend)
+        frames -= trend
+        if self._windowed:
+            frames *= self.window
+
+        if _RFFT_HAS_OUT:
+            np.fft.rfft(frames, axis=-1, out=self._complex[:count])
+        else:
+            self._complex[:count] = np.fft.rfft(frames, axis=-1)
+        magnitude = self._magnitude[:count]
+        np.abs(self._complex[:count], out=magnitude)
+        spectra = magnitude[..., :self.bins]
+        spectra *= self._scale
+
+        # Noise threshold, in place
+        mask = self._mask[:count]
+        np.less(spectra, self.noise_threshold, out=mask)
+        np.copyto(spectra, 0.0, where=mask)
+        return spectra
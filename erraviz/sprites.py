@@ -0,0 +1,116 @@
+"""Pre-rendered outline shapes for the hand-landmark-art trails.
+
+Drawing a trail used to allocate an `SRCALPHA` surface and rotate it for
+every square, every frame. `SpriteCache` renders each shape once per
+quantised (size, angle, colour) and keeps the results in an LRU bounded by
+memory. Every finger's trail shares the same shape at a given trail index,
+so `trail_styles` computes the colours and pulse sizes of all indices in one
+vectorised step, one sprite is looked up per index, and a frame of trail
+shapes is a single `Surface.blits` call.
+"""
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+# Rotational symmetry of each shape, in degrees; angles are folded into this range
+SYMMETRY = {"circle": 360.0, "triangle": 120.0, "square": 90.0}
+
+COLOR_PERIODS = np.array([500.0, 700.0, 900.0])  # ms, red/green/blue cycle of the trail colours
+PULSE_PERIOD = 200.0  # ms
+
+
+def trail_styles(ticks, length, base_size=10.0, size_step=1.5):
+    """Colours `(length, 3)` and pulsed sizes `(length,)` of a trail at time `ticks` (ms)."""
+    index = np.arange(length)
+    colors = (255 * np.abs(np.sin(ticks / COLOR_PERIODS + index[:, None]))).astype(np.int64)
+    sizes = base_size + index * size_step + (10 * np.sin(ticks / PULSE_PERIOD + index)).astype(np.int64)
+    return colors, sizes
+
+
+class SpriteCache:
+    """LRU of shape sprites, quantised to `angle_step` degrees and `color_step` per channel.
+
+    `get(shape, size, angle, color)` returns a surface centred on the shape,
+    or None when the shape is too small to draw. Triangles have vertices at
+    `angle`, `angle + 120` and `angle + 240` degrees (screen coordinates,
+    y down); squares are rotated like `pygame.transform.rotate(..., angle)`.
+    """
+
+    def __init__(self, max_bytes=16 << 20, angle_step=6.0, color_step=32, width=2):
+        self.max_bytes = max_bytes
+        self.angle_step = angle_step
+        self.color_step = color_step
+        self.width = width
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sprites = OrderedDict()
+
+    def get(self, shape, size, angle=0.0, color=(255, 255, 255)):
+        size = int(size)
+        if size < 1:
+            return None
+        period = SYMMETRY[shape]
+        buckets = int(period // self.angle_step)
+        angle_bucket = int(round((angle % period) / self.angle_step)) % buckets if shape != "circle" else 0
+        step = self.color_step
+        if step > 1:
+            # Bucket centres, except that the top bucket is full brightness so white stays white
+            top = 255 // step
+            color = tuple(255 if int(c) // step == top else int(c) // step * step + step // 2 for c in color)
+        else:
+            color = tuple(color)
+        key = (shape, size, angle_bucket, color)
+
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        sprite = self._render(shape, size, angle_bucket * self.angle_step, color)
+        self._sprites[key] = sprite
+        self.nbytes += sprite.get_width() * sprite.get_height() * 4
+        while self.nbytes > self.max_bytes and len(self._sprites) > 1:
+            _, old = self._sprites.popitem(last=False)
+            self.nbytes -= old.get_width() * old.get_height() * 4
+            self.evictions += 1
+        return sprite
+
+    def _render(self, shape, size, angle, color):
+        if shape == "circle":
+            surface = pygame.Surface((2 * size + 1, 2 * size + 1), pygame.SRCALPHA)
+            pygame.draw.circle(surface, color, (size, size), size, self.width)
+        elif shape == "triangle":
+            half_size = size / 2
+            extent = int(math.ceil(half_size)) + self.width
+            surface = pygame.Surface((2 * extent + 1, 2 * extent + 1), pygame.SRCALPHA)
+            theta = math.radians(angle)
+            points = [(extent + half_size * math.cos(theta + k * 2.094),
+                       extent + half_size * math.sin(theta + k * 2.094)) for k in range(3)]
+            pygame.draw.polygon(surface, color, points, self.width)
+        else:
+            square = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.rect(square, color, (0, 0, size, size), self.width)
+            surface = pygame.transform.rotate(square, angle)
+        # Outlines are fully opaque, so a run-length encoded colour key blits much faster
+        # than per-pixel alpha; quantised colours never reach pure black
+        sprite = pygame.Surface(surface.get_size())
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        sprite.blit(surface, (0, 0))
+        sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        return sprite
+
+    def clear(self):
+        self._sprites.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {"sprites": len(self._sprites), "bytes": self.nbytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
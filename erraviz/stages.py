@@ -0,0 +1,686 @@
+"""Sources, processors and sinks for `erraviz.pipeline`.
+
+Constructors only store settings. Heavy modules (cv2, mediapipe, pygame,
+pyqtgraph, matplotlib) are imported, and devices, windows and files opened,
+in `open()`, so building a pipeline is free and a run only loads what its
+stages need.
+
+Item keys used here:
+
+    time                        capture time on the `time.perf_counter()` clock
+    audio                       int16 block, `(frames, channels)` from multi-channel sources (AudioBlocks)
+    hops                        every hop that arrived since the last item, interleaved (RingSource)
+    freqs, spectrum, decayed    display spectra, `(channels, bands)` for several channels (SpectrumProcessor)
+    spectra                     one spectrum per analysed hop (SpectrumProcessor with every_hop)
+    image                       BGR camera frame (CameraSource, SessionSource)
+    hands                       detected `Hands` or None (LandmarkProcessor, SessionSource)
+    tracked, slots              hands in slot order and their slots, fresh items only (TrackProcessor)
+    predicted, predicted_slots  landmarks extrapolated to the frame (PredictProcessor)
+    frame, position             frame index and playback position in seconds (MusicSource, TimelineSource)
+    index                       analysis frame at `position` (AnalysisProcessor)
+    rgba                        rendered frame for file export
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from .analysis import AudioAnalysis
+from .bands import BandMapper
+from .inference import InferenceScheduler
+from .landmarks import HAND_CONNECTIONS, draw_hands, hands_from_normalized
+from .pipeline import IDLE, Processor, Sink, Source, StopPipeline
+from .session import SessionRecorder, SessionReplay
+from .spectrum import SpectrumEngine
+from .tracking import by_slot
+from .video import VideoEncoder, grab_surface, surface_channels
+
+# Sources
+
+
+class AudioBlocks(Source):
+    """Blocks of `frames` samples from an `erraviz.sources` audio source (device, file or synthetic)."""
+
+    name = "capture"
+
+    def __init__(self, source, frames):
+        self.source = source
+        self.frames = frames
+
+    @property
+    def rate(self):
+        return self.source.rate
+
+    def open(self):
+        self.source.open()
+
+    def read(self):
+        try:
+            block = self.source.read(self.frames)
+        except Exception as e:
+            print(f"Error reading stream: {e}")
+            return IDLE
+        if block is None:  # End of a file or synthetic source
+            return None
+        return {"time": time.perf_counter(), "audio": block}
+
+    def close(self):
+        self.source.close()
+
+
+class RingSource(Source):
+    """Hops written to a `SharedRingBuffer` by another process; each item takes all pending ones."""
+
+    name = "ring"
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def wake_fileno(self):
+        return self.ring.wake_fileno()
+
+    def read(self):
+        self.ring.clear_wakeups()
+        # Every hop that arrived since the last read (after a stall this can be many);
+        # anything the ring no longer holds is counted as dropped
+        hops = self.ring.read_pending()
+        if not hops:
+            return IDLE
+        return {"time": self.ring.last_capture_time, "hops": hops}
+
+
+class CameraSource(Source):
+    """OpenCV camera `device`; frames are timestamped as soon as they are read."""
+
+    name = "capture"
+
+    def __init__(self, device=0):
+        self.device = device
+        self.capture = None
+
+    def open(self):
+        import cv2
+
+        self.capture = cv2.VideoCapture(self.device)
+
+    def read(self):
+        success, img = self.capture.read()
+        if not success:
+            print("Failed to capture image")
+            time.sleep(0.01)
+            return IDLE
+        return {"time": time.perf_counter(), "image": img}
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+class SessionSource(Source):
+    """Replay of a recorded hand-tracking session (see `erraviz.session`)."""
+
+    name = "replay"
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self._records = None
+
+    def open(self):
+        self._records = iter(SessionReplay(self.path, realtime=self.realtime, loop=self.loop))
+
+    def read(self):
+        record = next(self._records, None)
+        if record is None:
+            return None
+        timestamp, img, hands = record
+        return {"time": timestamp, "image": img, "hands": hands}
+
+
+class MusicSource(Source):
+    """Play `path` in a loop through `pygame.mixer.music`; items carry the frame index and playback position."""
+
+    name = "playback"
+
+    def __init__(self, path, loops=-1):
+        self.path = path
+        self.loops = loops
+        self._music = None
+        self._frame = 0
+
+    def open(self):
+        import pygame
+
+        self.pygame = pygame
+        pygame.init()
+        pygame.mixer.init()
+        self._music = pygame.mixer.music
+        self._music.load(self.path)
+        self._music.play(self.loops)
+        self._frame = 0
+
+    def read(self):
+        item = {"time": time.perf_counter(), "frame": self._frame, "position": self._music.get_pos() / 1000.0}
+        self._frame += 1
+        return item
+
+    def close(self):
+        self._music.stop()
+        self.pygame.quit()
+
+
+class TimelineSource(Source):
+    """Frames `start` to `stop` of a timeline at `fps`, as fast as they are consumed."""
+
+    name = "timeline"
+
+    def __init__(self, start, stop, fps):
+        self.start = start
+        self.stop = stop
+        self.fps = fps
+        self._frame = start
+
+    def open(self):
+        self._frame = self.start
+
+    def read(self):
+        if self._frame >= self.stop:
+            return None
+        item = {"time": time.perf_counter(), "frame": self._frame, "position": self._frame / self.fps}
+        self._frame += 1
+        return item
+
+
+# Processors
+
+
+class SpectrumProcessor(Processor):
+    """Overlapping STFT of the item's hops (or audio block), optionally mapped to display bands.
+
+    `bands` is `(mode, count, fmin, fmax)` for `BandMapper`. With `every_hop`
+    the item also gets `spectra`, one spectrum per analysed hop, oldest first
+    (for views that keep a history). `channels` and `mix` are passed on to
+    `SpectrumEngine`; all channels share one FFT and one band mapping. The
+    spectra are views into the processor's own buffers, overwritten by the
+    next item.
+    """
+
+    name = "fft"
+
+    def __init__(self, chunk, rate, noise_threshold=0.02, decay_rate=0.9, window="hann", hop=None,
+                 max_batch=16, bands=None, every_hop=False, channels=1, mix=None):
+        self.settings = dict(chunk=chunk, rate=rate, noise_threshold=noise_threshold, decay_rate=decay_rate,
+                             window=window, hop=hop, max_batch=max_batch, channels=channels, mix=mix)
+        self.bands = bands
+        self.every_hop = every_hop
+        self.engine = self.mapper = None
+
+    def open(self):
+        # Frequency axis, detrend basis and all per-frame buffers are set up once
+        self.engine = SpectrumEngine(**self.settings)
+        self.freqs = self.engine.freqs
+        if self.bands is not None:
+            # Spectrum -> display bands is one precomputed matrix-vector product per curve
+            self.mapper = BandMapper(self.engine.freqs, *self.bands)
+            self.freqs = self.mapper.centers
+            shape = self.engine.decayed.shape[:-1] + (self.mapper.bands,)  # With the channel axis, if any
+            self._spectrum = np.empty(shape)
+            self._decayed = np.empty(shape)
+            self._spectra = np.empty((self.engine.max_batch, *shape))
+            self._map = self.mapper.apply if len(shape) == 1 else self.mapper.apply_rows
+
+    def process(self, item):
+        # All pending frames go through one 2-D FFT and one decay update
+        hops = item["hops"] if "hops" in item else [item["audio"]]
+        spectrum, decayed = self.engine.process_hops(hops)
+        if self.mapper is not None:
+            spectrum = self._map(spectrum, out=self._spectrum)
+            decayed = self._map(decayed, out=self._decayed)
+        item["freqs"], item["spectrum"], item["decayed"] = self.freqs, spectrum, decayed
+        if self.every_hop:
+            spectra = self.engine.batch
+            if self.mapper is not None:
+                spectra = self.mapper.apply_rows(spectra, out=self._spectra[:len(spectra)])
+            item["spectra"] = spectra
+        return item
+
+
+class LandmarkProcessor(Processor):
+    """MediaPipe hand landmarks of `item['image']`, scheduled by an `InferenceScheduler`.
+
+    Runs in the background: inference drops resolution, then camera frames,
+    when drawing can't keep up with `target_fps`, checked against the render
+    stats every `adjust_interval` seconds. With `roi=True` inference runs on
+    a crop around the last hands, with MediaPipe in static image mode so it
+    doesn't track across crops that move.
+    """
+
+    name = "inference"
+    background = True
+
+    def __init__(self, max_hands=2, target_fps=60, adjust_interval=1.0, **scheduler_options):
+        self.max_hands = max_hands
+        self.target_fps = target_fps
+        self.adjust_interval = adjust_interval
+        self.scheduler_options = scheduler_options
+        self.hands = self.scheduler = None
+        self._last_adjust = None
+
+    def open(self):
+        import mediapipe
+
+        self.hands = mediapipe.solutions.hands.Hands(static_image_mode=self.scheduler_options.get("roi", False),
+                                                     max_num_hands=self.max_hands)
+        self.scheduler = InferenceScheduler(self.hands.process, target_fps=self.target_fps,
+                                            **self.scheduler_options)
+
+    def adapt(self, render, now):
+        if self._last_adjust is None:
+            self._last_adjust = now
+        elif now - self._last_adjust >= self.adjust_interval:
+            self._last_adjust = now
+            fps = render.summary().get("fps")
+            if fps is not None:
+                self.scheduler.adjust(fps["mean"])
+
+    def accepts(self, item):
+        return self.scheduler.should_run()
+
+    def process(self, item):
+        item["hands"] = self.scheduler.process(item["image"])
+        return item
+
+    def close(self):
+        if self.hands is not None:
+            self.hands.close()
+            self.hands = None
+
+
+class TrackProcessor(Processor):
+    """Match fresh items' hands to `HandTracker` slots."""
+
+    name = "track"
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def process(self, item):
+        if item["fresh"]:
+            slots = self.tracker.update(item["hands"], item["time"])
+            item["tracked"], item["slots"] = by_slot(item["hands"], slots)
+        return item
+
+
+class PredictProcessor(Processor):
+    """Extrapolate the tracked hands to the moment each frame is drawn with a `LandmarkPredictor`.
+
+    Every frame gets a fresh landmark estimate, however often inference runs.
+    """
+
+    name = "predict"
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+
+    def process(self, item):
+        if item["fresh"]:
+            self.predictor.update(item["time"], item["tracked"], item["slots"])
+        height, width = item["image"].shape[:2]
+        item["predicted"] = self.predictor.predict(time.perf_counter(), width, height)
+        item["predicted_slots"] = self.predictor.ids
+        return item
+
+
+class AnalysisProcessor(Processor):
+    """Look each item's playback position up in the cached `AudioAnalysis` of `path`.
+
+    The analysis is built on first use (see `erraviz.analysis`) when the
+    pipeline starts; `analysis` stays None if that fails, and items get
+    `index` None.
+    """
+
+    name = "analysis"
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.analysis = None
+
+    def open(self):
+        # Decode and analyse the track once (RMS, onsets, band energies, beat grid);
+        # later runs just memory-map the cached features
+        try:
+            self.analysis = AudioAnalysis.load_or_build(self.path, cache_dir=self.cache_dir)
+        except Exception as e:
+            print(f"Error analysing {self.path}: {e}", file=sys.stderr)
+
+    def process(self, item):
+        item["index"] = self.analysis.index(item["position"]) if self.analysis is not None else None
+        return item
+
+
+# Sinks
+
+
+class PygameSink(Sink):
+    """pygame window of `size`; `draw(surface, item)` paints each item, then the display is flipped.
+
+    `fps` caps the frame rate (None: as fast as items come). `mixer` is passed
+    to `pygame.mixer.pre_init` before pygame starts. `setup(surface)` runs once
+    the window is open, e.g. to load sounds, and `status()` about once a second
+    for the window caption. A `hidden` window is drawn but never shown, for
+    recording with `VideoSink`.
+    """
+
+    name = "render"
+
+    def __init__(self, size, draw, fps=None, setup=None, status=None, mixer=None, hidden=False):
+        self.size = size
+        self.draw = draw
+        self.fps = fps
+        self.setup = setup
+        self.status = status
+        self.mixer = mixer
+        self.hidden = hidden
+        self.surface = None
+        self._last_status = 0
+
+    def open(self):
+        import pygame
+
+        self.pygame = pygame
+        if self.mixer is not None:
+            pygame.mixer.pre_init(*self.mixer)
+        pygame.init()
+        self.surface = pygame.display.set_mode(self.size, pygame.HIDDEN if self.hidden else 0)
+        self.clock = pygame.time.Clock()
+        if self.setup is not None:
+            self.setup(self.surface)
+
+    def idle(self):
+        if any(event.type == self.pygame.QUIT for event in self.pygame.event.get()):
+            raise StopPipeline
+
+    def write(self, item):
+        self.idle()
+        self.draw(self.surface, item)
+        self.pygame.display.flip()
+
+    def wait(self):
+        if self.status is not None and self.pygame.time.get_ticks() - self._last_status > 1000:
+            self._last_status = self.pygame.time.get_ticks()
+            self.pygame.display.set_caption(self.status())
+        if self.fps:
+            self.clock.tick(self.fps)
+
+    def close(self):
+        self.pygame.quit()
+
+
+class QtSink(Sink):
+    """pyqtgraph window built by `setup()`; `draw(item)` updates it.
+
+    Drives the pipeline from Qt's event loop: on every wake-up of the source
+    when it has a `wake_fileno()` (like `RingSource`), otherwise every
+    `interval_ms`. The pipeline stops when the window is closed.
+    """
+
+    name = "render"
+    drives = True
+
+    def __init__(self, setup, draw, interval_ms=16):
+        self.setup = setup
+        self.draw = draw
+        self.interval_ms = interval_ms
+        self.window = None
+
+    def open(self):
+        import pyqtgraph
+
+        self.pg = pyqtgraph
+        self.app = pyqtgraph.mkQApp()
+        self.window = self.setup()
+        self.window.show()
+
+    def write(self, item):
+        self.draw(item)
+
+    def drive(self, pipeline):
+        qt = self.pg.Qt
+
+        def step():
+            if not pipeline.step():
+                self.app.quit()
+
+        wake_fileno = getattr(pipeline.source, "wake_fileno", None)
+        if wake_fileno is not None:
+            # Sleep in the Qt event loop until the source signals new data
+            trigger = qt.QtCore.QSocketNotifier(wake_fileno(), qt.QtCore.QSocketNotifier.Type.Read)
+            trigger.activated.connect(step)
+        else:
+            trigger = qt.QtCore.QTimer()
+            trigger.timeout.connect(step)
+            trigger.start(self.interval_ms)
+        self.pg.exec()
+
+
+class MatplotlibSink(Sink):
+    """matplotlib figure from `setup()`, animated with blitting; `draw(item)` returns the changed artists.
+
+    Each write redraws only those artists over a cached background (taken
+    again whenever the whole figure is drawn, e.g. after a resize or a widget
+    change), so the frame's full cost falls inside the pipeline's timing.
+    `status()` is shown in the window title about once a second.
+    """
+
+    name = "render"
+    drives = True
+
+    def __init__(self, setup, draw, interval=30, status=None):
+        self.setup = setup
+        self.draw = draw
+        self.interval = interval
+        self.status = status
+        self.figure = None
+        self.artists = []
+        self._background = None
+        self._last_status = 0.0
+
+    def open(self):
+        import matplotlib.pyplot as plt
+
+        self.plt = plt
+        self.figure = self.setup()
+        self.canvas = self.figure.canvas
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        # Full redraws skip animated artists, leaving the background to blit over
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.figure.draw_artist(artist)
+
+    def write(self, item):
+        self.artists = self.draw(item)
+        if self._background is None:
+            for artist in self.artists:
+                artist.set_animated(True)
+            self.canvas.draw()  # Takes the background
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.figure.bbox)
+
+    def wait(self):
+        if self.status is not None and time.perf_counter() - self._last_status > 1.0:
+            self._last_status = time.perf_counter()
+            self.canvas.manager.set_window_title(self.status())
+
+    def drive(self, pipeline):
+        if self.canvas.required_interactive_framework is None:
+            # Non-interactive backend (Agg on a headless machine): no event loop, just render
+            while pipeline.step():
+                pass
+            self.plt.close(self.figure)
+            return
+
+        def step():
+            if not pipeline.step():
+                timer.stop()
+                self.plt.close(self.figure)
+
+        timer = self.canvas.new_timer(interval=self.interval)
+        timer.add_callback(step)
+        timer.start()
+        self.plt.show()
+
+
+class CameraWindowSink(Sink):
+    """Debug OpenCV window: the camera image mirrored, with the detected landmarks drawn on top."""
+
+    name = "camera window"
+
+    def __init__(self, title="Image", connections=HAND_CONNECTIONS):
+        self.title = title
+        self.connections = connections
+
+    def open(self):
+        import cv2
+
+        self.cv2 = cv2
+
+    def write(self, item):
+        shown = self.cv2.flip(item["image"], 1)
+        hands = item.get("hands")
+        if hands is not None:
+            # The overlay goes on the mirrored copy, so the camera frame itself stays clean. Points are
+            # scaled to the image shown, which replays of downscaled recordings make smaller than the camera.
+            height, width = shown.shape[:2]
+            overlay = hands_from_normalized(hands.normalized, width, height)
+            overlay.points[..., 0] = width - 1 - overlay.points[..., 0]
+            draw_hands(shown, overlay, self.connections)
+        self.cv2.imshow(self.title, shown)
+        self.cv2.pollKey()  # Lets HighGUI repaint the window
+
+    def close(self):
+        self.cv2.destroyAllWindows()
+
+
+class VideoSink(Sink):
+    """Record the surface of a `PygameSink` to a video file, encoded on a background thread.
+
+    Frames go through a `VideoEncoder` with `queue_frames` frames in flight;
+    when they are all taken the frame is dropped, or with `block` the render
+    loop waits (for offline renders that need every frame). `clock(item)`
+    gives each frame's time on the video's timeline, the wall clock by
+    default; replays pass the session's own clock.
+    """
+
+    name = "video"
+
+    def __init__(self, path, window, fps=60, fourcc="mp4v", queue_frames=8, block=False, clock=None):
+        self.path = path
+        self.window = window
+        self.fps = fps
+        self.fourcc = fourcc
+        self.queue_frames = queue_frames
+        self.block = block
+        self.clock = clock
+        self.encoder = None
+
+    def open(self):
+        surface = self.window.surface
+        if surface.get_bitsize() != 32:
+            raise ValueError(f"Can only record 32-bit windows, not {surface.get_bitsize()}-bit")
+        self.encoder = VideoEncoder(self.path, surface.get_size(), self.fps, self.fourcc, self.queue_frames,
+                                    self.block, surface_channels(surface)).open()
+
+    def write(self, item):
+        frame = self.encoder.frame()
+        if frame is None:
+            return  # Encoder behind, counted as dropped
+        grab_surface(self.window.surface, frame)
+        self.encoder.submit(frame, time.perf_counter() if self.clock is None else self.clock(item))
+
+    def close(self):
+        if self.encoder is not None:
+            self.encoder.close()
+            print(f"Recorded {self.path}: {self.encoder.format()}")
+            self.encoder = None
+
+
+class SessionSink(Sink):
+    """Append the hands (and optionally downscaled frames) of fresh items to a session file."""
+
+    name = "record"
+
+    def __init__(self, path, max_hands=2, frame_scale=None):
+        self.path = path
+        self.max_hands = max_hands
+        self.frame_scale = frame_scale
+        self.recorder = None
+
+    def write(self, item):
+        if not item["fresh"]:
+            return
+        if self.recorder is None:
+            height, width = item["image"].shape[:2]
+            self.recorder = SessionRecorder(self.path, width, height, max_hands=self.max_hands,
+                                            frame_scale=self.frame_scale)
+        self.recorder.record(item["time"], item.get("hands"), item["image"])
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Recorded {self.recorder.records} frames to {self.path}")
+            self.recorder = None
+
+
+class RingSink(Sink):
+    """Publish audio blocks to a `SharedRingBuffer`, e.g. from a capture process."""
+
+    name = "ring"
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def write(self, item):
+        self.ring.write(item["audio"].reshape(-1), item["time"])  # Interleaved, as captured
+
+
+class FrameFileSink(Sink):
+    """Write `item['rgba']` as numbered PNGs into directory `out`, or as raw RGB24 to a file ('-': stdout)."""
+
+    name = "export"
+
+    def __init__(self, out, fmt="png"):
+        self.out = out
+        self.fmt = fmt
+        self._file = None
+
+    def open(self):
+        if self.fmt == "png":
+            import matplotlib.image
+
+            self._imsave = matplotlib.image.imsave
+            os.makedirs(self.out, exist_ok=True)
+        else:
+            self._file = sys.stdout.buffer if self.out == "-" else open(self.out, "wb")
+
+    def write(self, item):
+        if self._file is None:
+            self._imsave(os.path.join(self.out, f"frame_{item['frame']:06d}.png"), item["rgba"])
+        else:
+            self._file.write(np.ascontiguousarray(item["rgba"][..., :3]).data)
+
+    def close(self):
+        if self._file is not None and self._file is not sys.stdout.buffer:
+            self._file.close()
+        self._file = None
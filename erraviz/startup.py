@@ -0,0 +1,79 @@
+"""Cold-start timing: how long a visual takes from launch to its first frame.
+
+`Pipeline` records each step on the shared `startup` timer: everything
+before the pipeline starts (interpreter, imports, script set-up), opening
+each stage, and the first item making it through to the sinks. The report is
+printed to stderr once the first frame is out:
+
+    startup 0.52 s to first frame (setup 310 ms, SessionSource 1 ms, PygameSink 160 ms, first frame 45 ms)
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+def process_start():
+    """`time.perf_counter()` value when this process was started, as far as the OS tells.
+
+    Reads the start time from /proc (Linux, 10 ms resolution) so interpreter
+    start-up and the imports before this module count too; elsewhere the
+    clock starts when this module is imported.
+    """
+    now = time.perf_counter()
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()  # The command name may contain spaces
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")  # Field 22, starttime
+    except (OSError, ValueError, IndexError, AttributeError):
+        return now
+    return now - max(age, 0.0)
+
+
+class StartupTimer:
+    """Named start-up steps, from process start to the first frame."""
+
+    def __init__(self, started=None):
+        self.started = process_start() if started is None else started
+        self.steps = []  # (label, seconds)
+        self.total = None  # Seconds from process start to the first frame, once it is out
+        self._last = self.started
+
+    def mark(self, label):
+        """Record the time since the previous step (or process start) as `label`."""
+        now = time.perf_counter()
+        self.steps.append((label, now - self._last))
+        self._last = now
+
+    @contextmanager
+    def measure(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.steps.append((label, self._last - start))
+
+    def first_frame(self, report=True):
+        """Close the timing at the first frame; only the first call counts."""
+        if self.total is not None:
+            return
+        self.mark("first frame")
+        self.total = self._last - self.started
+        if report:
+            print(self.format(), file=sys.stderr)  # stdout may be carrying video
+
+    def summary(self):
+        return {"total_s": self.total, "steps_ms": {label: seconds * 1000.0 for label, seconds in self.steps}}
+
+    def format(self):
+        steps = ", ".join(f"{label} {seconds * 1000:.0f} ms" for label, seconds in self.steps)
+        if self.total is None:
+            return f"startup: no frame yet ({steps})"
+        return f"startup {self.total:.2f} s to first frame ({steps})"
+
+
+startup = StartupTimer()
@@ -0,0 +1,90 @@
+"""Rolling frame statistics: capture-to-paint latency, frame rate and stage timings."""
+
+import json
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class FrameStats:
+    """Keep the last `window` frames' latency and paint times in fixed arrays.
+
+    `record(capture_time, paint_time)` takes two `time.perf_counter()`
+    timestamps: when the newest audio in the frame was captured and when the
+    frame finished painting.
+    """
+
+    def __init__(self, window=600):
+        self.window = int(window)
+        self._latency = np.zeros(self.window)
+        self._paint = np.zeros(self.window)
+        self.frames = 0
+
+    def record(self, capture_time, paint_time):
+        slot = self.frames % self.window
+        self._latency[slot] = paint_time - capture_time
+        self._paint[slot] = paint_time
+        self.frames += 1
+
+    def summary(self):
+        count = min(self.frames, self.window)
+        result = {"frames": self.frames}
+        if count == 0:
+            return result
+        latency_ms = self._latency[:count] * 1000.0
+        p50, p95, p99 = np.percentile(latency_ms, (50, 95, 99))
+        result["latency_ms"] = {"p50": p50, "p95": p95, "p99": p99, "max": latency_ms.max()}
+        if count > 1:
+            # Paint times in arrival order, oldest first
+            start = self.frames % self.window if self.frames > self.window else 0
+            paints = np.roll(self._paint[:count], -start)
+            fps = 1.0 / np.maximum(np.diff(paints), 1e-6)
+            # Low percentiles are the slow frames that matter on stage
+            fps_p50, fps_p5, fps_p1 = np.percentile(fps, (50, 5, 1))
+            result["fps"] = {"mean": (count - 1) / (paints[-1] - paints[0]),
+                             "p50": fps_p50, "p5": fps_p5, "p1": fps_p1}
+        return result
+
+    def format(self):
+        summary = self.summary()
+        if "latency_ms" not in summary:
+            return "waiting for audio..."
+        latency = summary["latency_ms"]
+        text = f"latency p50 {latency['p50']:.1f} ms  p95 {latency['p95']:.1f} ms  p99 {latency['p99']:.1f} ms"
+        if "fps" in summary:
+            fps = summary["fps"]
+            text += f"   fps {fps['mean']:.0f} (p5 {fps['p5']:.0f}, p1 {fps['p1']:.0f})"
+        return text
+
+    def dump(self, path, **extra):
+        """Write the current summary plus any `extra` fields to `path` as JSON."""
+        with open(path, "w") as f:
+            json.dump({**self.summary(), **extra}, f, indent=2)
+
+
+class StageStats(FrameStats):
+    """Per-stage timing for a pipeline: how long each run took and how often it ran.
+
+    The latency figures of `FrameStats` become the stage's run time.
+    """
+
+    def __init__(self, name, window=300):
+        super().__init__(window)
+        self.name = name
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(start, time.perf_counter())
+
+    def format(self):
+        summary = self.summary()
+        if "latency_ms" not in summary:
+            return f"{self.name} idle"
+        run = summary["latency_ms"]
+        rate = summary["fps"]["mean"] if "fps" in summary else 0.0
+        return f"{self.name} {rate:.0f}/s {run['p50']:.1f}/{run['p95']:.1f} ms"
@@ -0,0 +1,77 @@
+"""Stable identities for several tracked hands.
+
+MediaPipe reports hands in no particular order, so with two performers on
+stage "hand 0" can swap between frames. `HandTracker` gives every detected
+hand a slot (0 .. max_hands - 1) that follows it from frame to frame by
+matching palm centres, so per-performer state (trails, finger bends, sound
+bank) can live in arrays indexed by slot.
+"""
+
+import numpy as np
+
+from .landmarks import PALM_IDS, Hands
+
+
+class HandTracker:
+    """Assign detected hands to persistent slots by nearest palm centre.
+
+    A hand keeps its slot while it is seen within `max_distance` (normalised
+    frame units) of where its slot was last seen; a slot is freed after
+    `max_missing` seconds without a match.
+    """
+
+    def __init__(self, max_hands=2, max_distance=0.25, max_missing=0.5):
+        self.max_hands = max_hands
+        self.max_distance = max_distance
+        self.max_missing = max_missing
+        self.centers = np.zeros((max_hands, 2))
+        self.last_seen = np.full(max_hands, -np.inf)
+
+    @property
+    def active(self):
+        """Mask of slots that currently belong to a hand."""
+        return np.isfinite(self.last_seen)
+
+    def update(self, hands, timestamp):
+        """Slots of `hands` (a `Hands` or None) in detection order; -1 for hands beyond `max_hands`."""
+        self.last_seen[timestamp - self.last_seen > self.max_missing] = -np.inf
+        if hands is None:
+            return np.zeros(0, dtype=np.int64)
+
+        centers = hands.normalized[:, PALM_IDS, :2].mean(axis=1)
+        slots = np.full(len(centers), -1, dtype=np.int64)
+        active = np.flatnonzero(self.active)
+        if len(active):
+            # Greedy matching on the (hands, slots) distance matrix, closest pairs first
+            distance = np.linalg.norm(centers[:, None] - self.centers[active][None], axis=-1)
+            for flat in np.argsort(distance, axis=None).tolist():
+                hand, slot = divmod(flat, len(active))
+                if distance[hand, slot] > self.max_distance:
+                    break
+                if slots[hand] < 0 and active[slot] not in slots:
+                    slots[hand] = active[slot]
+        # Unmatched hands take the free slots, lowest first, then any slot nobody matched
+        free = np.flatnonzero(~self.active).tolist() + [slot for slot in active.tolist() if slot not in slots]
+        for hand in np.flatnonzero(slots < 0).tolist():
+            if not free:
+                break
+            slots[hand] = free.pop(0)
+
+        seen = slots >= 0
+        self.centers[slots[seen]] = centers[seen]
+        self.last_seen[slots[seen]] = timestamp
+        return slots
+
+    def reset(self):
+        self.last_seen[:] = -np.inf
+
+
+def by_slot(hands, slots):
+    """`(hands, slots)` with untracked hands dropped and the rest ordered by slot, or `(None, [])`."""
+    if hands is None or not len(slots):
+        return None, np.zeros(0, dtype=np.int64)
+    order = np.argsort(slots, kind="stable")
+    order = order[slots[order] >= 0]
+    if not len(order):
+        return None, np.zeros(0, dtype=np.int64)
+    return Hands(hands.normalized[order], hands.points[order]), slots[order]
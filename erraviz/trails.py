@@ -0,0 +1,153 @@
+"""Trail history and incremental trail drawing for the hand apps.
+
+`TrailBuffer` keeps the last `length` positions of a point in a fixed NumPy
+ring instead of a list trimmed with `pop(0)`. `FadeLayer` is a persistent
+off-screen surface that is darkened by a multiply every frame, so a trail
+can be drawn by stamping only its newest points into the layer: the older
+ones fade out on their own and the cost per frame no longer depends on the
+trail length.
+
+The layer only fades, and only copies to the window, the bounding rect of
+the stamps that can still be lit, so a few fingers on a large window don't
+pay for whole-window blits. SDL's integer multiply stops short of black, so
+a stamp that has faded as far as it goes is cleared once no newer stamp
+overlaps it.
+"""
+
+from collections import deque
+
+import numpy as np
+import pygame
+
+
+class TrailBuffer:
+    """Ring buffer of the last `length` `(x, y)` positions."""
+
+    def __init__(self, length=15, dims=2, dtype=np.int64):
+        self.length = length
+        self.points = np.zeros((length, dims), dtype=dtype)
+        self.pushed = 0  # Total positions ever pushed; the newest is `pushed - 1`
+
+    def push(self, *point):
+        self.points[self.pushed % self.length] = point
+        self.pushed += 1
+
+    def __len__(self):
+        return min(self.pushed, self.length)
+
+    def ordered(self):
+        """Stored positions, oldest first, as a `(len, dims)` array."""
+        if self.pushed <= self.length:
+            return self.points[:self.pushed]
+        head = self.pushed % self.length
+        return np.concatenate((self.points[head:], self.points[:head]))
+
+    def since(self, pushed):
+        """`(sequence numbers, positions)` pushed after `pushed` that are still stored."""
+        start = max(pushed, self.pushed - self.length)
+        seqs = np.arange(start, self.pushed)
+        return seqs, self.points[seqs % self.length]
+
+    def clear(self):
+        self.pushed = 0
+
+
+class FadeLayer:
+    """Off-screen surface whose contents are multiplied by `fade` on every `fade()` call.
+
+    Draw into it with `stamp` (or draw into `surface` and `mark` the rects),
+    then `draw` it onto the window in place of clearing the window. Anything
+    drawn over the window afterwards has to be passed to `cover`, so the
+    next `draw` clears it.
+    """
+
+    def __init__(self, size, fade=0.85):
+        self.surface = pygame.Surface(size)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        # Blitting a grey surface with BLEND_RGB_MULT takes SDL's SIMD path; `fill` with the
+        # same blend flag is over 20x slower
+        self._multiply = pygame.Surface(size, 0, self.surface)
+        self._stamps = deque([None], maxlen=1)  # Bounding rect stamped in each recent frame, newest last
+        self._faded = None  # Stamps faded as far as they go, cleared once no newer stamp overlaps them
+        self._shown = None  # Area of the target written by the last `draw` or covered since
+        self.set_fade(fade)
+
+    @staticmethod
+    def fade_for(frames, floor=1 / 16):
+        """Per-frame fade that dims a stamp to `floor` of its brightness after `frames` frames."""
+        return floor ** (1.0 / max(1, frames))
+
+    def set_fade(self, fade):
+        self.fade_factor = fade
+        level = int(round(255 * fade))
+        self._multiply.fill((level, level, level))
+        # Frames until a white stamp stops getting darker, counted with SDL's own arithmetic
+        pixel = pygame.Surface((1, 1), 0, self.surface)
+        pixel.fill((255, 255, 255))
+        frames, last = 0, 255
+        while frames < 4096:
+            pixel.blit(self._multiply, (0, 0), (0, 0, 1, 1), special_flags=pygame.BLEND_RGB_MULT)
+            frames += 1
+            value = pixel.get_at((0, 0))[0]
+            if value == last:
+                break
+            last = value
+        stamps = list(self._stamps)
+        self._stamps = deque(stamps[-frames:], maxlen=frames)
+        for rect in stamps[:-frames]:
+            self._retire(rect)
+
+    @property
+    def dirty(self):
+        """Bounding rect of everything in the layer that isn't black, or None."""
+        return _union(*self._stamps, self._faded)
+
+    def mark(self, *rects):
+        """Record rects drawn directly into `surface` this frame."""
+        self._stamps[-1] = _union(self._stamps[-1], *rects)
+
+    def stamp(self, blits):
+        """Blit `(source, dest)` pairs into the layer."""
+        self.mark(*self.surface.blits(blits))
+
+    def fade(self):
+        """Darken the lit part of the layer and start a new frame of stamps."""
+        if len(self._stamps) == self._stamps.maxlen:
+            self._retire(self._stamps.popleft())
+        area = self.dirty
+        if area is not None:
+            self.surface.blit(self._multiply, area, area, special_flags=pygame.BLEND_RGB_MULT)
+        self._stamps.append(None)
+
+    def draw(self, target):
+        """Copy the lit part of the layer onto `target`, clearing what the last `draw` left there."""
+        area = self.dirty
+        clear = _union(area, self._shown)
+        if clear is not None:
+            target.blit(self.surface, clear, clear)
+        self._shown = area
+        return clear
+
+    def cover(self, *rects):
+        """Record rects drawn over the target since `draw`."""
+        self._shown = _union(self._shown, *rects)
+
+    def clear(self):
+        self.surface.fill((0, 0, 0))
+        self._stamps = deque([None], maxlen=self._stamps.maxlen)
+        self._faded = None
+
+    def _retire(self, rect):
+        self._faded = _union(self._faded, rect)
+        live = _union(*self._stamps)
+        if self._faded is not None and (live is None or not live.colliderect(self._faded)):
+            self.surface.fill((0, 0, 0), self._faded)
+            self._faded = None
+
+
+def _union(*rects):
+    rects = [rect for rect in rects if rect]
+    if not rects:
+        return None
+    return rects[0].unionall(rects[1:])
@@ -0,0 +1,146 @@
+"""Gesture-driven sound triggering: bend detection with hysteresis and a voice pool.
+
+`BendDetector` turns per-finger bend angles into press/release events. A
+finger has to bend past its threshold to press and straighten below
+`release_ratio` of it to release, so noise around one threshold can't
+chatter, and a release must hold for `release_debounce` seconds before it
+counts. Presses are not debounced, to keep them as fast as possible.
+
+`TriggerEngine` plays each finger's sound on mixer channels reserved for it,
+so other sounds can't take them, with `voices` channels per finger: a new
+press while the previous note is still fading gets a fresh channel, and only
+when all of them are busy is the oldest one stolen. Every press is timed
+from the capture of the camera frame to `Channel.play()`.
+"""
+
+import time
+
+import numpy as np
+import pygame
+
+from .stats import FrameStats
+
+
+class BendDetector:
+    """Press/release events from bend angles, with hysteresis and release debouncing."""
+
+    def __init__(self, thresholds, release_ratio=0.75, release_debounce=0.08):
+        self.press_at = np.asarray(thresholds, dtype=np.float64)
+        self.release_at = self.press_at * release_ratio
+        self.release_debounce = release_debounce
+        self.bent = np.zeros(len(self.press_at), dtype=bool)
+        self._straight_since = np.full(len(self.press_at), np.nan)
+
+    def update(self, angles, timestamp):
+        """Feed one frame of angles; returns `(pressed, released)` boolean masks."""
+        pressed = ~self.bent & (angles > self.press_at)
+        straight = self.bent & (angles < self.release_at)
+        # Releases start a timer and only count once they have held long enough
+        self._straight_since[straight & np.isnan(self._straight_since)] = timestamp
+        self._straight_since[~straight] = np.nan
+        released = straight & (timestamp - self._straight_since >= self.release_debounce)
+        self.bent |= pressed
+        self.bent &= ~released
+        self._straight_since[released] = np.nan
+        return pressed, released
+
+    def reset(self):
+        self.bent[:] = False
+        self._straight_since[:] = np.nan
+
+
+class TriggerEngine:
+    """Play `sounds[i]` for finger `i` on `voices` reserved mixer channels per finger.
+
+    `release_ms` fades a note out on release instead of cutting it, which
+    avoids clicks. `buffer` is the mixer buffer in frames; it only feeds the
+    latency report, since the buffer adds its length on top of `play()`.
+    `volumes` optionally gives a `(left, right)` volume per sound, e.g. to
+    pan each performer's bank to their side of the stage. Set
+    `measure_latency` to False when capture times are not on the
+    `time.perf_counter()` clock, e.g. in an unthrottled replay.
+    """
+
+    def __init__(self, sounds, voices=2, release_ms=30, buffer=None, volumes=None):
+        self.sounds = list(sounds)
+        self.voices = voices
+        self.release_ms = release_ms
+        self.volumes = volumes
+        needed = len(self.sounds) * voices
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), needed + 8))
+        pygame.mixer.set_reserved(needed)
+        self.channels = [[pygame.mixer.Channel(i * voices + v) for v in range(voices)]
+                         for i in range(len(self.sounds))]
+        self._started = np.zeros((len(self.sounds), voices))
+        self._held = [None] * len(self.sounds)  # Voice of each finger's sounding note
+        rate = pygame.mixer.get_init()[0]
+        self.buffer_ms = 1000.0 * buffer / rate if buffer else 0.0
+        self.latency = FrameStats(window=256)
+        self.measure_latency = True
+        self.triggers = 0
+        self.stolen = 0
+
+    def press(self, index, capture_time=None):
+        pool = self.channels[index]
+        free = [v for v, channel in enumerate(pool) if not channel.get_busy()]
+        if free:
+            voice = free[0]
+        else:
+            voice = int(np.argmin(self._started[index]))  # Steal the oldest note
+            self.stolen += 1
+        pool[voice].play(self.sounds[index])
+        if self.volumes is not None:
+            pool[voice].set_volume(*self.volumes[index])
+        now = time.perf_counter()
+        self._started[index, voice] = now
+        self._held[index] = voice
+        self.triggers += 1
+        if self.measure_latency:
+            self.latency.record(now if capture_time is None else capture_time, now)
+
+    def release(self, index):
+        voice = self._held[index]
+        if voice is None:
+            return
+        if self.release_ms:
+            self.channels[index][voice].fadeout(self.release_ms)
+        else:
+            self.channels[index][voice].stop()
+        self._held[index] = None
+
+    def update(self, pressed, released, capture_time=None):
+        """Apply `BendDetector.update` masks."""
+        for index in np.flatnonzero(released).tolist():
+            self.release(index)
+        for index in np.flatnonzero(pressed).tolist():
+            self.press(index, capture_time)
+
+    def voice_offsets(self, now=None):
+        """Seconds each voice has been audible, `(sounds, voices)`, NaN for idle voices.
+
+        The mixer buffer delays every note by its length, which is taken off
+        so the offsets follow what is actually heard.
+        """
+        now = time.perf_counter() if now is None else now
+        busy = np.array([[channel.get_busy() for channel in pool] for pool in self.channels], dtype=bool)
+        offsets = now - self._started - self.buffer_ms / 1000.0
+        offsets[~busy] = np.nan
+        return offsets
+
+    def stop(self):
+        for pool in self.channels:
+            for channel in pool:
+                channel.stop()
+        self._held = [None] * len(self.sounds)
+
+    def summary(self):
+        return {"triggers": self.triggers, "stolen": self.stolen, "buffer_ms": self.buffer_ms,
+                "capture_to_play_ms": self.latency.summary().get("latency_ms")}
+
+    def format(self):
+        text = f"{self.triggers} triggers, {self.stolen} stolen"
+        latency = self.latency.summary().get("latency_ms")
+        if latency is None:
+            return text
+        return (f"capture->play p50 {latency['p50']:.1f} ms  p95 {latency['p95']:.1f} ms  "
+                f"p99 {latency['p99']:.1f} ms  (+{self.buffer_ms:.1f} ms mixer buffer)  {text}")
@@ -0,0 +1,156 @@
+"""Record a pygame visual to a video file without slowing its render loop.
+
+`grab_surface` reads the window through a `pygame.surfarray` view, which
+points at the surface's own pixels, and copies the raw 32-bit pixels into a
+reusable frame in one contiguous pass; converting them to BGR is left to the
+encoder thread.
+
+`VideoEncoder` owns a fixed pool of `queue` frames and one background thread
+writing them with `cv2.VideoWriter`. The render loop takes a free frame,
+fills it and hands it over. When the encoder falls behind and no frame is
+free, the new frame is dropped (or, with `block=True`, the render loop waits
+for one) and counted, so back-pressure shows up in the stats rather than as
+a stalled window. Frames are placed on the video's timeline by their
+timestamps: after a gap the previous frame is repeated, so the video keeps
+real time at its `fps` whatever rate the visual drew at.
+"""
+
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .stats import StageStats
+
+
+def surface_channels(surface):
+    """Byte positions of blue, green and red in a 32-bit surface's pixels."""
+    red, green, blue, _ = surface.get_shifts()
+    if sys.byteorder == "little":
+        return blue // 8, green // 8, red // 8
+    return 3 - blue // 8, 3 - green // 8, 3 - red // 8
+
+
+def grab_surface(surface, out):
+    """Copy a 32-bit surface into `out`, a `(height, width, 4)` uint8 frame."""
+    import pygame
+
+    pixels = pygame.surfarray.pixels2d(surface)  # (width, height) view of the surface, rows contiguous
+    try:
+        np.copyto(out.view(np.uint32)[..., 0], pixels.T)
+    finally:
+        del pixels  # Unlocks the surface
+
+
+class VideoEncoder:
+    """Background `cv2.VideoWriter` fed from a bounded pool of frames.
+
+    Frames are `(height, width, 4)` uint8 with blue, green and red at the
+    byte positions in `channels`. Call `frame()` for a free one (None when
+    the frame should be dropped), fill it and `submit` it with its
+    timestamp in seconds.
+    """
+
+    def __init__(self, path, size, fps=60, fourcc="mp4v", queue_frames=8, block=False, channels=(0, 1, 2)):
+        self.path = path
+        self.size = tuple(size)
+        self.fps = fps
+        self.fourcc = fourcc
+        self.block = block
+        self.channels = tuple(channels)
+        width, height = self.size
+        self._free = queue.Queue()
+        for _ in range(max(1, int(queue_frames))):
+            self._free.put(np.empty((height, width, 4), dtype=np.uint8))
+        self.queue_frames = self._free.qsize()
+        self._ready = queue.Queue()
+        self.submitted = self.written = self.dropped = self.repeated = self.skipped = 0
+        self.waited = 0.0  # Seconds the render loop spent waiting for a free frame
+        self.high_water = 0  # Most frames queued at once
+        self.encode = StageStats("encode")
+        self._writer = self._thread = None
+
+    def open(self):
+        import cv2
+
+        self.cv2 = cv2
+        self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+        if not self._writer.isOpened():
+            raise RuntimeError(f"Could not open {self.path} for writing with codec {self.fourcc}")
+        self._thread = threading.Thread(target=self._encode_loop, name="encode", daemon=True)
+        self._thread.start()
+        return self
+
+    def frame(self):
+        """A free frame to fill, or None when all of them are still queued (the frame is then dropped)."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            if not self.block:
+                self.dropped += 1
+                return None
+        start = time.perf_counter()
+        frame = self._free.get()
+        self.waited += time.perf_counter() - start
+        return frame
+
+    def submit(self, frame, timestamp):
+        self.submitted += 1
+        self._ready.put((frame, timestamp))
+        self.high_water = max(self.high_water, self._ready.qsize())
+
+    def _bgr(self, frame):
+        if self.channels == (0, 1, 2):
+            return self.cv2.cvtColor(frame, self.cv2.COLOR_BGRA2BGR)
+        if self.channels == (2, 1, 0):
+            return self.cv2.cvtColor(frame, self.cv2.COLOR_RGBA2BGR)
+        return np.ascontiguousarray(frame[..., self.channels])
+
+    def _encode_loop(self):
+        start = None
+        next_slot = 0  # Index of the next frame in the video
+        last = None
+        while True:
+            entry = self._ready.get()
+            if entry is None:
+                return
+            frame, timestamp = entry
+            with self.encode.measure():
+                bgr = self._bgr(frame)
+                self._free.put(frame)  # Converted, so the render loop can have it back
+                if start is None:
+                    start = timestamp
+                slot = round((timestamp - start) * self.fps)
+                if slot < next_slot:
+                    self.skipped += 1  # Drawn faster than the video's frame rate
+                    continue
+                # Hold the previous frame over the gap
+                for _ in range(slot - next_slot if last is not None else 0):
+                    self._writer.write(last)
+                    self.repeated += 1
+                self._writer.write(bgr)
+                self.written += 1
+                next_slot = slot + 1
+                last = bgr
+
+    def close(self):
+        """Encode everything still queued and finish the file."""
+        if self._thread is not None:
+            self._ready.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def stats(self):
+        return {"submitted": self.submitted, "written": self.written, "dropped": self.dropped,
+                "repeated": self.repeated, "skipped": self.skipped, "waited_s": self.waited,
+                "queued_max": self.high_water, "queue_frames": self.queue_frames}
+
+    def format(self):
+        return (f"video {self.written} frames ({self.repeated} repeated, {self.skipped} skipped), "
+                f"dropped {self.dropped}, queue {self.high_water}/{self.queue_frames}, "
+                f"waited {self.waited * 1000:.0f} ms, {self.encode.format()}")
@@ -0,0 +1,188 @@
+"""Scrolling spectrogram ("waterfall") history for the FFT visualiser.
+
+`Waterfall` keeps the last `rows` spectra in one preallocated `(2 * rows,
+bins)` uint8 array with every row written twice, `rows` apart. The newest
+`rows` rows, oldest first, are then always one contiguous slice of it, so
+the image handed to the display is a view that scrolls by moving its start,
+never a rolled copy, and adding a spectrum costs O(bins) however long the
+history is.
+
+Rows are stored as colour indices: each spectrum is converted to dB once when
+it arrives and quantised to 0-255 between `floor_db` and `ceiling_db`, and
+the display maps indices to colours with a 256-entry lookup table
+(`colormap_lut`).
+
+With a `spill` path every row is also appended to a memory-mapped file that
+holds the whole session (a 64-byte header followed by uint8 rows), for
+export afterwards:
+
+    python -m erraviz.waterfall session.wfall waterfall.png
+"""
+
+import argparse
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"ERRAWFAL"
+VERSION = 1
+HEADER = struct.Struct("<8sIIddd")  # magic, version, bins, rows per second, fmin, fmax
+HEADER_SIZE = 64
+
+# Colour stops from quiet to loud: black, deep violet, red, orange, pale yellow
+DEFAULT_STOPS = ((0.0, (0, 0, 4)), (0.25, (66, 10, 104)), (0.5, (188, 55, 84)),
+                 (0.75, (249, 142, 9)), (1.0, (252, 255, 164)))
+
+
+def colormap_lut(stops=DEFAULT_STOPS, size=256):
+    """`(size, 3)` uint8 RGB lookup table interpolated between `(position, (r, g, b))` stops."""
+    positions = np.array([position for position, _ in stops], dtype=np.float64)
+    colors = np.array([color for _, color in stops], dtype=np.float64)
+    x = np.linspace(0.0, 1.0, size)
+    return np.stack([np.interp(x, positions, colors[:, c]) for c in range(3)], axis=1).round().astype(np.uint8)
+
+
+class WaterfallSpill:
+    """Append-only file of uint8 waterfall rows, memory-mapped and grown `chunk_rows` at a time."""
+
+    def __init__(self, path, bins, row_rate=0.0, freq_range=(0.0, 0.0), chunk_rows=4096):
+        self.path = path
+        self.bins = int(bins)
+        self.chunk_rows = int(chunk_rows)
+        self.rows = 0
+        self.capacity = 0
+        self._map = None
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.bins, row_rate, *freq_range).ljust(HEADER_SIZE, b"\0"))
+
+    def _grow(self, rows):
+        self.capacity = (rows // self.chunk_rows + 1) * self.chunk_rows
+        if self._map is not None:
+            self._map.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.capacity * self.bins)
+        self._map = np.memmap(self.path, dtype=np.uint8, mode="r+", offset=HEADER_SIZE,
+                              shape=(self.capacity, self.bins))
+
+    def append(self, rows):
+        """Append a `(count, bins)` block of rows."""
+        end = self.rows + len(rows)
+        if end > self.capacity:
+            self._grow(end)
+        self._map[self.rows:end] = rows
+        self.rows = end
+
+    def close(self):
+        """Flush and cut the file down to the rows actually written."""
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.rows * self.bins)
+
+
+def load_spill(path):
+    """`(rows, info)` of a spill file: a read-only `(count, bins)` uint8 memmap and its header fields."""
+    with open(path, "rb") as f:
+        magic, version, bins, row_rate, fmin, fmax = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a waterfall spill file")
+    if version != VERSION:
+        raise ValueError(f"{path} has waterfall version {version}, expected {VERSION}")
+    count = (os.path.getsize(path) - HEADER_SIZE) // bins if bins else 0
+    info = {"bins": bins, "row_rate": row_rate, "fmin": fmin, "fmax": fmax}
+    if count <= 0:
+        return np.zeros((0, bins), dtype=np.uint8), info
+    return np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=(count, bins)), info
+
+
+class Waterfall:
+    """The last `rows` spectra of `bins` values as colour indices, newest last.
+
+    `reference` is the magnitude shown as 0 dB (e.g. int16 full scale).
+    `spill` is a path for the full-session history file; `row_rate` (rows
+    per second) and `freq_range` are stored in its header.
+    """
+
+    def __init__(self, rows, bins, floor_db=-90.0, ceiling_db=-10.0, reference=1.0, spill=None, row_rate=0.0,
+                 freq_range=(0.0, 0.0)):
+        self.rows = int(rows)
+        self.bins = int(bins)
+        self._buffer = np.zeros((2 * self.rows, self.bins), dtype=np.uint8)
+        self.head = 0  # Slot of the next row, which is also the oldest one
+        self.written = 0
+        # index = (20 * log10(x / reference) - floor_db) * 255 / (ceiling_db - floor_db)
+        self._gain = 20.0 * 255.0 / (ceiling_db - floor_db)
+        self._offset = (-20.0 * np.log10(reference) - floor_db) * 255.0 / (ceiling_db - floor_db)
+        self._tiny = reference * 10.0 ** (floor_db / 20.0)  # Anything quieter is index 0 anyway
+        self._scratch = np.empty((0, self.bins))
+        self._quantised = np.empty((0, self.bins), dtype=np.uint8)
+        self.spill = WaterfallSpill(spill, self.bins, row_rate, freq_range) if spill else None
+
+    def _reserve(self, count):
+        if len(self._scratch) < count:
+            self._scratch = np.empty((count, self.bins))
+            self._quantised = np.empty((count, self.bins), dtype=np.uint8)
+        return self._scratch[:count], self._quantised[:count]
+
+    def quantise(self, spectra):
+        """Colour indices of a `(count, bins)` block of magnitudes (a view into a reused buffer)."""
+        scratch, quantised = self._reserve(len(spectra))
+        np.maximum(spectra, self._tiny, out=scratch)
+        np.log10(scratch, out=scratch)
+        scratch *= self._gain
+        scratch += self._offset
+        np.clip(scratch, 0.0, 255.0, out=scratch)
+        np.copyto(quantised, scratch, casting="unsafe")
+        return quantised
+
+    def push(self, spectra):
+        """Add one spectrum or a `(count, bins)` block of them, oldest first."""
+        spectra = np.asarray(spectra).reshape(-1, self.bins)
+        quantised = self.quantise(spectra)
+        if self.spill is not None:
+            self.spill.append(quantised)
+        recent = quantised[-self.rows:]  # Older ones would be overwritten straight away
+        slots = (self.head + len(quantised) - len(recent) + np.arange(len(recent))) % self.rows
+        self._buffer[slots] = recent
+        self._buffer[slots + self.rows] = recent
+        self.head = (self.head + len(quantised)) % self.rows
+        self.written += len(quantised)
+
+    @property
+    def image(self):
+        """`(rows, bins)` colour indices, oldest row first: a view, valid until the next `push`."""
+        return self._buffer[self.head:self.head + self.rows]
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+
+def export_spill(path, out, lut=None):
+    """Render a spill file to an image, first row at the top; returns `(width, height)`."""
+    from matplotlib.image import imsave
+
+    rows, _ = load_spill(path)
+    if not len(rows):
+        raise ValueError(f"{path} holds no rows")
+    lut = colormap_lut() if lut is None else lut
+    imsave(out, lut[rows])
+    return rows.shape[1], rows.shape[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a recorded FFT visualiser waterfall to an image.")
+    parser.add_argument("spill", help="Spill file written with --waterfall-spill")
+    parser.add_argument("out", help="Image file (PNG, JPEG, ...); one pixel per bin and row")
+    args = parser.parse_args(argv)
+    _, info = load_spill(args.spill)
+    width, height = export_spill(args.spill, args.out)
+    seconds = height / info["row_rate"] if info["row_rate"] else 0.0
+    print(f"Wrote {width}x{height} ({seconds:.1f} s of history) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Headless, parallel video export for the polar plot.
+
+The timeline is split into frame ranges that are rendered by a process pool
+with the Agg backend; no window is opened and no audio is played. Every frame
+is a pure function of its index (see `PolarScene`), so each worker replays the
+frames just before its range and the result is identical to a serial render.
+
+Frames are written either as a numbered PNG sequence or as one raw RGB24
+stream, e.g. for `ffmpeg -f rawvideo -pix_fmt rgb24 -s 1080x1920 -r 30 -i -`.
+"""
+
+import math
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from erraviz.analysis import AudioAnalysis
+from erraviz.pipeline import Pipeline, Processor
+from erraviz.stages import FrameFileSink, TimelineSource
+from scene import PolarScene, warm_up_frames
+
+
+class SceneRenderer(Processor):
+    """Render timeline items with a `PolarScene` on an Agg canvas; adds `rgba`.
+
+    The scene catches up to `start` when the pipeline opens.
+    """
+
+    name = "scene"
+
+    def __init__(self, settings, start=0):
+        self.settings = settings
+        self.start = start
+        self.canvas = self.scene = None
+
+    def open(self):
+        settings = self.settings
+        analysis = AudioAnalysis(settings["analysis_dir"]) if settings["analysis_dir"] else None
+        fig = Figure(figsize=(5.4, 9.6), dpi=settings["dpi"])
+        self.canvas = FigureCanvasAgg(fig)
+        self.scene = PolarScene(fig, analysis, bpm=settings["bpm"], seed=settings["seed"])
+        if settings["manual_bpm"]:
+            self.scene.set_bpm(settings["bpm"], manual=True)
+        self.scene.warm_up(self.start, settings["fps"])
+
+    def process(self, item):
+        self.scene.update(item["frame"], item["position"])
+        self.canvas.draw()
+        item["rgba"] = np.asarray(self.canvas.buffer_rgba())
+        return item
+
+
+def render_range(start, stop, settings, part_path=None):
+    """Render frames `start` to `stop`; PNGs go to `settings['out']`, raw frames to `part_path`."""
+    renderer = SceneRenderer(settings, start)
+    sink = FrameFileSink(settings["out"]) if part_path is None else FrameFileSink(part_path, fmt="raw")
+    Pipeline(TimelineSource(start, stop, settings["fps"]), [renderer], [sink], report_startup=False).run()
+    return renderer.canvas.get_width_height()
+
+
+def export(out, frames, fps=30, workers=None, fmt="png", seed=0, dpi=200, analysis=None,
+           bpm=125, manual_bpm=False, chunk_frames=None):
+    """Render `frames` frames to `out` (a directory for PNGs, a file or '-' for raw RGB24)."""
+    workers = workers or os.cpu_count() or 1
+    if chunk_frames is None:
+        # Enough ranges to keep every worker busy, long enough that the
+        # warm-up replay before each range stays a small fraction of the work
+        chunk_frames = max(math.ceil(frames / (workers * 2)), warm_up_frames // 4, 1)
+    ranges = [(start, min(start + chunk_frames, frames)) for start in range(0, frames, chunk_frames)]
+    settings = {"out": out, "fps": fps, "seed": seed, "dpi": dpi, "bpm": bpm, "manual_bpm": manual_bpm,
+                "analysis_dir": analysis.directory if analysis is not None else None}
+
+    if fmt == "png":
+        os.makedirs(out, exist_ok=True)
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(render_range, start, stop, settings) for start, stop in ranges]
+            size = [future.result() for future in futures][0] if futures else None
+        return size
+
+    # Raw stream: each range goes to its own part file, appended in timeline order
+    parts_dir = tempfile.mkdtemp(prefix="polar-export-")
+    target = sys.stdout.buffer if out == "-" else open(out, "wb")
+    size = None
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = []
+            for i, (start, stop) in enumerate(ranges):
+                part = os.path.join(parts_dir, f"part_{i:05d}.rgb")
+                futures.append((part, pool.submit(render_range, start, stop, settings, part)))
+            for part, future in futures:
+                size = future.result()
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, target, 1 << 22)
+                os.remove(part)
+    finally:
+        if target is not sys.stdout.buffer:
+            target.close()
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    return size
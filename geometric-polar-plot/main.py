@@ -1,139 +1,124 @@
+import argparse
+import os
+import sys
 import numpy as np
-import pygame
-from pygame import mixer
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-from matplotlib.widgets import Slider
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout clean for raw video export
 
-# Initialize Pygame Mixer for audio
-pygame.init()
-mixer.init()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.governor import QualityGovernor
+from erraviz.pipeline import Pipeline
+from erraviz.stages import AnalysisProcessor, MatplotlibSink, MusicSource
 
-# Load audio file
+# Audio file
 audio_file = "ukrainian.mp3"
-mixer.music.load(audio_file)
-mixer.music.play(-1)  # Play audio in a loop
-
-# Visualization parameters
-volhistory = []
-multiplier = 10
-frame_count = 0
-bpm = 125
-beat_interval_ms = 60000 / bpm  # 125 BPM to milliseconds per beat
-
-# Subdivisions for dynamic motion (e.g., quarter and eighth notes)
-subdivision_factor = 4
-subdivision_interval_ms = beat_interval_ms / subdivision_factor
-
-# Set up Matplotlib figure for 9:16 aspect ratio
-fig = plt.figure(figsize=(5.4, 9.6), dpi=100)  # Approximately 9:16
-ax = fig.add_subplot(111, polar=True)
-fig.patch.set_facecolor('black')  # Black background for the canvas
-
-# Particle class for dynamic visual effects
-class Particle:
-    def __init__(self, angle, radius, speed, color):
-        self.angle = angle
-        self.radius = radius
-        self.speed = speed
-        self.color = color
-
-    def move(self):
-        self.radius += self.speed
-
-particles = []  # Container for particles
-
-# Functions for effects
-def generate_gradient_color(frame_count):
-    """Generate a dynamic RGB color gradient."""
-    r = (np.sin(frame_count / 50.0) + 1) / 2  # Normalize to [0, 1]
-    g = (np.sin(frame_count / 70.0 + np.pi / 3) + 1) / 2
-    b = (np.sin(frame_count / 90.0 + 2 * np.pi / 3) + 1) / 2
-    return r, g, b
-
-def get_volume(frame_count):
-    """Simulate audio volume levels."""
-    beat_wave = np.abs(np.sin(2 * np.pi * (frame_count / (beat_interval_ms / 1000))))
-    subdivision_wave = np.abs(np.sin(2 * np.pi * (frame_count / (subdivision_interval_ms / 1000))))
-    return (beat_wave + subdivision_wave) * 0.5 * multiplier
-
-def get_pulse_scale(frame_count):
-    """Generate a pulse scale that keeps the plot large and pulsing in and out."""
-    pulse = 1.3 + 0.2 * np.sin(2 * np.pi * (frame_count / (beat_interval_ms / 1000)))
-    return pulse
-
-def add_particles(ax, frame_count):
-    """Add particles that respond to the rhythm."""
-    if frame_count % 5 == 0:  # Add a particle every 5 frames
-        particles.append(
-            Particle(
-                np.random.uniform(0, 2 * np.pi),
-                50,
-                np.random.uniform(1, 3),
-                generate_gradient_color(frame_count),
-            )
-        )
-
-    for particle in particles:
-        particle.move()
-        ax.scatter([particle.angle], [particle.radius], color=particle.color, s=10, alpha=0.6)
-
-def add_music_shapes(ax, volume, frame_count):
-    """Add reactive shapes such as polygons."""
-    size = volume * 10
-    rotation = (frame_count % 360) * np.pi / 180
-    polygon_angles = np.linspace(0, 2 * np.pi, 6) + rotation
-    polygon_radii = np.full(len(polygon_angles), size)
-    ax.fill(polygon_angles, polygon_radii, color=generate_gradient_color(frame_count), alpha=0.4)
-
-# Animation update function
-def update(frame):
-    global frame_count, volhistory
-    frame_count += 2  # Faster animation
-    ax.clear()
-    ax.set_facecolor('black')  # Black background for polar plot
-
-    # Get the audio volume level and pulse scale
-    volume = get_volume(frame_count)
-    pulse_scale = get_pulse_scale(frame_count)
-    volhistory.append(volume)
-    if len(volhistory) > 360:
-        volhistory.pop(0)
-
-    # Plot the circular waveform with pulse scaling
-    angles = np.linspace(0, 2 * np.pi, len(volhistory))
-    radii = np.interp(volhistory, [0, max(volhistory)], [50, 400]) * pulse_scale
-    ax.plot(angles, radii, color='white', lw=np.random.uniform(1, 3))
-
-    # Add glitch effects
-    for _ in range(4):
-        glitch_radii = radii + np.random.uniform(-30, 30, len(radii))
-        ax.plot(angles, glitch_radii, color=generate_gradient_color(frame_count), alpha=0.3, lw=0.8)
-
-    # Add particles and shapes
-    add_particles(ax, frame_count)
-    add_music_shapes(ax, volume, frame_count)
-
-    # Style settings
-    ax.grid(False)
-    ax.set_xticks([])
-    ax.set_yticks([])
-
-# Interactive slider for BPM control
-ax_slider = plt.axes([0.2, 0.01, 0.65, 0.03], facecolor='lightgoldenrodyellow')
-bpm_slider = Slider(ax_slider, 'BPM', 60, 200, valinit=125, valstep=1)
-
-def update_bpm(val):
-    global bpm, beat_interval_ms
-    bpm = bpm_slider.val
-    beat_interval_ms = 60000 / bpm
-
-bpm_slider.on_changed(update_bpm)
-
-# Run the animation
-ani = FuncAnimation(fig, update, interval=30)
-plt.show()
-
-# Stop music when done
-mixer.music.stop()
-pygame.quit()
+
+TARGET_FPS = 30  # The live view lowers its detail to hold this frame rate (0: always full detail)
+
+scene = None
+bpm_slider = None
+pipeline = None
+analysis_stage = None  # Loads the analysis track when the live pipeline starts
+governor = None
+
+def load_analysis():
+    # Decode and analyse the track once (RMS, onsets, band energies, beat grid);
+    # later runs just memory-map the cached features
+    from erraviz.analysis import AudioAnalysis
+
+    try:
+        return AudioAnalysis.load_or_build(audio_file)
+    except Exception as e:
+        print(f"Error analysing {audio_file}, falling back to simulated volume: {e}", file=sys.stderr)
+        return None
+
+def initial_bpm(analysis):
+    return min(max(round(analysis.tempo), 60), 200) if analysis else 125
+
+# Set up the Matplotlib figure, the scene and the BPM slider; runs once the pipeline has
+# started the music and loaded the analysis
+def build_figure():
+    global scene, bpm_slider
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Slider
+    from scene import PolarScene
+
+    # 9:16 aspect ratio
+    fig = plt.figure(figsize=(5.4, 9.6), dpi=100)  # Approximately 9:16
+    analysis = analysis_stage.analysis
+    scene = PolarScene(fig, analysis, bpm=initial_bpm(analysis), seed=np.random.SeedSequence().entropy)
+
+    # Interactive slider for BPM control
+    ax_slider = plt.axes([0.2, 0.01, 0.65, 0.03], facecolor='lightgoldenrodyellow')
+    bpm_slider = Slider(ax_slider, 'BPM', 60, 200, valinit=scene.bpm, valstep=1)
+
+    def update_bpm(val):
+        scene.set_bpm(bpm_slider.val, manual=True)
+
+    bpm_slider.on_changed(update_bpm)
+
+    # Detail to give up when frames run over budget, least noticeable first
+    if governor is not None:
+        governor.knob("glitch_lines", (4, 2, 1, 0), scene.set_glitch_lines)
+        governor.knob("particles", (512, 256, 128, 64), scene.set_max_particles)
+        governor.knob("antialias", (True, False), scene.set_antialiased)
+        governor.knob("wave_points", (360, 180, 90), scene.set_wave_points)
+    return fig
+
+# Animation update function, looked up against the current playback position
+def draw(item):
+    return scene.update(item["frame"], item["position"], item["index"])
+
+# Music plays through pygame, the analysis track follows its position, matplotlib draws with blitting
+def run_live(max_frames=None):
+    global pipeline, analysis_stage, governor
+    analysis_stage = AnalysisProcessor(audio_file)
+    governor = QualityGovernor(TARGET_FPS) if TARGET_FPS else None
+    sink = MatplotlibSink(build_figure, draw, interval=30, status=lambda: pipeline.format_stats())
+    pipeline = Pipeline(MusicSource(audio_file), [analysis_stage], [sink], max_frames=max_frames, governor=governor)
+    pipeline.run()
+    print(pipeline.format_stats(), file=sys.stderr)
+
+def run_export(args):
+    from pygame import mixer
+    from export import export
+
+    # Analysis only needs a decoder, not a sound card
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    mixer.init()
+    analysis = None if args.no_analysis else load_analysis()
+    mixer.quit()
+
+    seconds = args.seconds or (analysis.duration if analysis else 30)
+    frames = int(seconds * args.fps)
+    bpm = args.bpm or initial_bpm(analysis)
+    size = export(args.export, frames, fps=args.fps, workers=args.workers, fmt=args.format, seed=args.seed,
+                  dpi=args.dpi, analysis=analysis, bpm=bpm, manual_bpm=args.bpm is not None)
+    if size:
+        print(f"Exported {frames} frames at {size[0]}x{size[1]}, {args.fps} fps to {args.export}", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geometric polar plot visual")
+    parser.add_argument('--export', metavar='OUT',
+                        help="Render offline instead of opening a window: a directory for --format png, "
+                             "a file (or - for stdout) for --format raw")
+    parser.add_argument('--format', choices=['png', 'raw'], default='png', help="Image sequence or raw RGB24 stream")
+    parser.add_argument('--seconds', type=float, help="Length of the export (default: the whole track)")
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=None, help="Render processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for glitches and particles")
+    parser.add_argument('--dpi', type=int, default=200, help="200 gives 1080x1920")
+    parser.add_argument('--bpm', type=float, help="Use a fixed tempo instead of the analysed beat grid")
+    parser.add_argument('--no-analysis', action='store_true', help="Export with the simulated volume")
+    parser.add_argument('--audio', default=audio_file, help="Track to play and analyse")
+    parser.add_argument('--target-fps', type=float, default=TARGET_FPS,
+                        help="Frame rate the live view lowers its detail to hold (0: always full detail)")
+    parser.add_argument('--startup-only', action='store_true', help="Exit after the first frame (times the cold start)")
+    args = parser.parse_args()
+
+    audio_file = args.audio
+    TARGET_FPS = args.target_fps
+
+    if args.export:
+        run_export(args)
+    else:
+        run_live(1 if args.startup_only else None)
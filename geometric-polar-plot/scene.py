@@ -0,0 +1,186 @@
+import numpy as np
+
+from erraviz.particles import ParticleSystem
+
+# Visualization parameters
+multiplier = 10
+max_particles = 512  # Particles are culled once they leave the plot; this caps the rest
+max_radius = 650  # Largest waveform radius (400 * max pulse) plus glitch jitter
+history_length = 360  # Waveform points around the circle
+# Frames a particle can live (spawned at radius 50, slowest speed 1) and the
+# frames of volume history drawn; replaying this many frames rebuilds the state
+warm_up_frames = max(int(max_radius - 50) + 1, history_length)
+
+# Subdivisions for dynamic motion (e.g., quarter and eighth notes)
+subdivision_factor = 4
+
+# Functions for effects
+def generate_gradient_color(frame_count):
+    """Generate a dynamic RGB color gradient."""
+    r = (np.sin(frame_count / 50.0) + 1) / 2  # Normalize to [0, 1]
+    g = (np.sin(frame_count / 70.0 + np.pi / 3) + 1) / 2
+    b = (np.sin(frame_count / 90.0 + 2 * np.pi / 3) + 1) / 2
+    return r, g, b
+
+class PolarScene:
+    """The polar plot visual: figure, persistent artists and per-frame update.
+
+    All randomness (line width, glitch jitter, particle spawns) comes from a
+    generator seeded with `(seed, frame)`, so a given frame index always
+    renders the same picture and a scene started part-way through a timeline
+    can catch up with `warm_up(frame)`.
+    """
+
+    def __init__(self, fig=None, analysis=None, bpm=125, seed=0):
+        self.analysis = analysis
+        self.follow_beat_grid = analysis is not None  # Until a manual BPM is set
+        self.seed = seed
+        self.frame_count = 0
+        self.volhistory = []
+        self.set_bpm(bpm)
+        self.subdivision_interval_ms = self.beat_interval_ms / subdivision_factor
+
+        # Set up Matplotlib figure for 9:16 aspect ratio
+        if fig is None:
+            from matplotlib.figure import Figure  # Callers with a figure have matplotlib loaded already
+
+            fig = Figure(figsize=(5.4, 9.6), dpi=100)  # Approximately 9:16
+        self.fig = fig
+        self.ax = ax = self.fig.add_subplot(111, polar=True)
+        self.fig.patch.set_facecolor('black')  # Black background for the canvas
+
+        # Static styling is set once; blitting only redraws the artists below
+        ax.set_facecolor('black')  # Black background for polar plot
+        ax.set_ylim(0, max_radius)
+        ax.grid(False)
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+        # Particle store for dynamic visual effects (NumPy arrays, fixed capacity)
+        self.particles = ParticleSystem(capacity=max_particles, max_radius=max_radius)
+
+        # Persistent artists: created once, only their data is changed every frame
+        self.wave_line, = ax.plot([], [], color='white')
+        self.glitch_lines = [ax.plot([], [], alpha=0.3, lw=0.8)[0] for _ in range(4)]
+        self.shape_polygon, = ax.fill(np.zeros(6), np.zeros(6), alpha=0.4)
+        self.particle_scatter = ax.scatter(np.empty(0), np.empty(0), s=10, alpha=0.6)
+        self.artists = [self.wave_line, *self.glitch_lines, self.particle_scatter, self.shape_polygon]
+
+        # Detail settings the live view's quality governor can lower
+        self.glitch_count = len(self.glitch_lines)
+        self.wave_step = 1  # Draw every n-th waveform point
+
+    def set_glitch_lines(self, count):
+        self.glitch_count = count
+        for i, line in enumerate(self.glitch_lines):
+            line.set_visible(i < count)
+
+    def set_wave_points(self, points):
+        self.wave_step = max(1, history_length // points)
+
+    def set_max_particles(self, count):
+        self.particles.set_limit(count)
+
+    def set_antialiased(self, antialiased):
+        for artist in self.artists:
+            artist.set_antialiased(antialiased)
+
+    def set_bpm(self, bpm, manual=False):
+        self.bpm = bpm
+        self.beat_interval_ms = 60000 / bpm  # BPM to milliseconds per beat
+        if manual:
+            self.follow_beat_grid = False  # A manual tempo overrides the analysed track
+
+    def get_volume(self, index=None):
+        """Audio volume from the analysis track, or simulated when there is none."""
+        if index is not None:
+            return (0.6 * self.analysis.rms[index] + 0.4 * self.analysis.onset[index]) * multiplier
+        beat_wave = np.abs(np.sin(2 * np.pi * (self.frame_count / (self.beat_interval_ms / 1000))))
+        subdivision_wave = np.abs(np.sin(2 * np.pi * (self.frame_count / (self.subdivision_interval_ms / 1000))))
+        return (beat_wave + subdivision_wave) * 0.5 * multiplier
+
+    def get_pulse_scale(self, index=None):
+        """Generate a pulse scale that keeps the plot large and pulsing in and out."""
+        if index is not None:
+            return 1.3 + 0.2 * np.cos(2 * np.pi * self.analysis.beat_phase[index])  # Largest on the beat
+        pulse = 1.3 + 0.2 * np.sin(2 * np.pi * (self.frame_count / (self.beat_interval_ms / 1000)))
+        return pulse
+
+    def add_particles(self, rng):
+        """Add particles that respond to the rhythm."""
+        if self.frame_count % 5 == 0:  # Add a particle every 5 frames
+            self.particles.spawn(
+                rng.uniform(0, 2 * np.pi, 1),
+                50,
+                rng.uniform(1, 3, 1),
+                generate_gradient_color(self.frame_count),
+            )
+
+        # Move and cull all particles at once
+        self.particles.step()
+
+    def add_music_shapes(self, volume, index=None):
+        """Add reactive shapes such as polygons."""
+        size = volume * 10
+        if index is not None:
+            size = (volume + self.analysis.bands[index, 0] * multiplier) * 5  # Half volume, half bass
+        rotation = (self.frame_count % 360) * np.pi / 180
+        polygon_angles = np.linspace(0, 2 * np.pi, 6) + rotation
+        polygon_radii = np.full(len(polygon_angles), size)
+        self.shape_polygon.set_xy(np.column_stack((polygon_angles, polygon_radii)))
+        self.shape_polygon.set_color(generate_gradient_color(self.frame_count))
+
+    def step(self, frame, position=None, index=None):
+        """Advance the simulation to `frame` without touching the artists.
+
+        `position` is the playback position in seconds used to look up the
+        analysis track (or `index`, when it has been looked up already); one of
+        them is required while following the beat grid. Returns what `update`
+        needs to draw the frame.
+        """
+        self.frame_count = 2 * (frame + 1)  # Faster animation
+        rng = np.random.default_rng((self.seed, frame))
+
+        # Get the audio volume level and pulse scale
+        if not self.follow_beat_grid:
+            index = None
+        elif index is None:
+            index = self.analysis.index(position)
+        volume = self.get_volume(index)
+        pulse_scale = self.get_pulse_scale(index)
+        self.volhistory.append(volume)
+        if len(self.volhistory) > history_length:
+            self.volhistory.pop(0)
+
+        self.add_particles(rng)
+        return rng, index, volume, pulse_scale
+
+    def warm_up(self, frame, fps):
+        """Replay the frames before `frame` so a scene can start mid-timeline."""
+        for previous in range(max(0, frame - warm_up_frames), frame):
+            self.step(previous, previous / fps)
+
+    # Animation update function
+    def update(self, frame, position=None, index=None):
+        rng, index, volume, pulse_scale = self.step(frame, position, index)
+
+        # Plot the circular waveform with pulse scaling
+        history = self.volhistory[::self.wave_step]
+        angles = np.linspace(0, 2 * np.pi, len(history))
+        radii = np.interp(history, [0, max(self.volhistory)], [50, 400]) * pulse_scale
+        self.wave_line.set_data(angles, radii)
+        self.wave_line.set_linewidth(rng.uniform(1, 3))
+
+        # Add glitch effects
+        glitch_color = generate_gradient_color(self.frame_count)
+        glitch = 30 if index is None else 30 * (0.5 + self.analysis.bands[index, 2])  # Treble adds jitter
+        for line in self.glitch_lines[:self.glitch_count]:
+            line.set_data(angles, radii + rng.uniform(-glitch, glitch, len(radii)))
+            line.set_color(glitch_color)
+
+        # Hand all particles to the single scatter, then the shapes
+        self.particle_scatter.set_offsets(self.particles.offsets)
+        self.particle_scatter.set_facecolor(self.particles.colors)
+        self.add_music_shapes(volume, index)
+
+        return self.artists
@@ -8,151 +8,190 @@
 #   inspiration and code direction.
 # ========================================================
 
-import cv2
-import mediapipe
+import argparse
+import os
+import sys
 import pygame
 import math
 import time
-
-# Initialize pygame and mediapipe
-pygame.mixer.pre_init(44100, -16, 2, 512)
-pygame.init()
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.envelopes import SampleEnvelopes
+from erraviz.governor import QualityGovernor
+from erraviz.inference import LandmarkPredictor
+from erraviz.landmarks import FINGER_CHAINS
+from erraviz.pipeline import Pipeline
+from erraviz.stages import (CameraSource, CameraWindowSink, LandmarkProcessor, PredictProcessor, PygameSink,
+                            SessionSink, SessionSource, TrackProcessor, VideoSink)
+from erraviz.trails import FadeLayer
+from erraviz.tracking import HandTracker
+from erraviz.triggers import BendDetector, TriggerEngine
+
+# The window, mixer, camera and mediapipe are only opened once a pipeline starts
+MIXER_RATE = 44100
+MIXER_BUFFER = 512  # Frames; adds buffer / rate to every trigger's latency (11.6 ms at 512)
 WIDTH, HEIGHT = 1100, 800
-win = pygame.display.set_mode((WIDTH, HEIGHT))
-
-# Load sounds
-kick_sound = pygame.mixer.Sound("bass.wav")
-hihat_sound = pygame.mixer.Sound("atmosphere.wav")
-snare_sound = pygame.mixer.Sound("hithat.wav")
-atmosphere_sound = pygame.mixer.Sound("beep_loop.wav")
-synth_sound = pygame.mixer.Sound("synth.wav")
-
-cap = cv2.VideoCapture(0)
-mpHands = mediapipe.solutions.hands
-hands = mpHands.Hands(max_num_hands=1)
-mpDraw = mediapipe.solutions.drawing_utils
-
-# Sounds for each finger
-sounds = [kick_sound, hihat_sound, snare_sound, atmosphere_sound, synth_sound]
-
-# Cooldown to prevent repeated triggers
-last_bent_states = [False] * 5  # Track previous bent state of each finger
+win = None
+RENDER_FPS = 60  # Drawing runs at this rate; hand tracking updates whenever inference finishes
+TARGET_FPS = RENDER_FPS  # Tracers and palm effects get sparser to hold this frame rate (0: always full detail)
+MAX_HANDS = 2  # Performers; each tracked hand has its own fingers, bend state and sound bank
+
+show_camera = True  # Mirror the camera image (with the landmark overlay) in an OpenCV window
+headless = False  # Draw into a hidden window, e.g. to record a video without showing anything
+video_path = None  # Record the window to this video file
+VIDEO_FPS = RENDER_FPS
+roi_inference = False  # Track hands on a crop around the last ones instead of the whole frame
+
+pipeline = None
+landmarks = None  # LandmarkProcessor of the live pipeline
+performers = []  # Five fingers per hand slot
+predictor = LandmarkPredictor()
+tracker = HandTracker(MAX_HANDS)  # Keeps each performer's hand in the same slot across frames
+governor = None  # QualityGovernor of the running pipeline
+
+# Sound bank per performer, one sound per finger: kick, hihat, snare, atmosphere, synth.
+# Banks are reused round-robin when there are more hands than banks; each is panned to a side.
+SOUND_BANKS = [
+    ["bass.wav", "atmosphere.wav", "hithat.wav", "beep_loop.wav", "synth.wav"],
+    ["bass.wav", "atmosphere.wav", "hithat.wav", "beep_loop.wav", "synth.wav"],
+]
+BANK_PANS = [(1.0, 0.5), (0.5, 1.0)]  # (left, right) volume of each bank
+triggers = None  # TriggerEngine over every slot's sounds (slot * 5 + finger), created by load_sounds()
+envelopes = None  # SampleEnvelopes of the same sounds, driving the visuals
+
+# A finger presses when it bends past its threshold and releases once it straightens below
+# 3/4 of it for a moment, so noise around the threshold can't retrigger
+bend_thresholds = np.array([math.pi / 6] * 3 + [math.pi / 8] * 2)  # Thumb, index, middle, ring, pinky
+bends = None  # BendDetector over every slot's fingers
+
+# Load every performer's sounds onto reserved mixer channels, two voices per finger
+def load_sounds(buffer=MIXER_BUFFER):
+    global triggers, bends, envelopes
+    loaded = {}
+    paths, sounds, volumes = [], [], []
+    for slot in range(MAX_HANDS):
+        bank = slot % len(SOUND_BANKS)
+        for path in SOUND_BANKS[bank]:
+            if path not in loaded:
+                loaded[path] = pygame.mixer.Sound(path)
+            paths.append(path)
+            sounds.append(loaded[path])
+            volumes.append(BANK_PANS[bank % len(BANK_PANS)])
+    triggers = TriggerEngine(sounds, voices=2, release_ms=30, buffer=buffer, volumes=volumes)
+
+    # Envelopes of every sample, analysed once and cached next to the samples
+    try:
+        envelopes = SampleEnvelopes(paths)
+    except Exception as e:
+        print(f"Error analysing samples, visuals won't react to the sound: {e}")
+    bends = BendDetector(np.tile(bend_thresholds, MAX_HANDS), release_ratio=0.75, release_debounce=0.08)
+
+# Incremental mode draws each new finger pose once into a layer that fades every frame,
+# leaving motion tracers behind, instead of clearing the window every frame
+incremental_trails = False
+TRAIL_FRAMES = 15  # Frames until a pose has faded out in incremental mode
+trail_layer = None
+
+# Detail settings the quality governor may lower
+eye_lines = 8  # Radial lines of each palm's geometric eye
+tracer_step = 1  # Draw every n-th joint of each finger, from the tip
 
 # Finger class for managing tracers
 class Finger:
     def __init__(self):
         self.positions = []  # Track past positions for the pattern trail
+        self.fresh = False  # Set when the positions changed since the last draw_new
 
     def update_position(self, positions):
         self.positions = positions
+        self.fresh = True
 
-    def draw(self, color):
+    def draw(self, color, surface=None, radius=5):
         # Draw small circles along the finger's length for tracers
-        for i, (x, y) in enumerate(self.positions):
-            pygame.draw.circle(win, color, (x, y), 5)
-
-# Get fingertip and joint positions
-def get_finger_positions_and_center(img):
-    imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = hands.process(imgRGB)
-    if results.multi_hand_landmarks:
-        finger_positions = {}
-        finger_segments = {}
-        palm_x, palm_y = 0, 0
-        palm_count = 0
-
-        for hand in results.multi_hand_landmarks:
-            mpDraw.draw_landmarks(img, hand, mpHands.HAND_CONNECTIONS)
-            height, width, _ = img.shape
-            fingertip_ids = [4, 8, 12, 16, 20]  # Thumb, Index, Middle, Ring, Pinky
-            all_joint_ids = [[0, 1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12], [13, 14, 15, 16], [17, 18, 19, 20]]
-            palm_ids = [0, 5, 9, 13, 17]
-
-            for id, landmark in enumerate(hand.landmark):
-                x, y = int(landmark.x * width), int(landmark.y * height)
-                if id in fingertip_ids:
-                    finger_positions[id] = (x, y)
-                if id in palm_ids:
-                    palm_x += x
-                    palm_y += y
-                    palm_count += 1
-
-            # Capture all joint positions for each finger
-            for i, joint_ids in enumerate(all_joint_ids):
-                finger_segments[i] = [(int(hand.landmark[j].x * width), int(hand.landmark[j].y * height)) for j in joint_ids]
-
-            if palm_count > 0:
-                center_x, center_y = palm_x // palm_count, palm_y // palm_count
-                return finger_positions, finger_segments, (center_x, center_y)
-    return None, None, None
-
-# Animated color effect at the palm center
-def draw_smokey_effect(center):
+        return [pygame.draw.circle(surface or win, color, (x, y), radius)
+                for x, y in self.positions[::-1][::tracer_step]]
+
+    def draw_new(self, color, surface, radius=5):
+        if not self.fresh:
+            return []
+        self.fresh = False
+        return self.draw(color, surface, radius)
+
+# Animated color effect at the palm center; `level` (0-1) is the loudness of the hand's sounds.
+# Returns the area drawn over, as does draw_geometric_eye.
+def draw_smokey_effect(center, level=0.0):
     center_x, center_y = center
-    base_radius = 20 + int(5 * math.sin(pygame.time.get_ticks() / 300))
+    base_radius = 20 + int(5 * math.sin(pygame.time.get_ticks() / 300)) + int(30 * level)
     color = (40, 80, 60, 50)  # Dark green-blue effect color for center animation
-    pygame.draw.circle(win, color, (center_x, center_y), base_radius, 1)
+    return pygame.draw.circle(win, color, (center_x, center_y), base_radius, 1)
 
-# Draw a geometric eye effect at the palm center
-def draw_geometric_eye(center):
+# Draw a geometric eye effect at the palm center; `bands` (low, mid, high, each 0-1) of the
+# hand's sounds widen the iris, brighten it and stretch the radial lines
+def draw_geometric_eye(center, bands=(0.0, 0.0, 0.0)):
     center_x, center_y = center
+    low, mid, high = bands
 
     # Colors for the geometric eye: light blue iris, dark green outline
-    iris_color = (100, 150, 255)
+    iris_color = (100 + int(155 * mid), 150 + int(105 * mid), 255)
     outline_color = (40, 80, 60)
 
     # Draw the iris (a small circle in the center)
-    pygame.draw.circle(win, iris_color, (center_x, center_y), 10)
+    drawn = pygame.draw.circle(win, iris_color, (center_x, center_y), 10 + int(8 * low))
 
     # Draw the eye outline (ellipse around the iris)
     eye_width, eye_height = 50, 20
-    pygame.draw.ellipse(win, outline_color, (center_x - eye_width // 2, center_y - eye_height // 2, eye_width, eye_height), 2)
+    drawn.union_ip(pygame.draw.ellipse(win, outline_color, (center_x - eye_width // 2, center_y - eye_height // 2,
+                                                            eye_width, eye_height), 2))
 
     # Draw radial lines to create a geometric effect
-    for angle in range(0, 360, 45):  # 8 lines around the iris
+    for angle in range(0, 360, 360 // eye_lines) if eye_lines else ():  # 8 lines around the iris at full detail
         radian_angle = math.radians(angle)
-        line_length = 30
+        line_length = 30 + int(40 * high)
         end_x = center_x + int(line_length * math.cos(radian_angle))
         end_y = center_y + int(line_length * math.sin(radian_angle))
-        pygame.draw.line(win, outline_color, (center_x, center_y), (end_x, end_y), 1)
-
-
-# Update fingers' tracers and trigger sounds based on bending
-def update_fingers(fingers, finger_positions, finger_segments, hand_center, img):
-    win.fill((0, 0, 0))
-
-    if finger_positions:
-        fingertip_ids = [4, 8, 12, 16, 20]  # Thumb, Index, Middle, Ring, Pinky
-        mid_joint_ids = [3, 6, 10, 14, 18]  # Middle joints for bend detection
-        base_joint_ids = [0, 5, 9, 13, 17]
-
-        for i, tip_id in enumerate(fingertip_ids):
-            if tip_id in finger_positions:
-                fingers[i].update_position(finger_segments[i])
-                target_x, target_y = finger_positions[tip_id]
-
-                # Get joint positions for bend calculation
-                base_x, base_y = finger_segments[i][0]
-                mid_x, mid_y = finger_segments[i][2]
-
-                # Calculate angle for bend detection
-                angle1 = math.atan2(target_y - mid_y, target_x - mid_x)
-                angle2 = math.atan2(mid_y - base_y, mid_x - base_x)
-
-                # Adjust threshold for ring and pinky fingers
-                if i in [3, 4]:  # Ring and pinky fingers
-                    is_bent = abs(angle1 - angle2) > math.pi / 8  # Slightly more sensitive
-                else:
-                    is_bent = abs(angle1 - angle2) > math.pi / 6
-
-                # Play sound on initial bend, stop on unbend
-                if is_bent and not last_bent_states[i]:  # Transition from unbent to bent
-                    sounds[i].play()
-                elif not is_bent and last_bent_states[i]:  # Transition from bent to unbent
-                    sounds[i].stop()
-
-                # Update the last bent state
-                last_bent_states[i] = is_bent
+        drawn.union_ip(pygame.draw.line(win, outline_color, (center_x, center_y), (end_x, end_y), 1))
+    return drawn
+
+
+# Update fingers' tracers and trigger sounds based on bending.
+# `performers` holds five fingers per hand slot. `detected` and `slots` are the measured hands in
+# slot order (only on new inference results, `slots` is None otherwise) and drive the sounds;
+# `predicted` / `predicted_slots` are extrapolated to the current frame and drive the drawing.
+# `capture_time` is when the camera frame behind `detected` was captured.
+def update_fingers(performers, detected, slots, predicted=None, predicted_slots=None, capture_time=None):
+    global trail_layer
+
+    drawn, drawn_slots = (predicted, predicted_slots) if predicted is not None else (detected, slots)
+    hand_centers = []
+    if drawn is not None:
+        # Every hand's finger chains in one conversion per finger
+        chains = [drawn.points[:, chain].tolist() for chain in FINGER_CHAINS]
+        for hand, slot in enumerate(drawn_slots.tolist()):
+            for i, finger in enumerate(performers[slot]):
+                finger.update_position(chains[i][hand])
+        hand_centers = list(zip(drawn_slots.tolist(), drawn.palm_centers.tolist()))
+
+    # Loudness and band energy of every playing voice at its playback offset, per finger and per hand
+    finger_levels = np.zeros((MAX_HANDS, len(bend_thresholds)))
+    hand_bands = np.zeros((MAX_HANDS, 3))
+    if envelopes is not None:
+        rms, bands = envelopes.sample(triggers.voice_offsets())
+        finger_levels = np.minimum(rms.reshape(MAX_HANDS, -1), 1.0)
+        hand_bands = np.minimum(bands.reshape(MAX_HANDS, -1, 3).sum(axis=1), 1.0)
+    hand_levels = np.minimum(finger_levels.sum(axis=1), 1.0).tolist()
+    radii = (5 + 6 * finger_levels).astype(int).tolist()
+    hand_bands = hand_bands.tolist()
+
+    if slots is not None:
+        # Bend angles of every finger of every hand at once; slots without a hand count as straight.
+        # Play sound on bend, fade it out on unbend.
+        angles = np.zeros((MAX_HANDS, len(bend_thresholds)))
+        if detected is not None:
+            angles[slots] = detected.bend_angles
+        capture_time = time.perf_counter() if capture_time is None else capture_time
+        pressed, released = bends.update(angles.ravel(), capture_time)
+        triggers.update(pressed, released, capture_time)
 
     # Draw finger tracers with specified colors
     finger_colors = [
@@ -162,39 +201,144 @@ def update_fingers(fingers, finger_positions, finger_segments, hand_center, img)
         (40, 80, 60),     # Ring: Dark Green
         (169, 169, 169)   # Pinky: Dark White
     ]
-    
-    for i, finger in enumerate(fingers):
-        finger.draw(finger_colors[i])
-
-    if hand_center:
-        draw_smokey_effect(hand_center)
-
-    if hand_center:
-        draw_geometric_eye(hand_center)  # Use the new geometric eye function
-
-    pygame.display.flip()
-    cv2.imshow("Image", cv2.flip(img, 1))
-
-# Main loop
-def main():
-    fingers = [Finger() for _ in range(5)]
-    run = True
-    while run:
-        success, img = cap.read()
-        if not success:
-            print("Failed to capture image")
-            continue
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-
-        finger_positions, finger_segments, hand_center = get_finger_positions_and_center(img)
-        update_fingers(fingers, finger_positions, finger_segments, hand_center, img)
 
-    cap.release()
-    cv2.destroyAllWindows()
-    pygame.quit()
+    if incremental_trails:
+        if trail_layer is None:
+            trail_layer = FadeLayer((WIDTH, HEIGHT), FadeLayer.fade_for(TRAIL_FRAMES))
+        trail_layer.fade()
+        for slot, fingers in enumerate(performers):
+            for i, finger in enumerate(fingers):
+                trail_layer.mark(*finger.draw_new(finger_colors[i], trail_layer.surface, radii[slot][i]))
+        trail_layer.draw(win)  # Also clears what the last frame drew, and only there
+    else:
+        win.fill((0, 0, 0))
+        for slot, fingers in enumerate(performers):
+            for i, finger in enumerate(fingers):
+                finger.draw(finger_colors[i], radius=radii[slot][i])
+
+    for slot, hand_center in hand_centers:
+        drawn = [draw_smokey_effect(hand_center, hand_levels[slot]),
+                 draw_geometric_eye(hand_center, hand_bands[slot])]  # Use the new geometric eye function
+        if incremental_trails:
+            trail_layer.cover(*drawn)
+
+# Draw one pipeline item and trigger its sounds. `tracked` / `slots` are only set on items with
+# new inference results; `predicted` only when the pipeline has a predictor.
+def draw(surface, item):
+    update_fingers(performers, item.get("tracked"), item.get("slots"), item.get("predicted"),
+                   item.get("predicted_slots"), item["time"])
+
+# The mixer starts with the window; the sounds are loaded onto it right away
+def open_window(surface, measure_latency=True):
+    global win
+    win = surface
+    load_sounds(MIXER_BUFFER)
+    triggers.measure_latency = measure_latency
+
+def set_eye_lines(count):
+    global eye_lines
+    eye_lines = count
+
+def set_tracer_step(step):
+    global tracer_step
+    tracer_step = step
+
+# Detail to give up when drawing can't hold TARGET_FPS, least noticeable first
+def make_governor():
+    if not TARGET_FPS:
+        return None
+    governor = QualityGovernor(TARGET_FPS)
+    governor.knob("eye_lines", (8, 4, 0), set_eye_lines)
+    governor.knob("tracer_step", (1, 2), set_tracer_step)
+    return governor
+
+# Per-stage timing and the inference schedule in the title bar
+def live_status():
+    return f"{pipeline.format_stats()}  {landmarks.scheduler.format()}  {triggers.format()}"
+
+# The camera window (and its mirrored landmark overlay) is skipped entirely when not shown.
+# Replays record on the session's clock, and unthrottled ones wait for the encoder
+# rather than drop frames.
+def window_sinks(setup, status=None, fps=None, replay_clock=False, every_frame=False):
+    window = PygameSink((WIDTH, HEIGHT), draw, fps=fps, setup=setup, status=status,
+                        mixer=(MIXER_RATE, -16, 2, MIXER_BUFFER), hidden=headless)
+    sinks = [window]
+    if show_camera and not headless:
+        sinks.append(CameraWindowSink())
+    if video_path:
+        sinks.append(VideoSink(video_path, window, VIDEO_FPS, block=every_frame,
+                               clock=(lambda item: item["time"]) if replay_clock else None))
+    return sinks
+
+# Camera capture and hand tracking run on their own threads; the pipeline's render loop only draws
+def main(record=None, record_frames=None, max_frames=None):
+    global pipeline, landmarks, performers, governor
+    performers = [[Finger() for _ in range(5)] for _ in range(MAX_HANDS)]
+    landmarks = LandmarkProcessor(MAX_HANDS, target_fps=RENDER_FPS, roi=roi_inference)
+    sinks = window_sinks(open_window, live_status, RENDER_FPS)
+    if record:
+        sinks.append(SessionSink(record, max_hands=MAX_HANDS, frame_scale=record_frames))
+    governor = make_governor()
+    pipeline = Pipeline(CameraSource(0), [landmarks, TrackProcessor(tracker), PredictProcessor(predictor)],
+                        sinks, max_frames=max_frames, governor=governor)
+    pipeline.run()
+    print(pipeline.format_stats())
+    print(landmarks.scheduler.format())
+    print(triggers.format())
+
+# Drive drawing and sound triggers from a recorded session instead of the camera (no mediapipe needed)
+def replay(path, realtime=True, max_frames=None):
+    global pipeline, performers, governor
+    performers = [[Finger() for _ in range(5)] for _ in range(MAX_HANDS)]
+    # Unthrottled records run ahead of the clock, so their trigger latency means nothing
+    sinks = window_sinks(lambda surface: open_window(surface, measure_latency=realtime),
+                         lambda: f"{pipeline.format_stats()}  {triggers.format()}",
+                         replay_clock=True, every_frame=not realtime)
+    # Unthrottled video renders keep full detail: waiting for the encoder isn't drawing time
+    governor = make_governor() if realtime or not video_path else None
+    pipeline = Pipeline(SessionSource(path, realtime=realtime), [TrackProcessor(tracker)], sinks,
+                        max_frames=max_frames, governor=governor)
+    pipeline.run()
+    print(pipeline.format_stats())
+    print(triggers.format())
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Hand landmark art with finger-bend sounds")
+    parser.add_argument('--record', metavar='SESSION', help="Append the tracked landmarks to a session file")
+    parser.add_argument('--record-frames', type=float, metavar='SCALE',
+                        help="Also record camera frames, downscaled by SCALE (e.g. 0.25)")
+    parser.add_argument('--replay', metavar='SESSION', help="Replay a recorded session instead of the camera")
+    parser.add_argument('--unthrottled', action='store_true', help="Replay as fast as possible")
+    parser.add_argument('--no-camera-window', action='store_true',
+                        help="Don't open the OpenCV camera window (also skips mirroring and the landmark overlay)")
+    parser.add_argument('--video', metavar='OUT', help="Record the window to a video file (e.g. performance.mp4)")
+    parser.add_argument('--video-fps', type=float, default=VIDEO_FPS, help="Frame rate of the --video file")
+    parser.add_argument('--roi', action='store_true',
+                        help="Run hand tracking on a crop around the last hands (MediaPipe in static image mode)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Draw into a hidden window without the camera window, e.g. with --video")
+    parser.add_argument('--incremental-trails', action='store_true',
+                        help="Draw new finger poses into a fading layer instead of redrawing every frame")
+    parser.add_argument('--mixer-buffer', type=int, default=MIXER_BUFFER,
+                        help="Mixer buffer in frames; smaller is lower latency but may crackle")
+    parser.add_argument('--target-fps', type=float, default=TARGET_FPS,
+                        help="Frame rate to hold by thinning tracers and palm effects (0: always full detail)")
+    parser.add_argument('--hands', type=int, default=MAX_HANDS, help="Number of hands (performers) to track")
+    parser.add_argument('--startup-only', action='store_true', help="Exit after the first frame (times the cold start)")
+    args = parser.parse_args()
+
+    MAX_HANDS = args.hands
+    MIXER_BUFFER = args.mixer_buffer
+    tracker = HandTracker(MAX_HANDS)
+    show_camera = not args.no_camera_window
+    headless = args.headless
+    roi_inference = args.roi
+    video_path = args.video
+    VIDEO_FPS = args.video_fps
+    incremental_trails = args.incremental_trails
+    TARGET_FPS = args.target_fps
+    max_frames = 1 if args.startup_only else None
+    if args.replay:
+        replay(args.replay, realtime=not args.unthrottled, max_frames=max_frames)
+    else:
+        main(args.record, args.record_frames, max_frames)
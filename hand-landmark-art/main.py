@@ -8,165 +8,264 @@
 #   inspiration and code direction.
 # ========================================================
 
-import cv2
-import mediapipe
+import argparse
+import os
+import sys
 import pygame
 import math
 import random
 
-# Initialize pygame and mediapipe
-pygame.init()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.governor import QualityGovernor
+from erraviz.inference import LandmarkPredictor
+from erraviz.pipeline import Pipeline
+from erraviz.sprites import SpriteCache, trail_styles
+from erraviz.stages import (CameraSource, CameraWindowSink, LandmarkProcessor, PredictProcessor, PygameSink,
+                            SessionSink, SessionSource, TrackProcessor, VideoSink)
+from erraviz.trails import FadeLayer, TrailBuffer
+from erraviz.tracking import HandTracker
+
+# The window, camera and mediapipe are only opened once a pipeline starts
 WIDTH, HEIGHT = 900, 750
-win = pygame.display.set_mode((WIDTH, HEIGHT))
+win = None
+RENDER_FPS = 60  # Drawing runs at this rate; hand tracking updates whenever inference finishes
+TARGET_FPS = RENDER_FPS  # Trails and palm animations get shorter to hold this frame rate (0: always full detail)
+MAX_HANDS = 2  # Performers; each tracked hand keeps its own trails
+
+show_camera = True  # Mirror the camera image (with the landmark overlay) in an OpenCV window
+headless = False  # Draw into a hidden window, e.g. to record a video without showing anything
+video_path = None  # Record the window to this video file
+VIDEO_FPS = RENDER_FPS
+roi_inference = False  # Track hands on a crop around the last ones instead of the whole frame
+
+pipeline = None
+landmarks = None  # LandmarkProcessor of the live pipeline
+performers = []  # Five fingers per hand slot
+predictor = LandmarkPredictor()
+tracker = HandTracker(MAX_HANDS)  # Keeps each performer's hand in the same slot across frames
+governor = None  # QualityGovernor of the running pipeline
 
-cap = cv2.VideoCapture(0)
-mpHands = mediapipe.solutions.hands
-hands = mpHands.Hands(max_num_hands=1)
-mpDraw = mediapipe.solutions.drawing_utils
+TRAIL_LENGTH = 15
+trail_length = TRAIL_LENGTH  # Newest trail points drawn; the governor may lower it
+center_shapes = 6  # Squares circling each palm centre
+sprites = SpriteCache(max_bytes=16 << 20)  # Pre-rendered trail shapes, quantised by size and angle
+
+# Incremental mode stamps each new trail point once into a layer that fades every frame,
+# instead of clearing the window and redrawing every trail point
+incremental_trails = False
+trail_layer = None
 
 # Finger class to manage geometric shapes along each finger's movement
 class Finger:
     def __init__(self):
-        self.positions = []  # Track past positions for the pattern trail
+        self.trail = TrailBuffer(TRAIL_LENGTH)  # Past positions for the pattern trail
+        self.stamped = 0  # Trail points already drawn into the trail layer
+
+    @property
+    def positions(self):
+        return self.trail.ordered().tolist()
 
     def update_position(self, x, y):
-        self.positions.append((x, y))
-        if len(self.positions) > 15:
-            self.positions.pop(0)  # Limit trail length
-
-    def draw(self):
-        for i, pos in enumerate(self.positions):
-            x, y = pos
-            size = 10 + i * 1.5  # Increase size along the trail
-            rotation_angle = pygame.time.get_ticks() / 10 + i * 15  # Rotating effect
-            
-            # Create a rotating and pulsing shape at each position
-            draw_rotating_shape(x, y, size, rotation_angle, i)
-
-# Get fingertip positions and hand center
-def get_finger_positions_and_center(img):
-    imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = hands.process(imgRGB)
-    if results.multi_hand_landmarks:
-        finger_positions = {}
-        palm_x, palm_y = 0, 0
-        palm_count = 0
-
-        for hand in results.multi_hand_landmarks:
-            mpDraw.draw_landmarks(img, hand, mpHands.HAND_CONNECTIONS)
-            height, width, _ = img.shape
-            fingertip_ids = [4, 8, 12, 16, 20]
-            palm_ids = [0, 5, 9, 13, 17]
-
-            for id, landmark in enumerate(hand.landmark):
-                x, y = int(landmark.x * width), int(landmark.y * height)
-                if id in fingertip_ids:
-                    finger_positions[id] = (x, y)
-                if id in palm_ids:
-                    palm_x += x
-                    palm_y += y
-                    palm_count += 1
-
-            if palm_count > 0:
-                center_x, center_y = palm_x // palm_count, palm_y // palm_count
-                return finger_positions, (center_x, center_y)
-    return None, None
-
-# Draw rotating and pulsing shapes along each fingertip trail
-def draw_rotating_shape(x, y, size, angle, trail_index):
-    # Choose colors dynamically based on the time to create a vibrant effect
-    color = (
-        int(255 * abs(math.sin(pygame.time.get_ticks() / 500 + trail_index))),
-        int(255 * abs(math.sin(pygame.time.get_ticks() / 700 + trail_index))),
-        int(255 * abs(math.sin(pygame.time.get_ticks() / 900 + trail_index)))
-    )
-
-    # Pulsing effect
-    pulse_size = size + int(10 * math.sin(pygame.time.get_ticks() / 200 + trail_index))
-
-    # Draw a rotating shape (circle or triangle)
+        self.trail.push(x, y)
+
+    def draw(self, shapes, blits):
+        # Queue the rotating and pulsing shape of each trail index at its position, newest `trail_length` only
+        positions = self.positions
+        start = max(len(positions) - trail_length, 0)
+        for (x, y), sprite in zip(positions[start:], shapes[start:]):
+            if sprite is not None:
+                blits.append((sprite, sprite.get_rect(center=(x, y))))
+
+    def draw_new(self, shapes, blits):
+        # Queue only the points added since the last call; the trail index cycles along the trail
+        seqs, points = self.trail.since(self.stamped)
+        self.stamped = self.trail.pushed
+        for seq, (x, y) in zip(seqs.tolist(), points.tolist()):
+            sprite = shapes[seq % TRAIL_LENGTH]
+            if sprite is not None:
+                blits.append((sprite, sprite.get_rect(center=(x, y))))
+
+# Fingertips (thumb to pinky) and palm centers of every hand, converted in one go
+def finger_positions_and_center(detected):
+    if detected is None:
+        return [], []
+    return detected.fingertips.tolist(), detected.palm_centers.tolist()
+
+# One sprite per trail index for this frame; every finger's trail shares them
+def get_trail_shapes(ticks):
+    colors, sizes = trail_styles(ticks, TRAIL_LENGTH)  # Colour and pulse of every index at once
+    return [get_rotating_shape(size, ticks / 10 + i * 15, i, color)  # Rotating effect
+            for i, (size, color) in enumerate(zip(sizes.tolist(), colors.tolist()))]
+
+# Cached sprite for a trail shape (circle, triangle or square by trail index)
+def get_rotating_shape(size, angle, trail_index, color):
     if trail_index % 3 == 0:
-        # Draw a rotating circle
-        pygame.draw.circle(win, color, (x, y), pulse_size, 2)
+        # Circles take the trail colour
+        return sprites.get('circle', size, 0, color)
     elif trail_index % 3 == 1:
-        # Draw a rotating triangle
-        draw_rotating_triangle(x, y, pulse_size, angle)
+        # Triangle vertices follow `angle` in radians
+        return sprites.get('triangle', size, math.degrees(angle))
     else:
-        # Draw a rotating square
-        draw_rotating_square(x, y, pulse_size, angle)
-
-# Function to draw a rotating triangle
-def draw_rotating_triangle(x, y, size, angle):
-    half_size = size / 2
-    points = [
-        (x + half_size * math.cos(angle), y + half_size * math.sin(angle)),
-        (x + half_size * math.cos(angle + 2.094), y + half_size * math.sin(angle + 2.094)),
-        (x + half_size * math.cos(angle + 4.188), y + half_size * math.sin(angle + 4.188))
-    ]
-    pygame.draw.polygon(win, (255, 255, 255), points, 2)
-
-# Function to draw a rotating square
-def draw_rotating_square(x, y, size, angle):
-    square_surface = pygame.Surface((size, size), pygame.SRCALPHA)
-    pygame.draw.rect(square_surface, (255, 255, 255), (0, 0, size, size), 2)
-    rotated_square = pygame.transform.rotate(square_surface, angle)
-    rect = rotated_square.get_rect(center=(x, y))
-    win.blit(rotated_square, rect)
-
-# Draw rotating and pulsing pattern at the palm center
+        # Squares rotate by `angle` degrees
+        return sprites.get('square', size, angle)
+
+# Draw rotating and pulsing pattern at the palm center; returns the area drawn over
 def draw_center_animation(center):
     center_x, center_y = center
-    pygame.draw.circle(win, (255, 255, 255), (center_x, center_y), 30, 1)
+    drawn = pygame.draw.circle(win, (255, 255, 255), (center_x, center_y), 30, 1)
 
-    for i in range(6):
+    for i in range(center_shapes):
         size = 30 + int(20 * math.sin(pygame.time.get_ticks() / 300 + i))
         angle = math.radians(i * 60 + pygame.time.get_ticks() / 10)  # Rotating effect
         x = center_x + int(size * math.cos(angle))
         y = center_y + int(size * math.sin(angle))
-        pygame.draw.rect(win, (100 + i * 20, 100 + i * 20, 255 - i * 30), (x - size // 4, y - size // 4, size, size), 1)
+        drawn.union_ip(pygame.draw.rect(win, (100 + i * 20, 100 + i * 20, 255 - i * 30),
+                                        (x - size // 4, y - size // 4, size, size), 1))
+    return drawn
 
-# Update the fingers' positions and draw geometric patterns along each finger
-def update_fingers(fingers, finger_positions, hand_center, img):
-    win.fill((0, 0, 0))
+# Update the fingers' positions and draw geometric patterns along each finger.
+# `performers` holds five fingers per hand slot; `slots` says which slot each hand belongs to.
+def update_fingers(performers, finger_positions, hand_centers, slots):
+    global trail_layer
 
-    if finger_positions:
-        fingertip_ids = [4, 8, 12, 16, 20]
-        for i, tip_id in enumerate(fingertip_ids):
-            if tip_id in finger_positions:
-                target_x, target_y = finger_positions[tip_id]
-                fingers[i].update_position(target_x, target_y)
+    for slot, positions in zip(slots, finger_positions):
+        for finger, (target_x, target_y) in zip(performers[slot], positions):
+            finger.update_position(target_x, target_y)
+    fingers = [finger for performer in performers for finger in performer]
 
-    # Draw each finger with rotating and pulsing geometric shapes
-    for finger in fingers:
-        finger.draw()
+    # Draw each finger with rotating and pulsing geometric shapes, all in one blit call
+    shapes = get_trail_shapes(pygame.time.get_ticks())
+    blits = []
+    if incremental_trails:
+        if trail_layer is None:
+            trail_layer = FadeLayer((WIDTH, HEIGHT), FadeLayer.fade_for(trail_length))
+        trail_layer.fade()
+        for finger in fingers:
+            finger.draw_new(shapes, blits)
+        trail_layer.stamp(blits)
+        trail_layer.draw(win)  # Also clears what the last frame drew, and only there
+    else:
+        win.fill((0, 0, 0))
+        for finger in fingers:
+            finger.draw(shapes, blits)
+        win.blits(blits, doreturn=False)
 
-    # Draw animated geometric shape at hand center
-    if hand_center:
-        draw_center_animation(hand_center)
+    # Draw animated geometric shape at each hand center
+    for hand_center in hand_centers:
+        drawn = draw_center_animation(hand_center)
+        if incremental_trails:
+            trail_layer.cover(drawn)
+
+# Draw one pipeline item: the predicted landmarks when the pipeline has a predictor, else the tracked ones
+def draw(surface, item):
+    if "predicted" in item:
+        detected, slots = item["predicted"], item["predicted_slots"]
+    else:
+        detected, slots = item.get("tracked"), item.get("slots")
+    finger_positions, hand_centers = finger_positions_and_center(detected)
+    update_fingers(performers, finger_positions, hand_centers, slots.tolist() if detected is not None else [])
 
-    pygame.display.flip()
-    cv2.imshow("Image", cv2.flip(img, 1))
+def open_window(surface):
+    global win
+    win = surface
 
-def main():
-    fingers = [Finger() for _ in range(5)]
+def set_trail_length(length):
+    global trail_length
+    trail_length = length
+    if trail_layer is not None:
+        trail_layer.set_fade(FadeLayer.fade_for(length))  # Stamps fade out sooner instead
 
-    run = True
-    while run:
-        success, img = cap.read()
-        if not success:
-            print("Failed to capture image")
-            continue
+def set_center_shapes(count):
+    global center_shapes
+    center_shapes = count
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
+# Detail to give up when drawing can't hold TARGET_FPS, least noticeable first
+def make_governor():
+    if not TARGET_FPS:
+        return None
+    governor = QualityGovernor(TARGET_FPS)
+    governor.knob("center_shapes", (6, 3, 0), set_center_shapes)
+    governor.knob("trail_length", (TRAIL_LENGTH, 10, 6), set_trail_length)
+    return governor
 
-        finger_positions, hand_center = get_finger_positions_and_center(img)
-        update_fingers(fingers, finger_positions, hand_center, img)
+# Per-stage timing and the inference schedule in the title bar
+def live_status():
+    return f"{pipeline.format_stats()}  {landmarks.scheduler.format()}"
 
-    cap.release()
-    cv2.destroyAllWindows()
-    pygame.quit()
+# The camera window (and its mirrored landmark overlay) is skipped entirely when not shown.
+# Replays record on the session's clock, and unthrottled ones wait for the encoder
+# rather than drop frames.
+def window_sinks(status=None, fps=None, replay_clock=False, every_frame=False):
+    window = PygameSink((WIDTH, HEIGHT), draw, fps=fps, setup=open_window, status=status, hidden=headless)
+    sinks = [window]
+    if show_camera and not headless:
+        sinks.append(CameraWindowSink())
+    if video_path:
+        sinks.append(VideoSink(video_path, window, VIDEO_FPS, block=every_frame,
+                               clock=(lambda item: item["time"]) if replay_clock else None))
+    return sinks
+
+# Camera capture and hand tracking run on their own threads; the pipeline's render loop only draws
+def main(record=None, record_frames=None, max_frames=None):
+    global pipeline, landmarks, performers, governor
+    performers = [[Finger() for _ in range(5)] for _ in range(MAX_HANDS)]
+    landmarks = LandmarkProcessor(MAX_HANDS, target_fps=RENDER_FPS, roi=roi_inference)
+    sinks = window_sinks(live_status, RENDER_FPS)
+    if record:
+        sinks.append(SessionSink(record, max_hands=MAX_HANDS, frame_scale=record_frames))
+    governor = make_governor()
+    pipeline = Pipeline(CameraSource(0), [landmarks, TrackProcessor(tracker), PredictProcessor(predictor)],
+                        sinks, max_frames=max_frames, governor=governor)
+    pipeline.run()
+    print(pipeline.format_stats())
+    print(landmarks.scheduler.format())
+
+# Drive the drawing from a recorded session instead of the camera (no mediapipe needed)
+def replay(path, realtime=True, max_frames=None):
+    global pipeline, performers, governor
+    performers = [[Finger() for _ in range(5)] for _ in range(MAX_HANDS)]
+    # Unthrottled video renders keep full detail: waiting for the encoder isn't drawing time
+    governor = make_governor() if realtime or not video_path else None
+    pipeline = Pipeline(SessionSource(path, realtime=realtime), [TrackProcessor(tracker)],
+                        window_sinks(lambda: pipeline.format_stats(), replay_clock=True, every_frame=not realtime),
+                        max_frames=max_frames, governor=governor)
+    pipeline.run()
+    print(pipeline.format_stats())
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Hand landmark art")
+    parser.add_argument('--record', metavar='SESSION', help="Append the tracked landmarks to a session file")
+    parser.add_argument('--record-frames', type=float, metavar='SCALE',
+                        help="Also record camera frames, downscaled by SCALE (e.g. 0.25)")
+    parser.add_argument('--replay', metavar='SESSION', help="Replay a recorded session instead of the camera")
+    parser.add_argument('--unthrottled', action='store_true', help="Replay as fast as possible")
+    parser.add_argument('--no-camera-window', action='store_true',
+                        help="Don't open the OpenCV camera window (also skips mirroring and the landmark overlay)")
+    parser.add_argument('--video', metavar='OUT', help="Record the window to a video file (e.g. performance.mp4)")
+    parser.add_argument('--video-fps', type=float, default=VIDEO_FPS, help="Frame rate of the --video file")
+    parser.add_argument('--roi', action='store_true',
+                        help="Run hand tracking on a crop around the last hands (MediaPipe in static image mode)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Draw into a hidden window without the camera window, e.g. with --video")
+    parser.add_argument('--incremental-trails', action='store_true',
+                        help="Draw only new trail points into a fading layer instead of redrawing whole trails")
+    parser.add_argument('--target-fps', type=float, default=TARGET_FPS,
+                        help="Frame rate to hold by shortening trails (0: always full detail)")
+    parser.add_argument('--hands', type=int, default=MAX_HANDS, help="Number of hands (performers) to track")
+    parser.add_argument('--startup-only', action='store_true', help="Exit after the first frame (times the cold start)")
+    args = parser.parse_args()
+
+    MAX_HANDS = args.hands
+    tracker = HandTracker(MAX_HANDS)
+    show_camera = not args.no_camera_window
+    headless = args.headless
+    roi_inference = args.roi
+    video_path = args.video
+    VIDEO_FPS = args.video_fps
+    incremental_trails = args.incremental_trails
+    TARGET_FPS = args.target_fps
+    max_frames = 1 if args.startup_only else None
+    if args.replay:
+        replay(args.replay, realtime=not args.unthrottled, max_frames=max_frames)
+    else:
+        main(args.record, args.record_frames, max_frames)
@@ -8,17 +8,27 @@
 #   inspiration and code direction.
 # ========================================================
 
+import argparse
+import os
 import sys
-from multiprocessing import Process, Queue
-import pyqtgraph.Qt as qt
-import pyqtgraph as pg
+from multiprocessing import Process
 import numpy as np
 import time
-import scipy.signal as scipySignal
-import pyaudio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from erraviz.governor import QualityGovernor
+from erraviz.pipeline import Pipeline
+from erraviz.shm_ring import SharedRingBuffer
+from erraviz.sources import FileSource, PyAudioSource, SyntheticSource
+from erraviz.spectrum import MID_SIDE
+from erraviz.stages import AudioBlocks, QtSink, RingSink, RingSource, SpectrumProcessor
+from erraviz.stats import FrameStats
+from erraviz.waterfall import Waterfall, colormap_lut
 
 decayed_color = '#00FF00'  # Bright green for the decayed plot line
 real_time_color = '#0096FF'  # Blue for the real-time plot line
+decayed_colors = [decayed_color, '#FFD000', '#FF40C0', '#00E0FF']  # Decayed lines of channels 1, 2, ...
+real_time_colors = [real_time_color, '#FF6A00', '#A040FF', '#00A050']  # Real-time lines of channels 1, 2, ...
 background_color_decayed = '#003300'  # Dark green background for the decayed plot
 background_color_real_time = '#FFFFFF'  # White background for the real-time plot
 grid_color_decayed = '#FFFFFF'  # White for the grid and axis in the decayed plot
@@ -28,109 +38,313 @@ grid_color_real_time = '#FFFFFF'  # White for the grid and axis in the real-time
 RATE = 48000
 CHUNK = 2048
 NOISE_THRESHOLD = 0.02  # Adjusted threshold to reduce sensitivity to low-level noise
-DECAY_RATE = 0.9  # Decay rate to control the speed of the return to zero (0 < DECAY_RATE < 1)
-
-# Initialize PyQtGraph application
-app = qt.QtWidgets.QApplication(sys.argv)
-win = pg.GraphicsLayoutWidget(title="Erra P. - FFT Graph Comparison")
-win.setGeometry(100, 100, 900, 600)
-
-# Create two plots in the window: one with decay and one without decay
-decayed_plot = win.addPlot(title="Erra P - FFT Plot with Slow Decay")
-decayed_curve = decayed_plot.plot(pen=pg.mkPen(color=decayed_color, width=2.5))  # Bright green line with decay
-
-# Set axis labels and ranges for decayed plot
-decayed_plot.setLabel('bottom', 'Frequency', units='Hz')
-decayed_plot.setLabel('left', 'Amplitude (With Decay)')
-decayed_plot.setXRange(0, 5000, padding=0)  # Set x-axis range from 0 to 5000 Hz
-decayed_plot.getAxis('bottom').setTickSpacing(1000, 250)
-decayed_plot.getAxis('bottom').setStyle(tickTextOffset=10, autoExpandTextSpace=True)
-decayed_plot.getAxis('bottom').setStyle(tickFont=qt.QtGui.QFont("Arial", 10))
-decayed_plot.getAxis('bottom').enableAutoSIPrefix(False)
-
-# Set background color for the decayed plot
-pg.setConfigOption('background', background_color_decayed)  # Dark green background for the decayed plot
-pg.setConfigOption('foreground', grid_color_decayed)  # White for axis and grid lines in decayed plot
-decayed_plot.showGrid(x=True, y=True, alpha=0.3)
-
-# Add a second plot (without decay) below the first one
-win.nextRow()  # Start a new row in the layout for the second plot
-real_time_plot = win.addPlot(title="Erra P. - FFT Plot")
-real_time_curve = real_time_plot.plot(pen=pg.mkPen(color=real_time_color, width=2.5))  # Blue line without decay
-
-# Set axis labels and ranges for real-time plot
-real_time_plot.setLabel('bottom', 'Frequency', units='Hz')
-real_time_plot.setLabel('left', 'Amplitude (No Decay)')
-real_time_plot.setXRange(0, 5000, padding=0)  # Set x-axis range from 0 to 5000 Hz
-real_time_plot.getAxis('bottom').setTickSpacing(1000, 250)
-real_time_plot.getAxis('bottom').setStyle(tickTextOffset=10, autoExpandTextSpace=True)
-real_time_plot.getAxis('bottom').setStyle(tickFont=qt.QtGui.QFont("Arial", 10))
-real_time_plot.getAxis('bottom').enableAutoSIPrefix(False)
-
-# Set background color for the real-time plot
-pg.setConfigOption('background', background_color_real_time)  # White background for the real-time plot
-pg.setConfigOption('foreground', grid_color_real_time)  # White for the axis and grid lines
-real_time_plot.showGrid(x=True, y=True, alpha=0.5)
-
-def stream(q):
-    p = pyaudio.PyAudio()
-    stream = p.open(format=pyaudio.paInt16,
-                    channels=1,
-                    rate=RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK)
-    while True:
-        try:
-            data = stream.read(CHUNK, exception_on_overflow=False)
-            data = np.frombuffer(data, dtype=np.int16)
-            q.put(data)
-        except Exception as e:
-            print(f"Error reading stream: {e}")
-        time.sleep(0.01)  # Short delay to prevent CPU overload
-
-def update(q: Queue):
-    win.show()
-    last_fft = np.zeros(CHUNK // 2)  # Initialize last FFT data array to zero
-    
-    while True:
-        try:
-            data = q.get_nowait()
-        except:
-            app.processEvents()
-            time.sleep(0.01)
-            continue
-        
-        # Detrend (no DC hum) and compute FFT
-        signal = scipySignal.detrend(data)
-        fft = np.abs(np.fft.fft(signal)) * 2 / CHUNK  # Normalizs the FFT
-        fft = fft[:len(fft) // 2]  # Keep only the positive frequencies
-        
-        # Generate frequencies corresponding to the FFT data
-        freqs = np.fft.fftfreq(len(signal), 1.0 / RATE)[:len(fft)]
-        
-        # Apply a noise threshold to filter out low-amplitude fluctuations
-        fft[fft < NOISE_THRESHOLD] = 0  # Set values below threshold to zero
-        
-        # FFT with decay
-        decayed_fft = np.maximum(fft, last_fft * DECAY_RATE)
-        last_fft = decayed_fft  # Update last_fft for the next frame
-
-        # Dynamically adjust y-axis range based on FFT max amplitude
-        max_amplitude = max(np.max(decayed_fft), np.max(fft), 1)
-        decayed_plot.setYRange(0, max_amplitude, padding=0)
-        real_time_plot.setYRange(0, max_amplitude, padding=0)  # Synchronize y-axis ranges
-
-        # Update both curves with their respective FFT data
-        decayed_curve.setData(freqs, decayed_fft)  # Decayed FFT data
-        real_time_curve.setData(freqs, fft)        # Real-time FFT data (no decay)
-
-        app.processEvents()  # Keep the GUI responsive
+DECAY_RATE = 0.9  # Decay rate to control the speed of the return to zero (0 < DECAY_RATE < 1), per CHUNK samples
+HOP = 512  # Samples between analysis frames; set HOP = CHUNK for non-overlapping blocks
+WINDOW = 'hann'  # Analysis window: 'rect', 'hann', 'hamming' or 'blackman'
+BAND_MODE = 'linear'  # Display bands: 'linear' (crop), 'log', 'mel' or 'octave' (1/3 octave)
+BAND_COUNT = 256  # Points per curve for the linear, log and mel modes
+BAND_FMIN, BAND_FMAX = 20, 5000  # Visible frequency range in Hz
+CHANNELS = 1  # Input channels; all of them are analysed together in one batched FFT
+CHANNEL_VIEW = 'overlay'  # Several channels: 'overlay' (same plots), 'stacked' (a pair of plots each) or 'midside'
+RING_SLOTS = 32  # Hops held in shared memory between capture and render; older ones are dropped
+LATENCY_TARGET_MS = 50  # Capture-to-paint budget; the overlay turns red when p95 goes over it
+OVERLAY_INTERVAL = 0.5  # Seconds between overlay (and stats file) updates
+TARGET_FPS = 60  # Thinner and coarser curves are drawn to hold this frame rate (0: always full detail)
+PEN_WIDTH = 2.5
+WATERFALL = False  # Scrolling spectrogram of the last WATERFALL_SECONDS below the curves
+WATERFALL_SECONDS = 8
+WATERFALL_FLOOR_DB, WATERFALL_CEILING_DB = -90, -10  # dB below int16 full scale mapped to the first / last colour
+
+# The display process builds its window once the pipeline starts; pyqtgraph is only imported there
+def build_window():
+    global win, decayed_plots, real_time_plots, decayed_curves, real_time_curves, stats_label, y_range
+    global waterfall, waterfall_image
+    import pyqtgraph.Qt as qt
+    import pyqtgraph as pg
+
+    names = channel_names()
+    stacked = CHANNEL_VIEW == 'stacked' and len(names) > 1
+    win = pg.GraphicsLayoutWidget(title="Erra P. - FFT Graph Comparison")
+    win.setGeometry(100, 100, 900, 600 if not stacked else 100 + 300 * len(names))
+
+    # Two plots, one with decay and one without; stacked channels get a pair each, side by side
+    decayed_plots, real_time_plots, decayed_curves, real_time_curves = [], [], [], []
+    for row, group in enumerate([[name] for name in names] if stacked else [names]):
+        suffix = f" ({group[0]})" if stacked else ""
+        if row:
+            win.nextRow()
+        decayed_plot = win.addPlot(title="Erra P - FFT Plot with Slow Decay" + suffix)
+        style_plot(decayed_plot, 'Amplitude (With Decay)', qt)
+
+        # Set background color for the decayed plot
+        pg.setConfigOption('background', background_color_decayed)  # Dark green background for the decayed plot
+        pg.setConfigOption('foreground', grid_color_decayed)  # White for axis and grid lines in decayed plot
+        decayed_plot.showGrid(x=True, y=True, alpha=0.3)
+
+        # The plot without decay goes below the first one (next to it when stacked)
+        if not stacked:
+            win.nextRow()
+        real_time_plot = win.addPlot(title="Erra P. - FFT Plot" + suffix)
+        style_plot(real_time_plot, 'Amplitude (No Decay)', qt)
+
+        # Set background color for the real-time plot
+        pg.setConfigOption('background', background_color_real_time)  # White background for the real-time plot
+        pg.setConfigOption('foreground', grid_color_real_time)  # White for the axis and grid lines
+        real_time_plot.showGrid(x=True, y=True, alpha=0.5)
+
+        # One curve per channel shown in this pair; overlaid channels get a legend
+        if len(group) > 1:
+            decayed_plot.addLegend()
+            real_time_plot.addLegend()
+        for name in group:
+            channel = names.index(name)
+            decayed_curves.append(decayed_plot.plot(pen=pg.mkPen(color=channel_color(decayed_colors, channel),
+                                                                 width=PEN_WIDTH), name=name))
+            real_time_curves.append(real_time_plot.plot(pen=pg.mkPen(color=channel_color(real_time_colors, channel),
+                                                                     width=PEN_WIDTH), name=name))
+        decayed_plots.append(decayed_plot)
+        real_time_plots.append(real_time_plot)
+
+    # Log-spaced band modes read better on a log frequency axis
+    if BAND_MODE != 'linear':
+        for plot in decayed_plots + real_time_plots:
+            plot.setLogMode(x=True, y=False)
+            plot.getAxis('bottom').setTickSpacing()  # Back to automatic ticks for the log axis
+            plot.setXRange(np.log10(BAND_FMIN), np.log10(BAND_FMAX), padding=0)
+
+    # Waterfall: one row per analysed hop, newest at the top, coloured through a lookup table
+    if WATERFALL:
+        freqs, row_rate = spectrum_stage.freqs, spectrum_stage.engine.rate / HOP
+        waterfall = Waterfall(int(WATERFALL_SECONDS * row_rate), len(freqs), WATERFALL_FLOOR_DB,
+                              WATERFALL_CEILING_DB, reference=32768, spill=waterfall_spill, row_rate=row_rate,
+                              freq_range=(freqs[0], freqs[-1]))
+        win.nextRow()
+        waterfall_plot = win.addPlot(title="Erra P. - Spectrogram", colspan=2 if stacked else 1)
+        waterfall_plot.setLabel('bottom', 'Frequency', units='Hz')
+        waterfall_plot.setLabel('left', 'Seconds ago')
+        waterfall_plot.getAxis('bottom').enableAutoSIPrefix(False)
+        waterfall_plot.setMouseEnabled(x=False, y=False)
+        waterfall_image = pg.ImageItem(axisOrder='row-major')
+        waterfall_image.setLookupTable(colormap_lut())
+        waterfall_image.setLevels((0, 255))
+        waterfall_plot.addItem(waterfall_image)
+        waterfall_image.setImage(waterfall.image, autoLevels=False)  # setRect needs the image size
+        # Columns are evenly spaced in frequency (linear) or log frequency (the other band modes)
+        fmin, fmax = freqs[0], freqs[-1]
+        if BAND_MODE != 'linear':
+            waterfall_plot.setLogMode(x=True, y=False)
+            fmin, fmax = np.log10(fmin), np.log10(fmax)
+        seconds = waterfall.rows / row_rate
+        waterfall_image.setRect(qt.QtCore.QRectF(fmin, -seconds, fmax - fmin, seconds))
+        waterfall_plot.setRange(xRange=(fmin, fmax), yRange=(-seconds, 0), padding=0)
+
+    # Latency / frame rate overlay below the plots
+    win.nextRow()
+    stats_label = win.addLabel("waiting for audio...", size='9pt', colspan=2 if stacked else 1)
+    y_range = YRange(decayed_plots + real_time_plots)
+
+    # Wide pens are the most expensive part of a repaint, so they go first
+    if governor is not None:
+        governor.knob("pen_width", (PEN_WIDTH, 1.5, 1.0), set_pen_width)
+        governor.knob("curve_step", (1, 2, 4), set_curve_step)
+    return win
+
+def style_plot(plot, amplitude_label, qt):
+    # Set axis labels and ranges
+    plot.setLabel('bottom', 'Frequency', units='Hz')
+    plot.setLabel('left', amplitude_label)
+    plot.setXRange(0, 5000, padding=0)  # Set x-axis range from 0 to 5000 Hz
+    plot.getAxis('bottom').setTickSpacing(1000, 250)
+    plot.getAxis('bottom').setStyle(tickTextOffset=10, autoExpandTextSpace=True)
+    plot.getAxis('bottom').setStyle(tickFont=qt.QtGui.QFont("Arial", 10))
+    plot.getAxis('bottom').enableAutoSIPrefix(False)
+
+def channel_names():
+    if CHANNEL_VIEW == 'midside':
+        return ['Mid', 'Side']
+    if CHANNELS == 2:
+        return ['Left', 'Right']
+    return [f"Channel {channel + 1}" for channel in range(CHANNELS)]
+
+def channel_color(colors, channel):
+    return colors[channel % len(colors)]
+
+def set_pen_width(width):
+    import pyqtgraph as pg
+
+    for channel, curve in enumerate(decayed_curves):
+        curve.setPen(pg.mkPen(color=channel_color(decayed_colors, channel), width=width))
+    for channel, curve in enumerate(real_time_curves):
+        curve.setPen(pg.mkPen(color=channel_color(real_time_colors, channel), width=width))
+
+# Draw every n-th point (keeping the peaks of the ones in between)
+def set_curve_step(step):
+    for curve in decayed_curves + real_time_curves:
+        curve.setDownsampling(ds=step, auto=False, method='peak')
+
+class YRange:
+    """Shared y-axis range with hysteresis: grows at once, shrinks only after a quiet spell."""
+
+    def __init__(self, plots, minimum=1, headroom=1.2, shrink_below=0.5, hold=1.0, min_interval=0.25):
+        self.plots = plots
+        self.minimum = minimum
+        self.headroom = headroom  # Grow to peak * headroom so small rises don't rescale again
+        self.shrink_below = shrink_below  # Only shrink once the peak drops below this fraction
+        self.hold = hold  # ... and has stayed there for this many seconds
+        self.min_interval = min_interval  # Never rescale more often than this
+        self.top = None
+        self._quiet_since = None
+        self._last_change = float('-inf')
+
+    def update(self, peak, now):
+        peak = max(peak, self.minimum)
+        if self.top is not None and peak <= self.top:
+            if peak >= self.top * self.shrink_below:
+                self._quiet_since = None
+                return
+            if self._quiet_since is None:
+                self._quiet_since = now
+            if now - self._quiet_since < self.hold or now - self._last_change < self.min_interval:
+                return
+        self.top = peak * self.headroom
+        self._quiet_since = None
+        self._last_change = now
+        for plot in self.plots:
+            plot.setYRange(0, self.top, padding=0)
+
+# State of the display process, set up by update() and build_window()
+win = stats_label = None
+decayed_plots = real_time_plots = decayed_curves = real_time_curves = None
+spectrum_stage = None
+waterfall = waterfall_image = None
+waterfall_spill = None
+ring = None
+y_range = None
+frame_stats = None
+governor = None
+last_overlay = 0.0
+stats_file = None
+
+# Capture process: audio blocks straight into the shared ring
+def stream(ring: SharedRingBuffer, source):
+    Pipeline(AudioBlocks(source, HOP), sinks=[RingSink(ring)], report_startup=False).run()
+
+# Repaint both curves with the newest spectra (every hop that arrived since the last repaint
+# went through one 2-D FFT and one decay update in the pipeline's SpectrumProcessor)
+def draw(item):
+    global last_overlay
+    fft, decayed_fft = item["spectrum"], item["decayed"]
+
+    # Y-axis follows the peak-hold (never below the live spectrum), with hysteresis
+    y_range.update(decayed_fft.max(), time.perf_counter())
+
+    # Update the curves of every channel with their respective FFT data
+    freqs = item["freqs"]
+    for curve, values in zip(decayed_curves, decayed_fft.reshape(-1, len(freqs))):
+        curve.setData(freqs, values)  # Decayed FFT data
+    for curve, values in zip(real_time_curves, fft.reshape(-1, len(freqs))):
+        curve.setData(freqs, values)  # Real-time FFT data (no decay)
+
+    # Every hop since the last repaint becomes a waterfall row (of the first channel);
+    # the image is a view, not a copy
+    if waterfall is not None:
+        spectra = item["spectra"]
+        waterfall.push(spectra if spectra.ndim == 2 else spectra[:, 0])
+        waterfall_image.setImage(waterfall.image, autoLevels=False)
+
+    # Paint now so the timestamp below is really capture-to-screen
+    win.viewport().repaint()
+    now = time.perf_counter()
+    frame_stats.record(item["time"], now)
+
+    if now - last_overlay >= OVERLAY_INTERVAL:
+        last_overlay = now
+        summary = frame_stats.summary()
+        ring_stats = ring.stats()
+        over_budget = summary.get('latency_ms', {}).get('p95', 0) > LATENCY_TARGET_MS
+        text = f"{frame_stats.format()}   lost {ring_stats['lost']}"
+        if governor is not None:
+            text += f"   {governor.format()}"
+        stats_label.setText(text, color='#FF4040' if over_budget else '#FFFFFF')
+        if stats_file:
+            dump_stats()
+
+def dump_stats():
+    extra = {"quality": governor.stats()} if governor is not None else {}
+    frame_stats.dump(stats_file, **ring.stats(), **extra)
+
+# Display process: the Qt event loop sleeps until the capture process signals new audio
+def update(shared_ring: SharedRingBuffer, rate, dump_path=None, max_frames=None, target_fps=TARGET_FPS,
+           show_waterfall=WATERFALL, spill_path=None, channels=CHANNELS, channel_view=CHANNEL_VIEW):
+    global ring, frame_stats, stats_file, governor, spectrum_stage, WATERFALL, waterfall_spill
+    global CHANNELS, CHANNEL_VIEW
+    ring, stats_file = shared_ring, dump_path
+    WATERFALL, waterfall_spill = show_waterfall or bool(spill_path), spill_path
+    CHANNELS, CHANNEL_VIEW = channels, channel_view
+    frame_stats = FrameStats()
+    governor = QualityGovernor(target_fps) if target_fps else None
+    fmin = BAND_FMIN if BAND_MODE != 'linear' else 0
+    spectrum_stage = SpectrumProcessor(CHUNK, rate, NOISE_THRESHOLD, DECAY_RATE, window=WINDOW, hop=HOP,
+                                       max_batch=RING_SLOTS - 1, bands=(BAND_MODE, BAND_COUNT, fmin, BAND_FMAX),
+                                       every_hop=WATERFALL, channels=CHANNELS,
+                                       mix=MID_SIDE if CHANNEL_VIEW == 'midside' else None)
+    try:
+        Pipeline(RingSource(ring), [spectrum_stage], [QtSink(build_window, draw)], max_frames=max_frames,
+                 governor=governor).run()
+    finally:
+        if waterfall is not None:
+            waterfall.close()
+
+    if stats_file:
+        dump_stats()
+
+def make_source(args):
+    if args.file:
+        return FileSource(args.file, realtime=True, loop=args.loop, mono=args.channels == 1)
+    if args.synthetic:
+        return SyntheticSource(RATE, realtime=True, channels=args.channels)
+    return PyAudioSource(RATE, frames_per_buffer=HOP, channels=args.channels)
 
 if __name__ == "__main__":
-    q = Queue()
-    p1 = Process(target=update, args=(q,))
-    p2 = Process(target=stream, args=(q,))
+    parser = argparse.ArgumentParser(description="Real-time FFT visualiser. "
+                                     "For offline rendering use `python -m erraviz.batch`.")
+    parser.add_argument('--file', help="Play a WAV file through the visualiser instead of the live input")
+    parser.add_argument('--loop', action='store_true', help="Loop the --file source")
+    parser.add_argument('--synthetic', action='store_true',
+                        help="Use a generated test signal instead of the live input")
+    parser.add_argument('--stats-file', help="Keep a JSON dump of the latency / FPS percentiles at this path")
+    parser.add_argument('--target-fps', type=float, default=TARGET_FPS,
+                        help="Frame rate to hold by drawing thinner, coarser curves (0: always full detail)")
+    parser.add_argument('--waterfall', action='store_true', default=WATERFALL,
+                        help="Show a scrolling spectrogram below the curves")
+    parser.add_argument('--waterfall-spill', metavar='PATH',
+                        help="Also keep the whole session's spectrogram in this file "
+                             "(render it with `python -m erraviz.waterfall PATH OUT.png`)")
+    parser.add_argument('--channels', type=int, default=CHANNELS,
+                        help="Input channels to capture (with --file, anything above 1 keeps all of the file's)")
+    parser.add_argument('--channel-view', choices=['overlay', 'stacked', 'midside'], default=CHANNEL_VIEW,
+                        help="Show several channels on the same plots, on a pair of plots each, or as mid/side")
+    parser.add_argument('--startup-only', action='store_true', help="Exit after the first frame (times the cold start)")
+    args, _ = parser.parse_known_args()  # Leave Qt's own arguments alone
+
+    source = make_source(args)
+    if args.channel_view == 'midside' and source.channels != 2:
+        parser.error(f"--channel-view midside needs a stereo input, not {source.channels} channel(s)")
+    # Each ring slot holds one hop of interleaved samples, de-interleaved by the display process
+    ring = SharedRingBuffer(HOP * source.channels, slots=RING_SLOTS, dtype=np.int16, notify=True)
+    p1 = Process(target=update, args=(ring, source.rate, args.stats_file, 1 if args.startup_only else None,
+                                      args.target_fps, args.waterfall, args.waterfall_spill, source.channels,
+                                      args.channel_view))
+    p2 = Process(target=stream, args=(ring, source))
     p2.start()
     p1.start()
-    p1.join()
-    p2.join()
+    try:
+        p1.join()
+    finally:
+        p2.terminate()
+        p2.join()
+        stats = ring.stats()
+        print(f"Hops captured: {stats['written']}, lost: {stats['lost']} "
+              f"(overruns: {stats['overruns']}, dropped: {stats['dropped']})")
+        ring.close()
+        ring.unlink()